@@ -0,0 +1,232 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from agents_stories import format_stories, headline_similarity, normalize_headline, parse_stories
+
+# Token accounting around the agents' model calls
+# Features:
+# - Cheap input-size estimate before each call (no tokenizer round-trip)
+# - Compaction of oversized STORY-block inputs: drop IMPACT, merge near-duplicates,
+#   trim summaries, then drop trailing stories
+# - max_tokens sized per stage from recorded output lengths, raised after truncation;
+#   the lengths live in an append-only log shared by every worker process
+
+# Rough characters-per-token for Latin text; CJK characters count as one token each
+CHARS_PER_TOKEN = 4
+_CJK_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿　-〿＀-￯]")
+
+# Largest output the pipeline model accepts
+MODEL_MAX_OUTPUT_TOKENS = 8192
+MIN_OUTPUT_TOKENS = 1024
+# Headroom over the p95 of recent outputs, and rounding so max_tokens (part of
+# the response cache key) only changes in coarse steps
+OUTPUT_HEADROOM = 1.3
+OUTPUT_STEP_TOKENS = 1024
+HISTORY_SIZE = 30
+MIN_HISTORY = 5
+
+# Input budgets for stages whose input is a STORY-block list
+STAGE_INPUT_BUDGETS = {
+    "prioritize": 12000,
+    "script": 4000,
+}
+SUMMARY_SENTENCES = 2
+DUPLICATE_THRESHOLD = 0.6
+# Never compact below the ten stories an episode needs
+MIN_STORIES = 10
+CONTEXT_WINDOW_TOKENS = 200000
+
+TOKEN_HISTORY_PATH = os.getenv(
+    "AOK_TOKEN_HISTORY",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "token_history.jsonl"),
+)
+TOKEN_HISTORY_MAX_BYTES = 256 * 1024
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / CHARS_PER_TOKEN)
+
+
+def estimate_message_tokens(messages: List[Dict]) -> int:
+    total = 0
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = " ".join(block.get("text", "") for block in content if isinstance(block, dict))
+        total += estimate_tokens(content) + 4  # role and framing overhead
+    return total
+
+
+class OutputHistory:
+    """Recent output token counts per stage, persisted as an append-only JSONL log.
+
+    Every process appends its own records, so concurrent workers never
+    overwrite each other, and each one reads the lines appended since it last
+    looked. The log is rewritten down to the retained history once it reaches
+    max_bytes; records another process appends during that rewrite are lost.
+    """
+
+    def __init__(self, path: str = TOKEN_HISTORY_PATH, max_bytes: int = TOKEN_HISTORY_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict] = {}
+        self._offset = 0
+        self._inode = None
+
+    def _apply(self, stage: str, output_tokens: int, truncated: bool) -> None:
+        entry = self._data.setdefault(stage, {"outputs": [], "truncated": 0})
+        entry["outputs"] = (entry["outputs"] + [int(output_tokens)])[-HISTORY_SIZE:]
+        # Count consecutive truncated calls; any clean finish resets it
+        entry["truncated"] = entry["truncated"] + 1 if truncated else 0
+
+    def _refresh(self) -> Dict[str, Dict]:
+        """Apply the lines appended since the last read; the caller holds the lock"""
+        try:
+            with open(self.path, "rb") as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if inode != self._inode:
+                    # First read, or the log was rewritten: start over
+                    self._data, self._offset, self._inode = {}, 0, inode
+                f.seek(self._offset)
+                chunk = f.read()
+        except OSError:
+            return self._data
+        # A line still being written by another process is picked up next time
+        complete = chunk[:chunk.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+                self._apply(record["stage"], record["output_tokens"], record.get("truncated", False))
+            except (ValueError, KeyError, TypeError):
+                continue
+        return self._data
+
+    def _compact(self) -> None:
+        """Rewrite the log as the retained history; the caller holds the lock"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for stage, entry in self._data.items():
+                outputs = entry["outputs"]
+                clean = len(outputs) - min(entry["truncated"], len(outputs))
+                for index, tokens in enumerate(outputs):
+                    f.write(json.dumps({"stage": stage, "output_tokens": tokens,
+                                        "truncated": index >= clean}) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def record(self, stage: str, output_tokens: int, truncated: bool = False) -> None:
+        line = json.dumps({"stage": stage, "output_tokens": int(output_tokens), "truncated": truncated}) + "\n"
+        with self._lock:
+            self._refresh()
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                self._refresh()
+                if self.max_bytes and self._offset >= self.max_bytes:
+                    self._compact()
+            except OSError as exc:
+                logging.warning(f"Could not persist token history: {exc}")
+                self._apply(stage, output_tokens, truncated)
+
+    def suggest_max_tokens(self, stage: str, default: int) -> int:
+        """p95 of recent outputs plus headroom, doubled after truncation.
+
+        Falls back to *default* until MIN_HISTORY outputs have been seen.
+        """
+        with self._lock:
+            entry = dict(self._refresh().get(stage) or {"outputs": [], "truncated": 0})
+        if len(entry["outputs"]) < MIN_HISTORY:
+            return default
+        outputs = sorted(entry["outputs"])
+        p95 = outputs[min(len(outputs) - 1, math.ceil(0.95 * len(outputs)) - 1)]
+        suggested = p95 * OUTPUT_HEADROOM * (2 ** entry["truncated"])
+        suggested = math.ceil(suggested / OUTPUT_STEP_TOKENS) * OUTPUT_STEP_TOKENS
+        return max(MIN_OUTPUT_TOKENS, min(MODEL_MAX_OUTPUT_TOKENS, suggested))
+
+
+output_history = OutputHistory()
+
+
+def _first_sentences(text: str, count: int) -> str:
+    sentences = re.split(r"(?<=[.!?。！？])\s+", text.strip())
+    return " ".join(sentences[:count])
+
+
+def compact_stories(text: str, budget_tokens: int, min_stories: int = MIN_STORIES) -> Tuple[str, List[str]]:
+    """Shrink a STORY-block list until it fits *budget_tokens*.
+
+    Steps run in order of increasing information loss and stop as soon as the
+    text fits; stories are never dropped below *min_stories*. Returns the
+    (possibly unchanged) text and the steps applied.
+    """
+    if estimate_tokens(text) <= budget_tokens:
+        return text, []
+    stories = parse_stories(text)
+    if not stories:
+        return text, []
+
+    steps = []
+
+    # Prioritized lists keep their "STORY n:" numbering
+    numbered = any(story.rank is not None for story in stories)
+
+    def render() -> str:
+        return format_stories(stories, numbered=numbered, separator="\n---\n")
+
+    def fits() -> bool:
+        return estimate_tokens(render()) <= budget_tokens
+
+    for story in stories:
+        story.impact = ""
+    steps.append("dropped impact")
+
+    if not fits():
+        kept, seen = [], []
+        for story in stories:
+            headline = normalize_headline(story.headline)
+            if any(headline_similarity(headline, other) >= DUPLICATE_THRESHOLD for other in seen):
+                continue
+            seen.append(headline)
+            kept.append(story)
+        if len(kept) < len(stories):
+            steps.append(f"merged {len(stories) - len(kept)} duplicates")
+        stories = kept
+
+    if not fits():
+        for story in stories:
+            story.summary = _first_sentences(story.summary, SUMMARY_SENTENCES)
+        steps.append(f"trimmed summaries to {SUMMARY_SENTENCES} sentences")
+
+    dropped = 0
+    while len(stories) > min_stories and not fits():
+        stories.pop()
+        dropped += 1
+    if dropped:
+        steps.append(f"dropped {dropped} trailing stories")
+
+    return render(), steps
+
+
+def compact_stage_input(stage: str, text: str, debug: bool = False) -> str:
+    """Apply the stage's input budget, if it has one"""
+    budget = STAGE_INPUT_BUDGETS.get(stage)
+    if budget is None:
+        return text
+    compacted, steps = compact_stories(text, budget)
+    if steps:
+        message = (f"Compacted {stage} input from ~{estimate_tokens(text)} to "
+                   f"~{estimate_tokens(compacted)} tokens: {', '.join(steps)}")
+        logging.info(message)
+        if debug:
+            print(f"   ✂️  {message}")
+    return compacted
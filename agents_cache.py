@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Disk-backed response cache for the agents pipelines
+# Features:
+# - Content-addressed keys (model, messages, tools, max_tokens)
+# - TTL expiry and size-bounded LRU eviction
+# - Per-stage bypass flags (AOK_CACHE_BYPASS=research,editorial or "all")
+# - Hit/miss counters for debug output and management commands
+
+CACHE_DIR = os.getenv(
+    "AOK_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "anthropic"),
+)
+CACHE_TTL_SECONDS = int(os.getenv("AOK_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(os.getenv("AOK_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_ENABLED = os.getenv("AOK_CACHE_ENABLED", "1") != "0"
+
+
+def _parse_stages(value: str) -> set:
+    return {stage.strip() for stage in value.split(",") if stage.strip()}
+
+
+def make_cache_key(model: str, messages: List[Dict], tools: Optional[List[Dict]], max_tokens: int) -> str:
+    """Return a stable sha256 hex digest for an Anthropic messages request."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "tools": tools or [],
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Stores one JSON file per request key under *directory*.
+
+    File mtimes double as the LRU clock: a hit touches the entry, and eviction
+    removes the least recently touched files until the cache fits *max_bytes*.
+    """
+
+    def __init__(
+        self,
+        directory: str = CACHE_DIR,
+        ttl: int = CACHE_TTL_SECONDS,
+        max_bytes: int = CACHE_MAX_BYTES,
+        enabled: bool = CACHE_ENABLED,
+        bypass: Iterable[str] = (),
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.bypass = set(bypass) | _parse_stages(os.getenv("AOK_CACHE_BYPASS", ""))
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def is_bypassed(self, stage: Optional[str]) -> bool:
+        return not self.enabled or "all" in self.bypass or (stage is not None and stage in self.bypass)
+
+    def get(self, key: str, stage: Optional[str] = None) -> Optional[Dict]:
+        """Return the cached entry for *key*, or None on miss, expiry or bypass."""
+        if self.is_bypassed(stage):
+            with self._lock:
+                self.bypassed += 1
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if self.ttl and time.time() - entry.get("created_at", 0) > self.ttl:
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def set(self, key: str, value: Dict, stage: Optional[str] = None) -> None:
+        """Write *value* for *key*. Bypassed stages still refresh their entry."""
+        if not self.enabled:
+            return
+
+        entry = dict(value, created_at=time.time(), stage=stage)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _entries(self) -> List[os.DirEntry]:
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            entries.extend(e for e in os.scandir(shard.path) if e.name.endswith(".json"))
+        return entries
+
+    def _evict(self) -> None:
+        if not self.max_bytes:
+            return
+        entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in self._entries()]
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                total -= size
+                with self._lock:
+                    self.evictions += 1
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def clear(self) -> int:
+        removed = sum(1 for e in self._entries() if self._remove(e.path))
+        return removed
+
+    def stats(self) -> Dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+        }
+
+
+# Shared instance used by every agents_pipeline module
+response_cache = ResponseCache()
@@ -0,0 +1,186 @@
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from agents_budget import CONTEXT_WINDOW_TOKENS, estimate_message_tokens, estimate_tokens, output_history
+from agents_cache import make_cache_key, response_cache
+from agents_metrics import metrics_store
+from agents_ratelimit import rate_limiter
+from agents_resilience import resilient_call
+from agents_tiering import current_model
+from agents_transport import make_client, transport_scope
+
+# Shared Anthropic call for the agents pipelines (v1, v2, v3 and the modules built on v3)
+# Features:
+# - One client (live, record or replay; agents_transport) and one web search tool list;
+#   a use_transport() block swaps the client for the calls made inside it
+# - Response cache lookup, store and per-stage bypass (agents_cache)
+# - Rate limiting, retries, circuit breaker and hedging (agents_ratelimit, agents_resilience)
+# - Per-call metrics and output-length history (agents_metrics, agents_budget)
+# - cache_control breakpoints below the model's minimum cacheable prefix are
+#   dropped, since Anthropic would ignore them anyway
+# - prepare_chat(), cached_chat() and finish_chat() are the steps around the
+#   request itself, shared with agents_pipeline_async
+
+# Initialize the Anthropic client
+anthropic_client = make_client(api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+WEB_SEARCH_TOOLS = [{
+    "type": "web_search_20250305",
+    "name": "web_search"
+}]
+
+DEFAULT_MODEL = "claude-3-5-sonnet-20241022"
+
+STAGE_MAX_TOKENS = {
+    "research": 8192,
+    "prioritize": 6144,
+    "script": 8192,
+    "editorial": 8192,
+    "metadata": 1024,
+    "translate": 8192,
+}
+
+# Shortest prefix Anthropic caches, in tokens; shorter breakpoints are ignored
+PROMPT_CACHE_MIN_TOKENS = 1024
+HAIKU_PROMPT_CACHE_MIN_TOKENS = 2048
+
+
+def prompt_cache_min_tokens(model: str) -> int:
+    return HAIKU_PROMPT_CACHE_MIN_TOKENS if "haiku" in model else PROMPT_CACHE_MIN_TOKENS
+
+
+def drop_short_cache_markers(messages: List[Dict], model: str) -> List[Dict]:
+    """*messages* without the cache_control breakpoints that end below *model*'s minimum prefix.
+
+    The prefix is estimated from the message text alone; tool definitions
+    would only make it longer.
+    """
+    minimum = prompt_cache_min_tokens(model)
+    prefix = 0
+    result = []
+    for message in messages:
+        content = message.get("content")
+        if not isinstance(content, list):
+            prefix += estimate_tokens(content or "")
+            result.append(message)
+            continue
+        blocks = []
+        for block in content:
+            prefix += estimate_tokens(block.get("text", ""))
+            if "cache_control" in block and prefix < minimum:
+                block = {key: value for key, value in block.items() if key != "cache_control"}
+            blocks.append(block)
+        result.append(dict(message, content=blocks))
+    return result
+
+
+def response_text(response) -> str:
+    """Concatenate the text blocks of a Messages API response"""
+    text_content = ""
+    for content_block in response.content:
+        if hasattr(content_block, "text"):
+            text_content += content_block.text
+    return text_content.strip()
+
+
+def current_client():
+    """The enclosing use_transport() client, else the module's"""
+    scope = transport_scope()
+    return scope.client if scope else anthropic_client
+
+
+def stage_max_tokens(stage: str) -> int:
+    """STAGE_MAX_TOKENS adjusted to the stage's recorded output lengths"""
+    return output_history.suggest_max_tokens(stage, STAGE_MAX_TOKENS[stage])
+
+
+@dataclass
+class ChatCall:
+    """A prepared Messages API request and the bookkeeping shared by the sync and async paths"""
+    stage: Optional[str]
+    model: str
+    request: Dict
+    input_tokens: int
+    cache_key: str
+    use_cache: bool
+    track_output: bool
+    started: float = field(default_factory=time.monotonic)
+
+
+def prepare_chat(messages: List[Dict], model: str = None, max_tokens=8192, stage: str = None,
+                 use_cache: bool = True, tools: List[Dict] = WEB_SEARCH_TOOLS) -> ChatCall:
+    # Without an explicit model, use the enclosing tier's (agents_tiering)
+    model = model or current_model() or DEFAULT_MODEL
+    messages = drop_short_cache_markers(messages, model)
+    scope = transport_scope()
+    use_cache = use_cache and (scope is None or scope.cache)
+    # max_tokens=None sizes the output budget from the stage's history and
+    # records this call's output length for next time
+    track_output = max_tokens is None and stage in STAGE_MAX_TOKENS and (scope is None or scope.history)
+    if max_tokens is None:
+        max_tokens = stage_max_tokens(stage) if stage in STAGE_MAX_TOKENS else 8192
+    input_tokens = estimate_message_tokens(messages)
+    if input_tokens + max_tokens > CONTEXT_WINDOW_TOKENS:
+        logging.warning(f"{stage or 'chat'} request may exceed the context window: "
+                        f"~{input_tokens} input + {max_tokens} output tokens")
+
+    request = {"model": model, "messages": messages, "max_tokens": max_tokens}
+    if tools:
+        request["tools"] = tools
+    return ChatCall(stage, model, request, input_tokens, make_cache_key(model, messages, tools, max_tokens),
+                    use_cache, track_output)
+
+
+def cached_chat(call: ChatCall) -> Optional[str]:
+    """The cached answer to *call*, recorded as a cached call, or None"""
+    if not call.use_cache:
+        return None
+    cached = response_cache.get(call.cache_key, call.stage)
+    if cached is None:
+        return None
+    metrics_store.record_call(call.stage, time.monotonic() - call.started, call.model, cached=True)
+    return cached["text"]
+
+
+def finish_chat(call: ChatCall, response) -> str:
+    """Record *response* (metrics, rate limiter, output history, cache) and return its text"""
+    text_content = response_text(response)
+    metrics_store.record_call(call.stage, time.monotonic() - call.started, call.model, response)
+
+    truncated = getattr(response, "stop_reason", None) == "max_tokens"
+    if truncated:
+        logging.warning(f"{call.stage or 'chat'} output hit max_tokens={call.request['max_tokens']} and was truncated")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        if rate_limiter.enabled:
+            rate_limiter.settle(call.input_tokens, usage.input_tokens + usage.output_tokens)
+        if call.track_output:
+            output_history.record(call.stage, usage.output_tokens, truncated=truncated)
+
+    if call.use_cache:
+        response_cache.set(call.cache_key, {"model": call.model, "text": text_content}, call.stage)
+    return text_content
+
+
+def run_anthropic_chat(messages: List[Dict], model: str = None, max_tokens=8192,
+                       stage: str = None, use_cache: bool = True,
+                       tools: List[Dict] = WEB_SEARCH_TOOLS) -> str:
+    call = prepare_chat(messages, model, max_tokens, stage, use_cache, tools)
+    cached = cached_chat(call)
+    if cached is not None:
+        return cached
+    client = current_client()
+
+    def attempt(timeout: float):
+        # Retries are handled by resilient_call, not the SDK
+        return client.with_options(timeout=timeout, max_retries=0).messages.create(**call.request)
+
+    def acquire():
+        # Shared RPM/TPM limiter; a no-op unless configured (see backfill_episodes)
+        if rate_limiter.enabled:
+            rate_limiter.acquire(call.input_tokens)
+
+    return finish_chat(call, resilient_call(stage, attempt, acquire=acquire))
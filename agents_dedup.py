@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from agents_stories import Story, parse_stories
+from agents_validation import split_script
+
+# Near-duplicate story detection with MinHash/LSH
+# Features:
+# - Word unigram+bigram shingles over headline and summary text
+# - MinHash signatures bucketed by LSH bands for sub-linear lookups
+# - Clustering of near-duplicates within one research run
+# - Persisted history of recently aired stories, indexed incrementally per date
+#   with the same headline + summary signature research stories are queried with;
+#   a regenerated episode replaces its date's entries
+
+NUM_PERM = 96
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+# With 32 bands of 3 rows, a pair at Jaccard 0.5 becomes an LSH candidate
+# with probability 1 - (1 - 0.5**3)**32 ~ 0.99
+RUN_THRESHOLD = 0.5
+# Aired stories are signed like research stories, so "already covered" uses
+# the same near-duplicate bar as within a run
+HISTORY_THRESHOLD = RUN_THRESHOLD
+# Bumped when what is signed changes; an index of another version is rebuilt
+INDEX_VERSION = 3
+
+STORY_INDEX_PATH = os.getenv(
+    "AOK_STORY_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "story_index.json"),
+)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "into",
+    "is", "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "will", "with",
+}
+
+
+def _permutations(num_perm: int) -> List[Tuple[int, int]]:
+    # Seeded from sha256 so signatures stay comparable across processes and days
+    perms = []
+    for i in range(num_perm):
+        digest = hashlib.sha256(f"aok-minhash-{i}".encode()).digest()
+        a = int.from_bytes(digest[:8], "big") % (_MERSENNE_PRIME - 1) + 1
+        b = int.from_bytes(digest[8:16], "big") % _MERSENNE_PRIME
+        perms.append((a, b))
+    return perms
+
+
+_PERMUTATIONS = _permutations(NUM_PERM)
+
+
+def shingles(text: str) -> Set[str]:
+    words = [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in _STOPWORDS]
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def minhash(tokens: Iterable[str]) -> List[int]:
+    hashes = [int.from_bytes(hashlib.blake2b(t.encode(), digest_size=4).digest(), "big") for t in tokens]
+    if not hashes:
+        return [_MAX_HASH] * NUM_PERM
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def estimate_jaccard(sig_a: List[int], sig_b: List[int]) -> float:
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def story_signature(story: Story) -> List[int]:
+    return minhash(shingles(f"{story.headline} {story.summary}"))
+
+
+class MinHashLSH:
+    """In-memory LSH over MinHash signatures keyed by arbitrary string ids"""
+
+    def __init__(self):
+        self.signatures: Dict[str, List[int]] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+
+    def _bands(self, signature: List[int]):
+        for band in range(BANDS):
+            yield band, tuple(signature[band * ROWS:(band + 1) * ROWS])
+
+    def add(self, key: str, signature: List[int]) -> None:
+        self.signatures[key] = signature
+        for band in self._bands(signature):
+            self._buckets.setdefault(band, set()).add(key)
+
+    def query(self, signature: List[int], threshold: float) -> List[Tuple[str, float]]:
+        """Return (key, estimated jaccard) for indexed entries at or above *threshold*"""
+        candidates = set()
+        for band in self._bands(signature):
+            candidates |= self._buckets.get(band, set())
+        matches = [(key, estimate_jaccard(signature, self.signatures[key])) for key in candidates]
+        return sorted((m for m in matches if m[1] >= threshold), key=lambda m: m[1], reverse=True)
+
+
+def cluster_stories(stories: List[Story], threshold: float = RUN_THRESHOLD) -> List[List[Story]]:
+    """Group near-duplicate stories; each cluster keeps research order, first story first"""
+    lsh = MinHashLSH()
+    clusters: List[List[Story]] = []
+    owner: Dict[str, int] = {}
+    for i, story in enumerate(stories):
+        signature = story_signature(story)
+        matches = lsh.query(signature, threshold)
+        if matches:
+            cluster_index = owner[matches[0][0]]
+            clusters[cluster_index].append(story)
+        else:
+            cluster_index = len(clusters)
+            clusters.append([story])
+        key = str(i)
+        owner[key] = cluster_index
+        lsh.add(key, signature)
+    return clusters
+
+
+def aired_stories(script: str, summary: str = "") -> List[Story]:
+    """The stories an episode covered, as headline + summary records.
+
+    *summary* is the episode's prioritized STORY list when it was kept;
+    otherwise each script section gives its headline and first paragraph,
+    the paragraph that says what happened.
+    """
+    stories = parse_stories(summary or "")
+    if stories:
+        return stories
+    return [Story(headline=section.headline, summary=section.lines[1] if len(section.lines) > 1 else "")
+            for section in split_script(script or "") if section.kind == "story"]
+
+
+class StoryHistoryIndex:
+    """Persisted LSH index of the stories already-published episodes covered.
+
+    Each date keeps a fingerprint of the script it was indexed from;
+    refreshing re-indexes a date only when its episode changed, so each day's
+    check stays incremental. find() only considers entries dated
+    since <= date < until.
+    """
+
+    def __init__(self, path: str = STORY_INDEX_PATH, since: Optional[str] = None, until: Optional[str] = None):
+        self.path = path
+        self.since = since
+        self.until = until
+        self.lsh = MinHashLSH()
+        self.sections: Dict[str, Dict] = {}
+        self.indexed_dates: Set[str] = set()
+        self.fingerprints: Dict[str, str] = {}
+
+    @classmethod
+    def load(cls, path: str = STORY_INDEX_PATH) -> "StoryHistoryIndex":
+        index = cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return index
+        if data.get("version") != INDEX_VERSION:
+            return index
+        index.fingerprints = dict(data.get("fingerprints", {}))
+        index.indexed_dates = set(index.fingerprints)
+        for key, entry in data.get("sections", {}).items():
+            index.sections[key] = {"date": entry["date"], "text": entry["text"]}
+            index.lsh.add(key, entry["signature"])
+        return index
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        data = {
+            "version": INDEX_VERSION,
+            "fingerprints": dict(sorted(self.fingerprints.items())),
+            "sections": {
+                key: dict(entry, signature=self.lsh.signatures[key])
+                for key, entry in self.sections.items()
+            },
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def add_script(self, date: str, script: str, summary: str = "") -> int:
+        """Index the episode aired on *date*, replacing that date's entries if its episode changed
+
+        Returns the number of stories indexed; 0 when the date is already
+        indexed from the same script and summary.
+        """
+        fingerprint = hashlib.sha256(f"{script}\0{summary or ''}".encode("utf-8")).hexdigest()
+        if self.fingerprints.get(date) == fingerprint:
+            return 0
+        if date in self.indexed_dates:
+            self._drop({key for key, entry in self.sections.items() if entry["date"] == date})
+        stories = aired_stories(script, summary)
+        for i, story in enumerate(stories):
+            key = f"{date}#{i}"
+            self.sections[key] = {"date": date, "text": f"{story.headline} {story.summary}"[:200]}
+            self.lsh.add(key, story_signature(story))
+        self.indexed_dates.add(date)
+        self.fingerprints[date] = fingerprint
+        return len(stories)
+
+    def prune(self, before: str) -> None:
+        """Drop sections older than *before* (YYYY-MM-DD) to keep the index small"""
+        self.indexed_dates = {d for d in self.indexed_dates if d >= before}
+        self.fingerprints = {d: f for d, f in self.fingerprints.items() if d >= before}
+        self._drop({key for key, entry in self.sections.items() if entry["date"] < before})
+
+    def _drop(self, stale: Set[str]) -> None:
+        """Remove *stale* section keys, rebuilding the LSH buckets from the rest"""
+        if not stale:
+            return
+        kept = {key: self.lsh.signatures[key] for key in self.sections if key not in stale}
+        for key in stale:
+            del self.sections[key]
+        self.lsh = MinHashLSH()
+        for key, signature in kept.items():
+            self.lsh.add(key, signature)
+
+    def find(self, story: Story, since: Optional[str] = None, until: Optional[str] = None,
+             threshold: float = HISTORY_THRESHOLD) -> Optional[Dict]:
+        """Return the best matching earlier story for *story*, if any"""
+        since, until = since or self.since, until or self.until
+        for key, score in self.lsh.query(story_signature(story), threshold):
+            entry = self.sections[key]
+            if (since is None or entry["date"] >= since) and (until is None or entry["date"] < until):
+                return dict(entry, score=round(score, 3))
+        return None
+
+
+def dedupe_stories(stories: List[Story], history: Optional[StoryHistoryIndex] = None,
+                   since: Optional[str] = None, until: Optional[str] = None) -> Tuple[List[Story], List[Tuple[Story, str]]]:
+    """Keep one story per near-duplicate cluster and drop ones already covered recently"""
+    kept = []
+    dropped = []
+    for cluster in cluster_stories(stories):
+        representative = max(cluster, key=lambda s: (bool(s.url), len(s.summary)))
+        for story in cluster:
+            if story is not representative:
+                dropped.append((story, f"near-duplicate of '{representative.headline}'"))
+        match = history.find(representative, since=since, until=until) if history else None
+        if match:
+            dropped.append((representative, f"covered on {match['date']}"))
+        else:
+            kept.append(representative)
+    return kept, dropped
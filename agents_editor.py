@@ -0,0 +1,163 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from agents_budget import estimate_tokens
+from agents_client import run_anthropic_chat
+from agents_pipeline_v3 import cached_prompt, clean_agent_output, editorial_review
+from agents_tiering import submit_in_context
+from agents_validation import Section, join_sections, scan, split_script
+
+# Incremental editorial review for the V3 pipeline
+# Features:
+# - The script is split into intro, per-story and outro sections
+# - Only sections that fail their own checks (leakage, missing citation,
+#   missing paragraph, opening/closing format) are sent to the editor, with
+#   the neighbouring headlines as context
+# - Edited sections are spliced back; untouched sections are kept verbatim
+# - parallel_editorial_review(): every story section polished concurrently
+#
+# Each section edit is an ordinary cached call, so a rerun on a partly
+# changed draft only pays for the sections whose text changed.
+
+SECTION_MAX_TOKENS = 2048
+
+
+def section_issues(section: Section) -> List[str]:
+    """What the editor has to fix in this section; empty when it can stay as is"""
+    found = scan(section.text)
+    issues = []
+    if found.has_leakage:
+        issues.append("Remove the search-process commentary")
+    if section.kind == "intro" and not found.has_opening:
+        issues.append('Open with "Hello world… welcome back to Apes On Knowledge..." and the host introduction')
+    elif section.kind == "story":
+        if found.citation_count == 0:
+            issues.append('Attribute the story to its source, e.g. "TechCrunch reports in \'Title\' that..."')
+        if len(section.lines) < 3:
+            issues.append("Give the story two paragraphs: what happened, then why it matters to AI practitioners")
+    elif section.kind == "outro" and not found.has_closing:
+        issues.append('Close with a short themes paragraph and "Until tomorrow, this is A-OK Newsbot… signing off."')
+    return issues
+
+
+SECTION_EDIT_INSTRUCTIONS = """
+You are editing one section of the Apes On Knowledge podcast script. The rest of the script is already final.
+
+Fix ONLY the issues listed with the section at the end. Keep everything else as it is: facts, sources, order and tone for radio delivery.
+
+Return ONLY the revised section. No editing commentary or process notes.
+"""
+
+
+def section_edit_messages(section: Section, issues: List[str], before: Optional[str] = None,
+                          after: Optional[str] = None, headlines: Optional[List[str]] = None) -> List[Dict]:
+    context = []
+    if before:
+        context.append(f"Previous story: {before}")
+    if after:
+        context.append(f"Next story: {after}")
+    if headlines:
+        context.append("Today's stories:\n" + "\n".join(f"- {h}" for h in headlines))
+    fixes = "\n".join(f"- {issue}" for issue in issues)
+    return cached_prompt(SECTION_EDIT_INSTRUCTIONS, f"""Section type: {section.kind}
+
+Issues to fix:
+{fixes}
+
+{chr(10).join(context)}
+
+Section to edit:
+{section.text or "(missing - write it)"}
+""")
+
+
+def edit_section(section: Section, issues: List[str], **context) -> Section:
+    messages = section_edit_messages(section, issues, **context)
+    max_tokens = min(SECTION_MAX_TOKENS, 2 * estimate_tokens(section.text) + 256)
+    result = clean_agent_output(run_anthropic_chat(messages, max_tokens=max_tokens, stage="editorial", tools=None))
+    return Section(section.kind, result.splitlines())
+
+
+def incremental_editorial_review(script: str, expected_stories: int = 10, max_workers: int = 4,
+                                 debug: bool = False) -> str:
+    """editorial_review() that only rewrites the sections that need it.
+
+    Falls back to a full review when the story count is wrong, since that
+    cannot be fixed one section at a time. A section whose edit fails keeps
+    its original text.
+    """
+    sections = split_script(script)
+    headlines = [s.headline for s in sections if s.kind == "story"]
+    if len(headlines) != expected_stories:
+        if debug:
+            print(f"   ✏️  Found {len(headlines)} story sections, running the full editor")
+        return editorial_review(script)
+
+    def context(index: int) -> Dict:
+        section = sections[index]
+        if section.kind == "outro":
+            return {"headlines": headlines}
+        return {
+            "before": sections[index - 1].headline if index > 0 else None,
+            "after": sections[index + 1].headline if index + 1 < len(sections) else None,
+        }
+
+    jobs = {index: (issues, context(index)) for index, section in enumerate(sections)
+            if (issues := section_issues(section))}
+    if debug:
+        print(f"   ✏️  Editing {len(jobs)} of {len(sections)} sections")
+    return _apply_edits(sections, jobs, max_workers)
+
+
+def _apply_edits(sections: List[Section], jobs: Dict[int, tuple], max_workers: int) -> str:
+    """Run edit_section for every {index: (issues, context)} concurrently and splice the results"""
+    edited = list(sections)
+    if not jobs:
+        return join_sections(edited)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {submit_in_context(pool, edit_section, sections[index], issues, **context): index
+                   for index, (issues, context) in jobs.items()}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                edited[index] = future.result()
+            except Exception as exc:
+                logging.warning(f"Editing {sections[index].kind} section {index} failed, keeping it: {exc}")
+    return join_sections(edited)
+
+
+POLISH_ISSUES = [
+    "Polish the language for radio delivery",
+    "Use the consistent citation format: \"<Publication> reports in '<Title>' that...\"",
+    "Keep the headline line and exactly two paragraphs",
+]
+
+
+def parallel_editorial_review(script: str, expected_stories: int = 10, max_workers: int = 10,
+                              debug: bool = False) -> str:
+    """editorial_review() fanned out: each story section is polished in its own call.
+
+    Intro and outro are edited only when they fail their checks. Falls back to
+    a full review when the story count is wrong.
+    """
+    sections = split_script(script)
+    headlines = [s.headline for s in sections if s.kind == "story"]
+    if len(headlines) != expected_stories:
+        if debug:
+            print(f"   ✏️  Found {len(headlines)} story sections, running the full editor")
+        return editorial_review(script)
+
+    jobs = {}
+    for index, section in enumerate(sections):
+        if section.kind == "story":
+            jobs[index] = (section_issues(section) + POLISH_ISSUES, {
+                "before": sections[index - 1].headline,
+                "after": sections[index + 1].headline,
+            })
+        elif issues := section_issues(section):
+            jobs[index] = (issues, {"headlines": headlines} if section.kind == "outro" else {})
+
+    if debug:
+        print(f"   ✏️  Editing {len(jobs)} of {len(sections)} sections")
+    return _apply_edits(sections, jobs, max_workers)
@@ -0,0 +1,227 @@
+import contextvars
+import hashlib
+import json
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from agents_metrics import metrics_store
+
+# Declarative stage graph for the agents pipelines
+# Features:
+# - Stages declare the context keys they read and the key they write; the
+#   pipeline versions are just different stage lists (see v3_stages)
+# - Stages whose inputs are ready run concurrently, so a stage off the critical
+#   path (metadata, translation) adds no wall time
+# - Per-stage checkpointing, validation and timing, plus event hooks
+#
+# Checkpoint loads/saves and validation run on the calling thread; only the
+# stage functions themselves run on the worker pool. Database-backed
+# checkpoints therefore never touch a connection from another thread.
+
+# Pipeline versions as stage configurations: version -> (module, stage list builder).
+# Every builder takes the episode date plus version-specific keyword options.
+PIPELINE_VERSIONS = {
+    "v1": ("agents_pipeline", "v1_stages"),
+    "v2": ("agents_pipeline_v2", "v2_stages"),
+    "v3": ("agents_pipeline_v3", "v3_stages"),
+}
+
+# hook(event, stage_name, data) with event "stage_start" or "stage_end"
+Hook = Callable[[str, str, Dict], None]
+
+
+def stage_input_hash(stage: str, payload) -> str:
+    """Hash of everything a stage's output depends on, used to match checkpoints"""
+    serialized = json.dumps({"stage": stage, "payload": payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def pipeline_stages(version: str, date_str: str, **options) -> List["Stage"]:
+    """Stage list for a pipeline version, e.g. pipeline_stages("v3", "2025-05-01", metadata=True)"""
+    import importlib
+
+    if version not in PIPELINE_VERSIONS:
+        raise ValueError(f"Unknown pipeline version '{version}', expected one of {sorted(PIPELINE_VERSIONS)}")
+    module_name, builder = PIPELINE_VERSIONS[version]
+    return getattr(importlib.import_module(module_name), builder)(date_str, **options)
+
+
+@dataclass
+class Stage:
+    """One pipeline step.
+
+    *run* is called with the values of *inputs*, in order. Tracked stages are
+    checkpointed under stage_input_hash(name, payload(*inputs)), validated with
+    *validator* and timed in the metrics log; untracked stages are cheap
+    transforms (compaction, dedup) that always run.
+    """
+    name: str
+    run: Callable[..., Any]
+    inputs: Tuple[str, ...] = ()
+    output: Optional[str] = None
+    payload: Optional[Callable[..., Any]] = None
+    validator: Optional[Callable[[Any, int], Dict]] = None
+    expected_stories: int = 10
+    tracked: bool = True
+
+    @property
+    def key(self) -> str:
+        return self.output or self.name
+
+
+@dataclass
+class GraphResult:
+    values: Dict[str, Any]
+    validations: Dict[str, Dict] = field(default_factory=dict)
+    # stage -> (start, end) offsets in seconds from the start of the run
+    timings: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    reused: List[str] = field(default_factory=list)
+    critical_path: List[str] = field(default_factory=list)
+
+
+class StageGraph:
+    def __init__(self, stages: Sequence[Stage]):
+        self.stages = list(stages)
+        self.by_key: Dict[str, Stage] = {}
+        for stage in self.stages:
+            if stage.key in self.by_key:
+                raise ValueError(f"Stages '{self.by_key[stage.key].name}' and '{stage.name}' both write '{stage.key}'")
+            self.by_key[stage.key] = stage
+        if len({stage.name for stage in self.stages}) != len(self.stages):
+            raise ValueError("Stage names must be unique")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[Stage]:
+        order, state = [], {}
+
+        def visit(stage: Stage, path: Tuple[str, ...]):
+            if state.get(stage.name) == "done":
+                return
+            if state.get(stage.name) == "visiting":
+                raise ValueError(f"Stage graph has a cycle: {' -> '.join(path + (stage.name,))}")
+            state[stage.name] = "visiting"
+            for key in stage.inputs:
+                if key in self.by_key:
+                    visit(self.by_key[key], path + (stage.name,))
+            state[stage.name] = "done"
+            order.append(stage)
+
+        for stage in self.stages:
+            visit(stage, ())
+        return order
+
+    def missing_inputs(self, provided: Iterable[str]) -> List[str]:
+        available = set(provided) | set(self.by_key)
+        return sorted({key for stage in self.stages for key in stage.inputs if key not in available})
+
+    def run(self, context: Optional[Dict[str, Any]] = None, checkpoint=None, debug: bool = False,
+            hooks: Iterable[Hook] = (), max_workers: int = 4) -> GraphResult:
+        """Run every stage once its inputs exist.
+
+        *context* supplies the external inputs (date, options). *checkpoint* is
+        any object with load(stage, input_hash) -> dict|None and save(stage,
+        input_hash, output, validation, duration_seconds); see
+        digests.checkpoints.PipelineCheckpoint. The first stage error
+        is raised after in-flight stages finish; nothing downstream of it runs.
+        """
+        values = dict(context or {})
+        missing = self.missing_inputs(values)
+        if missing:
+            raise ValueError(f"Stage graph inputs not provided: {', '.join(missing)}")
+
+        result = GraphResult(values=values)
+        hooks = list(hooks)
+        pending = list(self.order)
+        running = {}
+        origin = time.monotonic()
+
+        def emit(event: str, stage: Stage, data: Dict):
+            for hook in hooks:
+                hook(event, stage.name, data)
+
+        def timed(stage: Stage, args: List):
+            started = time.monotonic()
+            return stage.run(*args), started, time.monotonic()
+
+        def finish(stage: Stage, output, started: float, ended: float, input_hash: Optional[str]):
+            values[stage.key] = output
+            result.timings[stage.name] = (started - origin, ended - origin)
+            data = {"seconds": round(ended - started, 3)}
+            if stage.tracked:
+                validation = stage.validator(output, stage.expected_stories) if stage.validator else None
+                result.validations[stage.name] = validation
+                metrics_store.record_stage(stage.name, ended - started)
+                if checkpoint is not None:
+                    checkpoint.save(stage.name, input_hash, output, validation, ended - started)
+                data["validation"] = validation
+            emit("stage_end", stage, data)
+
+        def start_ready(pool: ThreadPoolExecutor):
+            for stage in [s for s in pending if all(key in values for key in s.inputs)]:
+                pending.remove(stage)
+                args = [values[key] for key in stage.inputs]
+                input_hash = None
+                if stage.tracked:
+                    payload = stage.payload(*args) if stage.payload else args
+                    input_hash = stage_input_hash(stage.name, payload)
+                    stored = checkpoint.load(stage.name, input_hash) if checkpoint is not None else None
+                    if stored is not None:
+                        if debug:
+                            print(f"⏭️  Reusing checkpointed {stage.name} output")
+                        values[stage.key] = stored["output"]
+                        result.validations[stage.name] = stored["validation"]
+                        result.reused.append(stage.name)
+                        metrics_store.record_stage(stage.name, 0.0, reused=True)
+                        emit("stage_end", stage, {"seconds": 0.0, "validation": stored["validation"], "reused": True})
+                        return True
+                emit("stage_start", stage, {})
+                # Stage functions see the caller's context (client, metrics capture)
+                running[pool.submit(contextvars.copy_context().run, timed, stage, args)] = (stage, input_hash)
+            return False
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            error = None
+            while pending or running:
+                # Reuse can make more stages ready, so keep scheduling until stable
+                while error is None and start_ready(pool):
+                    pass
+                if not running:
+                    if pending and error is None:
+                        raise ValueError(f"Stages can never run: {', '.join(s.name for s in pending)}")
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, input_hash = running.pop(future)
+                    try:
+                        output, started, ended = future.result()
+                    except Exception as exc:
+                        if error is None:
+                            error = exc
+                        else:
+                            logging.warning(f"Stage {stage.name} also failed: {exc}")
+                        continue
+                    if error is None:
+                        finish(stage, output, started, ended, input_hash)
+            if error is not None:
+                raise error
+
+        result.critical_path = self.critical_path(result.timings)
+        return result
+
+    def critical_path(self, timings: Dict[str, Tuple[float, float]]) -> List[str]:
+        """Stages on the longest chain: from the last stage to finish, follow the
+        input that finished last back to the start of the run"""
+        if not timings:
+            return []
+        path = []
+        current = max(timings, key=lambda name: timings[name][1])
+        by_name = {stage.name: stage for stage in self.stages}
+        while current is not None:
+            path.append(current)
+            upstream = [self.by_key[key].name for key in by_name[current].inputs
+                        if key in self.by_key and self.by_key[key].name in timings]
+            current = max(upstream, key=lambda name: timings[name][1]) if upstream else None
+        return list(reversed(path))
@@ -0,0 +1,323 @@
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Per-stage usage and latency metrics
+# Features:
+# - One JSON line per model call (wall time, input/output tokens, prompt-cache
+#   reads/writes, web searches, stop_reason)
+#   and per pipeline stage (wall time, reused from checkpoint or not)
+# - One line per model-tier attempt of a tiered stage (agents_tiering), so
+#   per-tier latency and validation pass rates can be compared
+# - p50/p95 summaries per stage over a time window
+# - The log rotates by size (metrics.jsonl.1, .2, ...), so a scrape reads at
+#   most (backups + 1) * max_bytes and skips backups older than its window
+# - Prometheus text exposition for the /api/metrics endpoint
+# - capture_metrics(): the records of one context collected in memory instead
+#   of the log, e.g. one benchmark run
+
+METRICS_PATH = os.getenv(
+    "AOK_METRICS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "metrics.jsonl"),
+)
+METRICS_ENABLED = os.getenv("AOK_METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+METRICS_MAX_BYTES = int(os.getenv("AOK_METRICS_MAX_BYTES", str(4 * 1024 * 1024)))
+METRICS_BACKUPS = int(os.getenv("AOK_METRICS_BACKUPS", "3"))
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty list"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def web_search_count(response) -> int:
+    """Web searches the model ran while producing *response*"""
+    usage = getattr(response, "usage", None)
+    server_tool_use = getattr(usage, "server_tool_use", None)
+    requests = getattr(server_tool_use, "web_search_requests", None)
+    if isinstance(requests, int):
+        return requests
+    return sum(1 for block in getattr(response, "content", []) or []
+               if getattr(block, "type", None) == "server_tool_use")
+
+
+def cache_token_counts(usage) -> Tuple[int, int]:
+    """(cache read, cache write) input tokens; zero when the usage block has no cache fields"""
+    counts = (getattr(usage, "cache_read_input_tokens", None), getattr(usage, "cache_creation_input_tokens", None))
+    return tuple(count if isinstance(count, int) else 0 for count in counts)
+
+
+_captured = contextvars.ContextVar("aok_metrics_capture", default=None)
+
+
+@contextmanager
+def capture_metrics() -> Iterator[List[Dict]]:
+    """Collect the records made in this context into the yielded list; nothing reaches the log"""
+    records: List[Dict] = []
+    token = _captured.set(records)
+    try:
+        yield records
+    finally:
+        _captured.reset(token)
+
+
+class MetricsStore:
+    """Append-only JSONL metrics log, rotated once it reaches max_bytes"""
+
+    def __init__(self, path: str = METRICS_PATH, enabled: bool = METRICS_ENABLED,
+                 max_bytes: int = METRICS_MAX_BYTES, backups: int = METRICS_BACKUPS):
+        self.path = path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+
+    def _files(self) -> List[str]:
+        """Log files, oldest first"""
+        return [f"{self.path}.{n}" for n in range(self.backups, 0, -1)] + [self.path]
+
+    def _rotate(self) -> None:
+        """metrics.jsonl -> .1 -> .2 ...; the oldest backup is dropped"""
+        files = self._files()
+        for older, newer in zip(files, files[1:]):
+            if os.path.exists(newer):
+                os.replace(newer, older)
+
+    def _append(self, record: Dict) -> None:
+        captured = _captured.get()
+        if captured is not None:
+            captured.append(dict(record, ts=round(time.time(), 3)))
+            return
+        if not self.enabled:
+            return
+        record = dict(record, ts=round(time.time(), 3))
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                    self._rotate()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+        except OSError as exc:
+            logging.warning(f"Could not write metrics: {exc}")
+
+    def record_call(self, stage: Optional[str], seconds: float, model: str, response=None,
+                    cached: bool = False) -> None:
+        usage = getattr(response, "usage", None)
+        cache_read, cache_write = cache_token_counts(usage)
+        self._append({
+            "kind": "call",
+            "stage": stage or "chat",
+            "model": model,
+            "seconds": round(seconds, 3),
+            "cached": cached,
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+            "cache_read_tokens": cache_read,
+            "cache_write_tokens": cache_write,
+            "web_searches": web_search_count(response) if response is not None else 0,
+            "stop_reason": getattr(response, "stop_reason", None) or ("cached" if cached else None),
+        })
+
+    def record_stage(self, stage: str, seconds: float, reused: bool = False) -> None:
+        self._append({
+            "kind": "stage",
+            "stage": stage,
+            "seconds": round(seconds, 3),
+            "reused": reused,
+        })
+
+    def record_tier(self, stage: str, tier: str, model: str, seconds: float, passed: bool) -> None:
+        self._append({
+            "kind": "tier",
+            "stage": stage,
+            "tier": tier,
+            "model": model,
+            "seconds": round(seconds, 3),
+            "passed": passed,
+        })
+
+    def read(self, since: Optional[float] = None) -> List[Dict]:
+        """Records with a timestamp at or after *since* (epoch seconds), oldest first"""
+        records = []
+        for path in self._files():
+            try:
+                # A file last written before the window holds nothing in it
+                if since is not None and os.path.getmtime(path) < since:
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        if since is None or record.get("ts", 0) >= since:
+                            records.append(record)
+            except OSError:
+                continue
+        return records
+
+
+metrics_store = MetricsStore()
+
+
+def summarize(records: Iterable[Dict]) -> Dict[str, Dict]:
+    """Per-stage latency percentiles and usage totals.
+
+    Stage wall time only counts stages that actually ran, not checkpoint reuse;
+    token totals only count calls that reached the API.
+    """
+    stages: Dict[str, Dict] = defaultdict(lambda: {
+        "runs": 0, "reused": 0, "seconds": [], "calls": 0, "cached_calls": 0, "call_seconds": [],
+        "input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0,
+        "web_searches": 0, "stop_reasons": defaultdict(int),
+        "tiers": defaultdict(lambda: {"attempts": 0, "passed": 0, "seconds": []}),
+    })
+    for record in records:
+        entry = stages[record.get("stage", "chat")]
+        if record.get("kind") == "tier":
+            tier = entry["tiers"][record.get("tier", "unknown")]
+            tier["attempts"] += 1
+            tier["passed"] += 1 if record.get("passed") else 0
+            tier["seconds"].append(record["seconds"])
+        elif record.get("kind") == "stage":
+            if record.get("reused"):
+                entry["reused"] += 1
+            else:
+                entry["runs"] += 1
+                entry["seconds"].append(record["seconds"])
+        elif record.get("cached"):
+            entry["cached_calls"] += 1
+        else:
+            entry["calls"] += 1
+            entry["call_seconds"].append(record["seconds"])
+            entry["input_tokens"] += record.get("input_tokens", 0)
+            entry["output_tokens"] += record.get("output_tokens", 0)
+            entry["cache_read_tokens"] += record.get("cache_read_tokens", 0)
+            entry["cache_write_tokens"] += record.get("cache_write_tokens", 0)
+            entry["web_searches"] += record.get("web_searches", 0)
+            entry["stop_reasons"][record.get("stop_reason") or "unknown"] += 1
+
+    summary = {}
+    for stage, entry in stages.items():
+        summary[stage] = {
+            "runs": entry["runs"],
+            "reused": entry["reused"],
+            "p50_seconds": percentile(entry["seconds"], 0.5),
+            "p95_seconds": percentile(entry["seconds"], 0.95),
+            "total_seconds": round(sum(entry["seconds"]), 3),
+            "calls": entry["calls"],
+            "cached_calls": entry["cached_calls"],
+            "call_p50_seconds": percentile(entry["call_seconds"], 0.5),
+            "call_p95_seconds": percentile(entry["call_seconds"], 0.95),
+            "call_seconds_sum": round(sum(entry["call_seconds"]), 3),
+            "input_tokens": entry["input_tokens"],
+            "output_tokens": entry["output_tokens"],
+            "cache_read_tokens": entry["cache_read_tokens"],
+            "cache_write_tokens": entry["cache_write_tokens"],
+            "web_searches": entry["web_searches"],
+            "stop_reasons": dict(entry["stop_reasons"]),
+            "tiers": {
+                name: {
+                    "attempts": tier["attempts"],
+                    "pass_rate": round(tier["passed"] / tier["attempts"], 3),
+                    "p50_seconds": percentile(tier["seconds"], 0.5),
+                    "p95_seconds": percentile(tier["seconds"], 0.95),
+                }
+                for name, tier in sorted(entry["tiers"].items())
+            },
+        }
+    return summary
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def prometheus_text(summary: Dict[str, Dict]) -> str:
+    """Prometheus text exposition (version 0.0.4) of a summarize() result.
+
+    The summary covers the records still in the rotating metrics log, so its
+    totals can go down; every series is exported as a gauge, not a counter.
+    """
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if value is not None:
+                lines.append(f"{name}{_labels(**labels)} {value}")
+
+    stages = sorted(summary)
+    metric("aok_stage_duration_seconds", "gauge", "Wall time quantiles of pipeline stages that ran (not reused).", [
+        sample
+        for stage in stages
+        for sample in (
+            ({"stage": stage, "quantile": "0.5"}, summary[stage]["p50_seconds"]),
+            ({"stage": stage, "quantile": "0.95"}, summary[stage]["p95_seconds"]),
+        )
+    ])
+    metric("aok_stage_seconds", "gauge", "Total wall time of pipeline stages that ran.",
+           [({"stage": stage}, summary[stage]["total_seconds"]) for stage in stages])
+    metric("aok_stage_runs", "gauge", "Pipeline stages that ran (not reused).",
+           [({"stage": stage}, summary[stage]["runs"]) for stage in stages])
+    metric("aok_stage_reused", "gauge", "Stages served from a checkpoint.",
+           [({"stage": stage}, summary[stage]["reused"]) for stage in stages])
+    metric("aok_llm_call_duration_seconds", "gauge", "Latency quantiles of Anthropic calls that reached the API.", [
+        sample
+        for stage in stages
+        for sample in (
+            ({"stage": stage, "quantile": "0.5"}, summary[stage]["call_p50_seconds"]),
+            ({"stage": stage, "quantile": "0.95"}, summary[stage]["call_p95_seconds"]),
+        )
+    ])
+    metric("aok_llm_call_seconds", "gauge", "Total latency of Anthropic calls that reached the API.",
+           [({"stage": stage}, summary[stage]["call_seconds_sum"]) for stage in stages])
+    metric("aok_llm_calls", "gauge", "Anthropic calls that reached the API.",
+           [({"stage": stage}, summary[stage]["calls"]) for stage in stages])
+    metric("aok_llm_cached_calls", "gauge", "Anthropic calls answered by the response cache.",
+           [({"stage": stage}, summary[stage]["cached_calls"]) for stage in stages])
+    metric("aok_llm_input_tokens", "gauge", "Input tokens billed.",
+           [({"stage": stage}, summary[stage]["input_tokens"]) for stage in stages])
+    metric("aok_llm_output_tokens", "gauge", "Output tokens billed.",
+           [({"stage": stage}, summary[stage]["output_tokens"]) for stage in stages])
+    metric("aok_llm_cache_read_tokens", "gauge", "Input tokens read from the prompt cache.",
+           [({"stage": stage}, summary[stage]["cache_read_tokens"]) for stage in stages])
+    metric("aok_llm_cache_write_tokens", "gauge", "Input tokens written to the prompt cache.",
+           [({"stage": stage}, summary[stage]["cache_write_tokens"]) for stage in stages])
+    metric("aok_llm_web_searches", "gauge", "Web search tool invocations.",
+           [({"stage": stage}, summary[stage]["web_searches"]) for stage in stages])
+    metric("aok_llm_stop_reasons", "gauge", "Anthropic calls by stop_reason.", [
+        ({"stage": stage, "stop_reason": reason}, count)
+        for stage in stages
+        for reason, count in sorted(summary[stage]["stop_reasons"].items())
+    ])
+    tiers = [(stage, tier, entry) for stage in stages for tier, entry in summary[stage].get("tiers", {}).items()]
+    metric("aok_tier_attempts", "gauge", "Tiered stage attempts per model tier.",
+           [({"stage": stage, "tier": tier}, entry["attempts"]) for stage, tier, entry in tiers])
+    metric("aok_tier_pass_rate", "gauge", "Share of tier attempts that passed validation.",
+           [({"stage": stage, "tier": tier}, entry["pass_rate"]) for stage, tier, entry in tiers])
+    metric("aok_tier_duration_seconds", "gauge", "Wall time quantiles of tiered stage attempts.", [
+        sample
+        for stage, tier, entry in tiers
+        for sample in (
+            ({"stage": stage, "tier": tier, "quantile": "0.5"}, entry["p50_seconds"]),
+            ({"stage": stage, "tier": tier, "quantile": "0.95"}, entry["p95_seconds"]),
+        )
+    ])
+    return "\n".join(lines) + "\n"
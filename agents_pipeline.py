@@ -1,9 +1,8 @@
-import anthropic
-import os
-
 import logging
 from typing import List, Dict
 from datetime import date as dt_date
+from agents_client import run_anthropic_chat
+from agents_graph import Stage, StageGraph
 
 # Multi-agent pipeline for "Apes On Knowledge" - AI Daily News
 # Features:
@@ -12,26 +11,7 @@ from datetime import date as dt_date
 # - Writer Agent: Script generation following sample format and style guidelines
 # - Editor Agent: Final polish for tone, citations, and structure consistency
 # - All agents trained on sample script best practices for professional AI news delivery
-
-# Initialize the Anthropic client
-anthropic_client = anthropic.Client(api_key=os.getenv("ANTHROPIC_API_KEY"))
-
-def run_anthropic_chat(messages: List[Dict], model="claude-3-5-sonnet-20241022") -> str:
-    response = anthropic_client.messages.create(
-        model=model,
-        messages=messages,
-        tools=[{
-            "type": "web_search_20250305",
-            "name": "web_search"
-        }],
-        max_tokens=4096
-    )
-    # Extract text content from the response
-    text_content = ""
-    for content_block in response.content:
-        if hasattr(content_block, "text"):
-            text_content += content_block.text
-    return text_content.strip()
+# - Model calls go through agents_client, shared with the v2 and v3 pipelines
 
 # Agent 1: Research collector – extracts headlines and summaries with citations.
 def collect_research(date: str) -> str:
@@ -65,7 +45,7 @@ Use web search to find the most recent AI developments and ensure accuracy and r
 """
         }
     ]
-    return run_anthropic_chat(messages)
+    return run_anthropic_chat(messages, max_tokens=4096, stage="research")
 
 # Agent 2: Prioritizer/editor – ranks, removes redundancy, checks for exclusions (e.g., Elon Musk news).
 def prioritize_and_filter(research: str) -> str:
@@ -103,7 +83,7 @@ Here's the research to prioritize:
 """
         }
     ]
-    return run_anthropic_chat(messages)
+    return run_anthropic_chat(messages, max_tokens=4096, stage="prioritize")
 
 # Agent 3: Writer/Producer – writes final script using a templated tone and intro/outro structure.
 def write_script(prioritized_summary: str, target_date: str) -> str:
@@ -149,7 +129,7 @@ Here are the prioritized stories to convert into the script:
 """
         }
     ]
-    return run_anthropic_chat(messages)
+    return run_anthropic_chat(messages, max_tokens=4096, stage="script")
 
 # Optional Editor Agent: Polishes for clarity, tone, and citation quality.
 def editorial_review(script: str) -> str:
@@ -187,16 +167,30 @@ Here's the script to review and polish:
 """
         }
     ]
-    return run_anthropic_chat(messages)
+    return run_anthropic_chat(messages, max_tokens=4096, stage="editorial")
+
+def v1_stages(date_str: str, with_editor: bool = True) -> List[Stage]:
+    """The v1 pipeline as a stage graph: a plain chain with no checkpoints or validation"""
+    stages = [
+        Stage("research", lambda: collect_research(date_str), tracked=False),
+        Stage("prioritize", lambda research: prioritize_and_filter(research),
+              inputs=("research",), output="summary", tracked=False),
+        Stage("script", lambda summary: write_script(summary, date_str),
+              inputs=("summary",), output="draft", tracked=False),
+    ]
+    if with_editor:
+        stages.append(Stage("editorial", lambda draft: editorial_review(draft),
+                            inputs=("draft",), output="script", tracked=False))
+    return stages
 
 def generate_episode(date_str: str = None, with_editor: bool = True, human_review: bool = False) -> Dict:
     date_str = date_str or str(dt_date.today())
     logging.info(f"Starting script generation for {date_str}")
 
-    research = collect_research(date_str)
-    summary = prioritize_and_filter(research)
-    script = write_script(summary, date_str)
-    reviewed_script = editorial_review(script) if with_editor else script
+    values = StageGraph(v1_stages(date_str, with_editor)).run().values
+    research = values["research"]
+    summary = values["summary"]
+    reviewed_script = values["script"] if with_editor else values["draft"]
 
     if human_review:
         # Placeholder for human review logic
@@ -0,0 +1,212 @@
+import asyncio
+import os
+import logging
+from typing import Dict, Iterable, List
+from datetime import date as dt_date
+from agents_budget import compact_stage_input
+from agents_client import WEB_SEARCH_TOOLS, cached_chat, finish_chat, prepare_chat
+from agents_ratelimit import rate_limiter
+from agents_resilience import resilient_call_async
+from agents_transport import make_async_client
+from agents_research_shards import DEFAULT_SHARDS, SHARD_MAX_TOKENS, SHARD_MAX_WORKERS, ResearchShard, merge_research, shard_messages
+from agents_pipeline_v3 import (
+    clean_agent_output,
+    editorial_messages,
+    metadata_messages,
+    parse_metadata,
+    prioritize_messages,
+    research_messages,
+    script_messages,
+    translation_messages,
+    validate_metadata,
+    validate_output,
+    validate_translation,
+)
+from agents_validation import validate_script
+
+# Asyncio variant of the V3 multi-agent pipeline
+# Features:
+# - Same prompts, cleaning, input compaction and validation as agents_pipeline_v3
+# - Built on the async Anthropic client so stages never block a thread
+# - Same call layer as the threaded pipelines (agents_client): response cache,
+#   rate limiter, retries and circuit breaker, metrics and output history
+# - Independent calls of one episode (research shards, metadata and
+#   translation) run together under asyncio.gather
+# - generate_episodes_async drives many dates at once under a concurrency cap
+# - Awaitable directly from async Django views
+
+# Initialize the async Anthropic client
+async_anthropic_client = make_async_client(api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+async def run_anthropic_chat_async(messages: List[Dict], model: str = None, max_tokens=8192,
+                                   stage: str = None, use_cache: bool = True,
+                                   tools: List[Dict] = WEB_SEARCH_TOOLS) -> str:
+    """agents_client.run_anthropic_chat on the async client"""
+    # Cache, metrics and history files are touched off the event loop; that
+    # includes prepare_chat, which reads the token history to size max_tokens
+    call = await asyncio.to_thread(prepare_chat, messages, model, max_tokens, stage, use_cache, tools)
+    cached = await asyncio.to_thread(cached_chat, call)
+    if cached is not None:
+        return cached
+
+    async def attempt(timeout: float):
+        return await async_anthropic_client.with_options(timeout=timeout, max_retries=0).messages.create(
+            **call.request)
+
+    async def acquire():
+        if rate_limiter.enabled:
+            await asyncio.to_thread(rate_limiter.acquire, call.input_tokens)
+
+    response = await resilient_call_async(stage, attempt, acquire=acquire)
+    return await asyncio.to_thread(finish_chat, call, response)
+
+# Agent 1: Research collector
+async def collect_research_async(date: str) -> str:
+    result = await run_anthropic_chat_async(research_messages(date), max_tokens=None, stage="research")
+    return clean_agent_output(result)
+
+async def collect_research_sharded_async(date: str, shards: List[ResearchShard] = None,
+                                        max_concurrency: int = None) -> str:
+    """Async fan-out of agents_research_shards.collect_research_sharded, at most SHARD_MAX_WORKERS at a time by default"""
+    shards = shards if shards is not None else DEFAULT_SHARDS
+    semaphore = asyncio.Semaphore(max_concurrency or SHARD_MAX_WORKERS)
+
+    async def run_shard(shard: ResearchShard) -> str:
+        async with semaphore:
+            result = await run_anthropic_chat_async(shard_messages(shard, date), max_tokens=SHARD_MAX_TOKENS,
+                                                    stage="research")
+            return clean_agent_output(result)
+
+    results = await asyncio.gather(*(run_shard(s) for s in shards), return_exceptions=True)
+    succeeded = []
+    for shard, result in zip(shards, results):
+        if isinstance(result, Exception):
+            logging.warning(f"Research shard {shard.name} failed: {result}")
+        else:
+            succeeded.append(result)
+    if shards and not succeeded:
+        raise RuntimeError(f"All {len(shards)} research shards failed")
+    return merge_research(succeeded)
+
+# Agent 2: Prioritizer
+async def prioritize_and_filter_async(research: str, target_date: str = None) -> str:
+    result = await run_anthropic_chat_async(prioritize_messages(research, target_date), max_tokens=None,
+                                           stage="prioritize")
+    return clean_agent_output(result)
+
+# Agent 3: Script writer
+async def write_script_async(prioritized_summary: str, target_date: str) -> str:
+    result = await run_anthropic_chat_async(script_messages(prioritized_summary, target_date), max_tokens=None,
+                                           stage="script")
+    return clean_agent_output(result)
+
+# Agent 4: Editor
+async def editorial_review_async(script: str) -> str:
+    result = await run_anthropic_chat_async(editorial_messages(script), max_tokens=None, stage="editorial")
+    return clean_agent_output(result)
+
+# Agent 5: Episode metadata
+async def generate_metadata_async(script: str, target_date: str) -> str:
+    return await run_anthropic_chat_async(metadata_messages(script, target_date), max_tokens=None,
+                                          stage="metadata", tools=None)
+
+# Agent 6: Mandarin translation
+async def translate_script_async(script: str) -> str:
+    result = await run_anthropic_chat_async(translation_messages(script), max_tokens=None,
+                                            stage="translate", tools=None)
+    return clean_agent_output(result)
+
+async def generate_episode_async(date_str: str = None, with_editor: bool = True, debug: bool = False,
+                                 sharded_research: bool = False, shard_concurrency: int = None,
+                                 compact_inputs: bool = True, metadata: bool = False,
+                                 translate: bool = False) -> Dict:
+    """Async counterpart of generate_episode_v3 returning the same result dict"""
+    date_str = date_str or str(dt_date.today())
+    logging.info(f"Starting async script generation for {date_str}")
+
+    if sharded_research:
+        research = await collect_research_sharded_async(date_str, max_concurrency=shard_concurrency)
+    else:
+        research = await collect_research_async(date_str)
+    research_validation = validate_output(research, expected_stories=15)
+    if debug:
+        print(f"✅ [{date_str}] Research completed: {len(research)} characters")
+
+    # Oversized stage inputs are compacted to their budget first, as in v3
+    prioritize_input = compact_stage_input("prioritize", research, debug) if compact_inputs else research
+    summary = await prioritize_and_filter_async(prioritize_input, date_str)
+    summary_validation = validate_output(summary, expected_stories=10)
+    if debug:
+        print(f"✅ [{date_str}] Prioritization completed: {len(summary)} characters")
+
+    writer_input = compact_stage_input("script", summary, debug) if compact_inputs else summary
+    script = await write_script_async(writer_input, date_str)
+    script_validation = validate_script(script, expected_stories=10)
+    if debug:
+        print(f"✅ [{date_str}] Script writing completed: {len(script)} characters")
+
+    if with_editor:
+        reviewed_script = await editorial_review_async(script)
+        final_validation = validate_script(reviewed_script, expected_stories=10)
+        if debug:
+            print(f"✅ [{date_str}] Editorial review completed: {len(reviewed_script)} characters")
+    else:
+        reviewed_script = script
+        final_validation = script_validation
+
+    result = {
+        "date": date_str,
+        "research": research,
+        "summary": summary,
+        "script": reviewed_script,
+        "validations": {
+            "research": research_validation,
+            "summary": summary_validation,
+            "script": script_validation,
+            "final": final_validation
+        }
+    }
+
+    # Off the critical path: both only need the final script and run concurrently
+    side_calls = {}
+    if metadata:
+        side_calls["metadata"] = generate_metadata_async(reviewed_script, date_str)
+    if translate:
+        side_calls["translate"] = translate_script_async(reviewed_script)
+    side_results = dict(zip(side_calls, await asyncio.gather(*side_calls.values())))
+    if metadata:
+        result["metadata"] = parse_metadata(side_results["metadata"])
+        result["validations"]["metadata"] = validate_metadata(side_results["metadata"])
+    if translate:
+        result["script_zh"] = side_results["translate"]
+        result["validations"]["translation"] = validate_translation(side_results["translate"])
+    return result
+
+async def generate_episodes_async(dates: Iterable[str], with_editor: bool = True,
+                                  max_concurrency: int = 4, debug: bool = False,
+                                  sharded_research: bool = False) -> Dict[str, Dict]:
+    """Run one episode per date concurrently, at most *max_concurrency* at a time.
+
+    Failures are reported per date as {"date": ..., "error": ...} instead of
+    cancelling the other episodes.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(date_str: str) -> Dict:
+        async with semaphore:
+            try:
+                return await generate_episode_async(date_str, with_editor=with_editor, debug=debug,
+                                                    sharded_research=sharded_research)
+            except Exception as exc:
+                logging.exception(f"Async episode generation failed for {date_str}")
+                return {"date": date_str, "error": str(exc)}
+
+    dates = list(dates)
+    results = await asyncio.gather(*(run_one(d) for d in dates))
+    return dict(zip(dates, results))
+
+if __name__ == "__main__":
+    episode = asyncio.run(generate_episode_async(debug=True))
+    print(f"\n📊 Final Results:")
+    print(f"Script: {len(episode['script'])} chars")
+    print(f"Final validation: {episode['validations']['final']}")
@@ -1,8 +1,7 @@
-import anthropic
-import os
-import logging
 from typing import List, Dict
 from datetime import date as dt_date
+from agents_client import run_anthropic_chat
+from agents_graph import Stage, StageGraph
 
 # Multi-agent pipeline for "Apes On Knowledge" - AI Daily News (Version 2)
 # Features:
@@ -10,26 +9,7 @@ from datetime import date as dt_date
 # - Higher token limits for comprehensive research
 # - Better agent chaining with debug output
 # - Forced web search usage with specific queries
-
-# Initialize the Anthropic client
-anthropic_client = anthropic.Client(api_key=os.getenv("ANTHROPIC_API_KEY"))
-
-def run_anthropic_chat(messages: List[Dict], model="claude-3-5-sonnet-20241022", max_tokens=8192) -> str:
-    response = anthropic_client.messages.create(
-        model=model,
-        messages=messages,
-        tools=[{
-            "type": "web_search_20250305",
-            "name": "web_search"
-        }],
-        max_tokens=max_tokens
-    )
-    # Extract text content from the response
-    text_content = ""
-    for content_block in response.content:
-        if hasattr(content_block, "text"):
-            text_content += content_block.text
-    return text_content.strip()
+# - Model calls go through agents_client, shared with the v1 and v3 pipelines
 
 # Agent 1: Research collector with 24-hour constraint
 def collect_research(date: str) -> str:
@@ -91,15 +71,16 @@ START SEARCHING NOW - Use multiple specific searches to find recent stories.
 """
         }
     ]
-    return run_anthropic_chat(messages, max_tokens=8192)
+    return run_anthropic_chat(messages, max_tokens=8192, stage="research")
 
 # Agent 2: Prioritizer with strict 24-hour verification
-def prioritize_and_filter(research: str) -> str:
+def prioritize_and_filter(research: str, target_date: str = None) -> str:
     from datetime import datetime, timedelta
     
-    # Get today's date for validation
-    today = datetime.now().strftime("%Y-%m-%d")
-    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    # Validate against the episode date, not the wall clock, so backfills work
+    reference = datetime.strptime(target_date, "%Y-%m-%d") if target_date else datetime.now()
+    today = reference.strftime("%Y-%m-%d")
+    yesterday = (reference - timedelta(days=1)).strftime("%Y-%m-%d")
     
     messages = [
         {
@@ -144,7 +125,7 @@ Select your 10 most recent, high-impact stories now.
 """
         }
     ]
-    return run_anthropic_chat(messages, max_tokens=6144)
+    return run_anthropic_chat(messages, max_tokens=6144, stage="prioritize")
 
 # Agent 3: Writer with strict format requirements
 def write_script(prioritized_summary: str, target_date: str) -> str:
@@ -186,7 +167,7 @@ WRITE ALL 10 STORIES - do not skip any. Here's your prioritized content:
 """
         }
     ]
-    return run_anthropic_chat(messages, max_tokens=8192)
+    return run_anthropic_chat(messages, max_tokens=8192, stage="script")
 
 # Agent 4: Editor with verification
 def editorial_review(script: str) -> str:
@@ -217,44 +198,46 @@ DO NOT remove stories or change the core content. Polish this script:
 """
         }
     ]
-    return run_anthropic_chat(messages, max_tokens=8192)
+    return run_anthropic_chat(messages, max_tokens=8192, stage="editorial")
+
+def v2_stages(date_str: str, with_editor: bool = True) -> List[Stage]:
+    """The v2 pipeline as a stage graph: a plain chain with no checkpoints or validation"""
+    stages = [
+        # Step 1: Research with web search
+        Stage("research", lambda: collect_research(date_str), tracked=False),
+        # Step 2: Prioritize to exactly 10 stories
+        Stage("prioritize", lambda research: prioritize_and_filter(research, date_str),
+              inputs=("research",), output="summary", tracked=False),
+        # Step 3: Write script with all 10 stories
+        Stage("script", lambda summary: write_script(summary, date_str),
+              inputs=("summary",), output="draft", tracked=False),
+    ]
+    # Step 4: Editorial review
+    if with_editor:
+        stages.append(Stage("editorial", lambda draft: editorial_review(draft),
+                            inputs=("draft",), output="script", tracked=False))
+    return stages
+
+def _debug_hook(event: str, stage: str, data: Dict) -> None:
+    if event == "stage_end":
+        print(f"✅ {stage.capitalize()} completed in {data['seconds']:.1f}s")
 
 def generate_episode_v2(date_str: str = None, with_editor: bool = True, debug: bool = True) -> Dict:
     date_str = date_str or str(dt_date.today())
     
     if debug:
         print(f"🔍 Starting research for {date_str}...")
-    
-    # Step 1: Research with web search
-    research = collect_research(date_str)
-    if debug:
-        print(f"✅ Research completed: {len(research)} characters")
-        print(f"Research preview: {research[:300]}...")
-    
-    # Step 2: Prioritize to exactly 10 stories
-    summary = prioritize_and_filter(research)
-    if debug:
-        print(f"✅ Prioritization completed: {len(summary)} characters")
-        print(f"Summary preview: {summary[:300]}...")
-    
-    # Step 3: Write script with all 10 stories
-    script = write_script(summary, date_str)
+
+    values = StageGraph(v2_stages(date_str, with_editor)).run(hooks=[_debug_hook] if debug else ()).values
+    reviewed_script = values["script"] if with_editor else values["draft"]
     if debug:
-        print(f"✅ Script writing completed: {len(script)} characters")
-        print(f"Script preview: {script[:300]}...")
-    
-    # Step 4: Editorial review
-    if with_editor:
-        reviewed_script = editorial_review(script)
-        if debug:
-            print(f"✅ Editorial review completed: {len(reviewed_script)} characters")
-    else:
-        reviewed_script = script
-    
+        print(f"Research preview: {values['research'][:300]}...")
+        print(f"Script preview: {reviewed_script[:300]}...")
+
     return {
         "date": date_str,
-        "research": research,
-        "summary": summary,
+        "research": values["research"],
+        "summary": values["summary"],
         "script": reviewed_script
     }
 
@@ -1,9 +1,15 @@
-import anthropic
-import os
+import json
 import logging
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from datetime import date as dt_date
 import re
+from agents_budget import compact_stage_input
+from agents_cache import response_cache
+from agents_client import DEFAULT_MODEL, STAGE_MAX_TOKENS, run_anthropic_chat
+from agents_graph import Stage, StageGraph
+from agents_tiering import MODEL_TIERS, current_model, escalation_path
+from agents_validation import validate_output, validate_script
+from agents_stories import Story, format_stories, parse_stories, serialize_stories, validate_stories
 
 # Multi-agent pipeline for "Apes On Knowledge" - AI Daily News (Version 3)
 # Features:
@@ -11,26 +17,16 @@ import re
 # - Improved agent prompts with clear output format requirements
 # - Better citation enforcement
 # - Content validation at each step
+# - Stages declared as a graph (agents_graph); metadata and translation run
+#   side by side once the final script exists
+# - Optional model tiering: stages start on a smaller model and escalate to
+#   the larger one only when validation fails (agents_tiering)
+# - Optional targeted repair of a failing prioritized list (agents_repair)
+# - Prompts split into fixed instructions (a prompt-cache breakpoint) and the
+#   per-run dates and upstream text, so reruns read the prefix from the cache
+# - Model calls go through agents_client, shared with the v1 and v2 pipelines
 
-# Initialize the Anthropic client
-anthropic_client = anthropic.Client(api_key=os.getenv("ANTHROPIC_API_KEY"))
-
-def run_anthropic_chat(messages: List[Dict], model="claude-3-5-sonnet-20241022", max_tokens=8192) -> str:
-    response = anthropic_client.messages.create(
-        model=model,
-        messages=messages,
-        tools=[{
-            "type": "web_search_20250305",
-            "name": "web_search"
-        }],
-        max_tokens=max_tokens
-    )
-    # Extract text content from the response
-    text_content = ""
-    for content_block in response.content:
-        if hasattr(content_block, "text"):
-            text_content += content_block.text
-    return text_content.strip()
+STAGES = ["research", "prioritize", "script", "editorial", "metadata", "translate"]
 
 def clean_agent_output(content: str) -> str:
     """Remove AI search process text and other meta-commentary"""
@@ -53,22 +49,48 @@ def clean_agent_output(content: str) -> str:
     lines = [line.strip() for line in cleaned.split('\n') if line.strip()]
     return '\n'.join(lines)
 
-# Agent 1: Research collector with strict output format
-def collect_research(date: str) -> str:
+def cached_prompt(instructions: str, variable: str) -> List[Dict]:
+    """One user message: the fixed instructions as a cacheable prefix, then the per-run text.
+
+    The cache_control breakpoint caches tools + instructions, so every call
+    of the same stage reads that prefix from the prompt cache instead of
+    reprocessing it. Anthropic only caches prefixes above a minimum length
+    (1024 tokens, 2048 on Haiku); run_anthropic_chat drops the breakpoint
+    from shorter ones.
+    """
+    return [{
+        "role": "user",
+        "content": [
+            {"type": "text", "text": instructions, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": variable},
+        ],
+    }]
+
+def prompt_text(messages: List[Dict]) -> str:
+    """The plain text of a messages list, whether content is a string or blocks"""
+    parts = []
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            parts.extend(block.get("text", "") for block in content if isinstance(block, dict))
+        else:
+            parts.append(content)
+    return "\n".join(parts)
+
+def _date_window(target_date: str = None) -> Tuple[str, str]:
     from datetime import datetime, timedelta
-    
-    target_date = datetime.strptime(date, "%Y-%m-%d")
-    yesterday = (target_date - timedelta(days=1)).strftime("%Y-%m-%d")
-    
-    messages = [
-        {
-            "role": "user", 
-            "content": f"""
-You are the Research Agent for "Apes On Knowledge" - AI Daily News. Find real AI news from the LAST 24 HOURS ONLY ({yesterday} to {date}).
+
+    # The 24-hour window is relative to the episode date, not the wall clock
+    reference = datetime.strptime(target_date, "%Y-%m-%d") if target_date else datetime.now()
+    return reference.strftime("%Y-%m-%d"), (reference - timedelta(days=1)).strftime("%Y-%m-%d")
+
+# Agent 1: Research collector with strict output format
+RESEARCH_INSTRUCTIONS = """
+You are the Research Agent for "Apes On Knowledge" - AI Daily News. Find real AI news from the LAST 24 HOURS ONLY (the date window is given at the end).
 
 MANDATORY REQUIREMENTS:
 1. Use web search to find actual recent news
-2. Only include stories published on {date} or {yesterday}
+2. Only include stories published on the target date or the day before
 3. Find 15-20 stories minimum
 4. Include exact source citations for each story
 
@@ -77,7 +99,7 @@ Return ONLY a list of stories in this exact format:
 
 STORY: [Exact headline from source]
 SOURCE: [Publication name] - [Article title/URL]
-DATE: {date} or {yesterday}
+DATE: [Publication date, YYYY-MM-DD]
 SUMMARY: [2-3 sentences about what happened]
 IMPACT: [Why it matters to AI practitioners]
 
@@ -86,36 +108,33 @@ IMPACT: [Why it matters to AI practitioners]
 STORY: [Next headline]
 ...continue for all stories...
 
-SEARCH STRATEGY:
-1. "AI news {date}"
-2. "artificial intelligence breaking news {date}"
-3. Company searches: "OpenAI news {date}", "Google AI {date}", etc.
-4. Source searches: "site:techcrunch.com AI {date}"
+SEARCH STRATEGY (with the target date in place of DATE):
+1. "AI news DATE"
+2. "artificial intelligence breaking news DATE"
+3. Company searches: "OpenAI news DATE", "Google AI DATE", etc.
+4. Source searches: "site:techcrunch.com AI DATE"
 
 DO NOT include any search commentary, explanations, or process notes in your output. Return ONLY the formatted story list.
 """
-        }
-    ]
-    
-    result = run_anthropic_chat(messages, max_tokens=8192)
+
+def research_messages(date: str) -> List[Dict]:
+    today, yesterday = _date_window(date)
+    return cached_prompt(
+        RESEARCH_INSTRUCTIONS,
+        f"Target date: {today}\nDate window: {yesterday} to {today} (stories dated {today} or {yesterday} only)",
+    )
+
+def collect_research(date: str) -> str:
+    result = run_anthropic_chat(research_messages(date), max_tokens=None, stage="research")
     return clean_agent_output(result)
 
 # Agent 2: Prioritizer with exact count requirement
-def prioritize_and_filter(research: str) -> str:
-    from datetime import datetime, timedelta
-    
-    today = datetime.now().strftime("%Y-%m-%d")
-    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-    
-    messages = [
-        {
-            "role": "user", 
-            "content": f"""
-Select EXACTLY 10 stories from the research below. Return ONLY the formatted story list.
+PRIORITIZE_INSTRUCTIONS = """
+Select EXACTLY 10 stories from the research given at the end. Return ONLY the formatted story list.
 
 REQUIREMENTS:
 - EXACTLY 10 stories (count them)
-- Only stories from {today} or {yesterday}
+- Only stories from the date window given with the research
 - Must have verified sources
 - High impact for AI practitioners
 
@@ -123,31 +142,67 @@ OUTPUT FORMAT (return this exact format):
 
 STORY 1: [Headline]
 SOURCE: [Publication] - [Article title]
-DATE: {today} or {yesterday}
+DATE: [Publication date, YYYY-MM-DD]
 SUMMARY: [What happened - 2-3 sentences]
 IMPACT: [Why it matters to AI practitioners]
 
 STORY 2: [Headline]
 ...continue for all 10 stories...
 
-Research to analyze:
-{research}
-
 Return ONLY the 10 formatted stories. No commentary or explanations.
 """
-        }
-    ]
-    
-    result = run_anthropic_chat(messages, max_tokens=6144)
+
+def prioritize_messages(research: str, target_date: str = None) -> List[Dict]:
+    today, yesterday = _date_window(target_date)
+    return cached_prompt(
+        PRIORITIZE_INSTRUCTIONS,
+        f"Only stories from {today} or {yesterday}\n\nResearch to analyze:\n{research}",
+    )
+
+def prioritize_and_filter(research: str, target_date: str = None) -> str:
+    result = run_anthropic_chat(prioritize_messages(research, target_date), max_tokens=None, stage="prioritize")
     return clean_agent_output(result)
 
+PRIORITIZE_IDS_INSTRUCTIONS = """
+Select EXACTLY 10 stories from the pipe-separated research table given at the end.
+
+REQUIREMENTS:
+- EXACTLY 10 stories (count them)
+- Only stories from the date window given with the table
+- Must have verified sources
+- High impact for AI practitioners
+- No duplicate coverage of the same announcement
+
+Return ONLY the 10 selected ids, most important first, comma-separated (e.g. 4,1,9,...). No commentary or explanations.
+"""
+
+def prioritize_ids_messages(compact_research: str, target_date: str = None) -> List[Dict]:
+    """Prioritizer prompt for structured hand-off: reads compact rows, answers with ids only"""
+    today, yesterday = _date_window(target_date)
+    return cached_prompt(
+        PRIORITIZE_IDS_INSTRUCTIONS,
+        f"Only stories from {today} or {yesterday}\n\nResearch table (pipe-separated):\n{compact_research}",
+    )
+
+def prioritize_stories(stories: List[Story], target_date: str = None, count: int = 10) -> List[Story]:
+    """Structured prioritizer: the model picks ids, the records are reused locally"""
+    compact = serialize_stories(stories)
+    result = run_anthropic_chat(prioritize_ids_messages(compact, target_date), max_tokens=256,
+                                stage="prioritize", tools=None)
+
+    selected = []
+    for token in re.findall(r"\d+", result):
+        index = int(token) - 1
+        if 0 <= index < len(stories) and stories[index] not in selected:
+            selected.append(stories[index])
+    if len(selected) < count:
+        logging.warning(f"Prioritizer returned {len(selected)} usable ids; filling from research order")
+        selected.extend(s for s in stories if s not in selected)
+    return selected[:count]
+
 # Agent 3: Script writer with strict format
-def write_script(prioritized_summary: str, target_date: str) -> str:
-    messages = [
-        {
-            "role": "user",
-            "content": f"""
-Write a podcast script using ALL 10 stories from the prioritized list below.
+SCRIPT_INSTRUCTIONS = """
+Write a podcast script using ALL 10 stories from the prioritized list given at the end.
 
 MANDATORY FORMAT:
 
@@ -171,24 +226,19 @@ CITATION EXAMPLES:
 - "According to Bloomberg's article 'Headline'..."
 - "The Verge details in 'Story Name' how..."
 
-Stories to write about:
-{prioritized_summary}
-
 Return ONLY the formatted script. No commentary or process notes.
 """
-        }
-    ]
-    
-    result = run_anthropic_chat(messages, max_tokens=8192)
+
+def script_messages(prioritized_summary: str, target_date: str) -> List[Dict]:
+    return cached_prompt(SCRIPT_INSTRUCTIONS, f"Stories to write about:\n{prioritized_summary}")
+
+def write_script(prioritized_summary: str, target_date: str) -> str:
+    result = run_anthropic_chat(script_messages(prioritized_summary, target_date), max_tokens=None, stage="script")
     return clean_agent_output(result)
 
 # Agent 4: Editor with content validation
-def editorial_review(script: str) -> str:
-    messages = [
-        {
-            "role": "user",
-            "content": f"""
-Polish this podcast script while ensuring all requirements are met.
+EDITORIAL_INSTRUCTIONS = """
+Polish the podcast script given at the end while ensuring all requirements are met.
 
 VALIDATION CHECKLIST:
 □ Starts with "Hello world… welcome back to Apes On Knowledge..."
@@ -203,98 +253,363 @@ EDITING INSTRUCTIONS:
 3. Polish language for radio delivery
 4. Maintain all story content
 
-Script to edit:
-{script}
-
 Return ONLY the polished script. No editing commentary or process notes.
 """
-        }
-    ]
-    
-    result = run_anthropic_chat(messages, max_tokens=8192)
+
+def editorial_messages(script: str) -> List[Dict]:
+    return cached_prompt(EDITORIAL_INSTRUCTIONS, f"Script to edit:\n{script}")
+
+def editorial_review(script: str) -> str:
+    result = run_anthropic_chat(editorial_messages(script), max_tokens=None, stage="editorial")
     return clean_agent_output(result)
 
-def validate_output(content: str, expected_stories: int = 10) -> Dict:
-    """Validate agent output quality"""
-    issues = []
-    
-    # Check for search leakage
-    search_indicators = ["Let me search", "I'll search for", "Based on the search results"]
-    has_leakage = any(indicator in content for indicator in search_indicators)
-    if has_leakage:
-        issues.append("Search process leakage detected")
-    
-    # Count stories
-    story_count = len(re.findall(r'STORY \d+:', content))
-    if story_count != expected_stories:
-        issues.append(f"Expected {expected_stories} stories, found {story_count}")
-    
-    # Check citations
-    citation_count = len(re.findall(r'reports|according to|announced', content, re.IGNORECASE))
-    if citation_count < 5:
-        issues.append(f"Insufficient citations: {citation_count}")
-    
-    return {
-        "valid": len(issues) == 0,
-        "issues": issues,
-        "story_count": story_count,
-        "citation_count": citation_count,
-        "has_leakage": has_leakage
-    }
+# Agent 5: Episode metadata for the feed and the DailyDigest row
+METADATA_FIELDS = ["title_en", "title_zh", "description_en", "description_zh", "keywords_en", "keywords_zh"]
+# DailyDigest's title and keyword columns are CharField(max_length=255)
+METADATA_MAX_LENGTH = 255
+_KEYWORD_SEPARATORS = (",", "，", "、")
+
+METADATA_INSTRUCTIONS = """
+Write podcast episode metadata for the Apes On Knowledge episode given at the end.
+
+Return ONLY a JSON object with these keys:
+- "title_en": episode title, at most 80 characters, naming the top 1-2 stories
+- "title_zh": the same title in Simplified Chinese
+- "description_en": 2-3 sentence episode description
+- "description_zh": the same description in Simplified Chinese
+- "keywords_en": 5-8 comma-separated keywords
+- "keywords_zh": the same keywords in Simplified Chinese
+"""
+
+def metadata_messages(script: str, target_date: str) -> List[Dict]:
+    return cached_prompt(METADATA_INSTRUCTIONS, f"Episode date: {target_date}\n\nEpisode script:\n{script}")
+
+def parse_metadata(content: str) -> Dict:
+    """The JSON object in a metadata answer, or {} when there is none"""
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return {}
+    metadata = {key: str(data[key]).strip() for key in METADATA_FIELDS if data.get(key)}
+    for key in ("keywords_en", "keywords_zh"):
+        if key in metadata:
+            metadata[key] = fit_keywords(metadata[key])
+    return metadata
+
+def fit_keywords(keywords: str, limit: int = METADATA_MAX_LENGTH) -> str:
+    """*keywords* cut back to whole comma-separated keywords within *limit* characters"""
+    if len(keywords) <= limit:
+        return keywords
+    cut = keywords[:limit + 1]
+    boundary = max(cut.rfind(separator) for separator in _KEYWORD_SEPARATORS)
+    return (cut[:boundary] if boundary > 0 else keywords[:limit]).rstrip(" " + "".join(_KEYWORD_SEPARATORS))
+
+def generate_metadata(script: str, target_date: str) -> str:
+    return run_anthropic_chat(metadata_messages(script, target_date), max_tokens=None,
+                              stage="metadata", tools=None)
+
+def validate_metadata(content: str, expected_stories: int = 10) -> Dict:
+    metadata = parse_metadata(content)
+    missing = [key for key in METADATA_FIELDS if key not in metadata]
+    issues = [f"Missing metadata fields: {', '.join(missing)}"] if missing else []
+    for key in ("title_en", "title_zh"):
+        if len(metadata.get(key, "")) > METADATA_MAX_LENGTH:
+            issues.append(f"{key} longer than {METADATA_MAX_LENGTH} characters")
+    return {"valid": not issues, "issues": issues, "fields": sorted(metadata)}
+
+# Agent 6: Mandarin translation of the final script
+TRANSLATION_INSTRUCTIONS = """
+Translate the podcast script given at the end into natural, spoken Simplified Chinese for the Mandarin edition of Apes On Knowledge.
+
+REQUIREMENTS:
+- Keep every story, in the same order, with its source citation
+- Keep company, product and publication names in their original form
+- Keep the opening greeting and the sign-off, translated
+- Write for listening: short sentences, no markdown
+
+Return ONLY the translated script. No translator notes.
+"""
+
+def translation_messages(script: str) -> List[Dict]:
+    return cached_prompt(TRANSLATION_INSTRUCTIONS, f"Script to translate:\n{script}")
+
+def translate_script(script: str) -> str:
+    result = run_anthropic_chat(translation_messages(script), max_tokens=None, stage="translate", tools=None)
+    return clean_agent_output(result)
+
+def validate_translation(content: str, expected_stories: int = 10) -> Dict:
+    letters = [c for c in content if not c.isspace()]
+    cjk = sum(1 for c in letters if "\u4e00" <= c <= "\u9fff")
+    ratio = cjk / len(letters) if letters else 0.0
+    issues = [] if ratio >= 0.3 else [f"Only {ratio:.0%} of the translation is Chinese"]
+    return {"valid": not issues, "issues": issues, "cjk_ratio": round(ratio, 2)}
+
+def call_settings(stage: str, tiering: bool = False, max_tokens: int = None) -> Dict:
+    """The model a stage's calls start on and its configured output budget.
+
+    The budget is the STAGE_MAX_TOKENS cap rather than the history-sized
+    value, which changes from run to run and would defeat resuming.
+    """
+    if tiering:
+        model = MODEL_TIERS[escalation_path(stage)[0]]
+    else:
+        model = current_model() or DEFAULT_MODEL
+    return {"model": model, "max_tokens": max_tokens or STAGE_MAX_TOKENS.get(stage)}
+
+def _with_call_settings(payload, settings: Dict):
+    return lambda *inputs: {"call": settings, "input": payload(*inputs)}
+
+def v3_stages(date_str: str, with_editor: bool = True, debug: bool = True,
+              sharded_research: bool = False, shard_workers: int = None,
+              structured_handoff: bool = False, prioritizer: str = "llm", dedup: bool = False,
+              story_history=None, compact_inputs: bool = True, metadata: bool = False,
+              translate: bool = False, editor: str = "full", writer: str = "single",
+              dedup_report: Dict = None, tiering: bool = False, repair: bool = False) -> List[Stage]:
+    """The v3 pipeline as a stage graph; the keyword arguments mirror generate_episode_v3"""
+    # editor: "full" rewrites the whole script, "incremental" (agents_editor)
+    # only the sections that fail their checks, "parallel" every story
+    # section concurrently
+    if editor not in ("full", "incremental", "parallel"):
+        raise ValueError(f"Unknown editor mode: {editor}")
+    # writer: "single" writes the script in one call, "parallel"
+    # (agents_writer) one call per story plus the closing analysis
+    if writer not in ("single", "parallel"):
+        raise ValueError(f"Unknown writer mode: {writer}")
+
+    # prioritizer: "llm" (model call), "local" (agents_ranker only) or "auto"
+    # (local, falling back to the model when ranker confidence is low).
+    # Both local modes fall back to the model when the research holds fewer
+    # eligible stories than the episode needs
+    if prioritizer not in ("llm", "local", "auto"):
+        raise ValueError(f"Unknown prioritizer mode: {prioritizer}")
+
+    # With structured hand-off, stages exchange parsed Story records in
+    # compact form and validation runs on their fields
+    research_validator = summary_validator = validate_output
+    if structured_handoff:
+        research_validator = lambda out, n: validate_stories(parse_stories(out), n, minimum=True, target_date=date_str)
+        summary_validator = lambda out, n: validate_stories(parse_stories(out), n, target_date=date_str)
+
+    stages = []
 
-def generate_episode_v3(date_str: str = None, with_editor: bool = True, debug: bool = True) -> Dict:
-    date_str = date_str or str(dt_date.today())
-    
-    if debug:
-        print(f"🔍 Starting V3 research for {date_str}...")
-    
     # Step 1: Research with validation
-    research = collect_research(date_str)
-    research_validation = validate_output(research, expected_stories=15)
-    
-    if debug:
-        print(f"✅ Research completed: {len(research)} characters")
-        print(f"   Validation: {research_validation}")
-    
-    # Step 2: Prioritize with validation
-    summary = prioritize_and_filter(research)
-    summary_validation = validate_output(summary, expected_stories=10)
-    
-    if debug:
-        print(f"✅ Prioritization completed: {len(summary)} characters")
-        print(f"   Validation: {summary_validation}")
-    
+    research_key = "raw_research" if dedup else "research"
+    budgets = {}
+    if sharded_research:
+        from agents_research_shards import SHARD_MAX_TOKENS, collect_research_sharded
+        budgets["research"] = SHARD_MAX_TOKENS
+        stages.append(Stage(
+            "research", lambda: collect_research_sharded(date_str, max_workers=shard_workers, debug=debug),
+            output=research_key, payload=lambda: {"date": date_str, "sharded": True},
+            validator=research_validator, expected_stories=15))
+    else:
+        stages.append(Stage(
+            "research", lambda: collect_research(date_str),
+            output=research_key, payload=lambda: research_messages(date_str),
+            validator=research_validator, expected_stories=15))
+
+    # Collapse near-duplicate stories and drop ones recent episodes already
+    # covered (story_history is an agents_dedup.StoryHistoryIndex)
+    if dedup:
+        from agents_dedup import dedupe_stories
+
+        def dedupe(research: str) -> str:
+            kept, dropped = dedupe_stories(parse_stories(research), history=story_history, until=date_str)
+            if dedup_report is not None:
+                dedup_report["deduplicated"] = len(dropped)
+            if debug:
+                for story, reason in dropped:
+                    print(f"   🧹 Dropped '{story.headline}': {reason}")
+            return format_stories(kept, separator="\n---\n")
+
+        stages.append(Stage("dedup", dedupe, inputs=("raw_research",), output="research", tracked=False))
+
+    # Step 2: Prioritize with validation; oversized research is compacted
+    # to the stage's input budget first (agents_budget)
+    if compact_inputs:
+        stages.append(Stage(
+            "compact_research", lambda research: compact_stage_input("prioritize", research, debug),
+            inputs=("research",), output="prioritize_input", tracked=False))
+    else:
+        stages.append(Stage("compact_research", lambda research: research,
+                            inputs=("research",), output="prioritize_input", tracked=False))
+
+    if structured_handoff:
+        prioritize_payload = lambda text: prioritize_ids_messages(serialize_stories(parse_stories(text)), date_str)
+        llm_prioritize = lambda text: format_stories(prioritize_stories(parse_stories(text), date_str), numbered=True)
+    else:
+        prioritize_payload = lambda text: prioritize_messages(text, date_str)
+        llm_prioritize = lambda text: prioritize_and_filter(text, date_str)
+
+    if prioritizer in ("local", "auto"):
+        from agents_ranker import MIN_CONFIDENCE, rank_stories
+
+        def local_prioritize(research: str, prioritize_input: str) -> str:
+            expected = 10
+            ranked = rank_stories(parse_stories(research), date_str, count=expected)
+            if debug:
+                print(f"   Local ranker confidence: {ranked.confidence} ({len(ranked.excluded)} excluded)")
+            if len(ranked.stories) < expected:
+                logging.warning(f"Local ranker found {len(ranked.stories)} of {expected} eligible stories; "
+                                f"falling back to LLM prioritizer")
+                return llm_prioritize(prioritize_input)
+            if prioritizer == "auto" and ranked.confidence < MIN_CONFIDENCE:
+                if debug:
+                    print("   Confidence too low, falling back to LLM prioritizer")
+                return llm_prioritize(prioritize_input)
+            return format_stories(ranked.stories, numbered=True)
+
+        stages.append(Stage(
+            "prioritize", local_prioritize, inputs=("research", "prioritize_input"), output="summary",
+            payload=lambda research, _: {"prioritizer": prioritizer, "date": date_str, "research": research},
+            validator=lambda out, n: validate_stories(parse_stories(out), n, target_date=date_str)))
+    else:
+        stages.append(Stage(
+            "prioritize", llm_prioritize, inputs=("prioritize_input",), output="summary",
+            payload=prioritize_payload, validator=summary_validator))
+
+    # A prioritized list that fails validation is patched with targeted
+    # follow-up requests (agents_repair) instead of rerunning the stage
+    if repair:
+        from agents_repair import repair_story_list
+        prioritize_stage = stages[-1]
+        select = prioritize_stage.run
+
+        def select_and_repair(*inputs):
+            return repair_story_list(select(*inputs), prioritize_stage.validator, prioritize_stage.expected_stories,
+                                     target_date=date_str, source=inputs[-1], debug=debug)
+
+        prioritize_stage.run = select_and_repair
+
+    def prepare_writer_input(summary: str) -> str:
+        writer_input = serialize_stories(parse_stories(summary)) if structured_handoff else summary
+        return compact_stage_input("script", writer_input, debug) if compact_inputs else writer_input
+
+    stages.append(Stage("writer_input", prepare_writer_input, inputs=("summary",), tracked=False))
+
     # Step 3: Write script with validation
-    script = write_script(summary, date_str)
-    script_validation = validate_output(script, expected_stories=10)
-    
-    if debug:
-        print(f"✅ Script writing completed: {len(script)} characters")
-        print(f"   Validation: {script_validation}")
-    
+    if writer == "parallel":
+        from agents_writer import write_script_parallel
+        # Works from the full STORY records, not the compacted writer input:
+        # each call carries one story, far below the budget compaction enforces
+        stages.append(Stage(
+            "script", write_script_parallel, inputs=("summary",), output="draft",
+            payload=lambda summary: {"writer": "parallel", "summary": summary}, validator=validate_script))
+    else:
+        stages.append(Stage(
+            "script", lambda writer_input: write_script(writer_input, date_str),
+            inputs=("writer_input",), output="draft",
+            payload=lambda writer_input: script_messages(writer_input, date_str), validator=validate_script))
+
     # Step 4: Editorial review
+    final_key = "draft"
     if with_editor:
-        reviewed_script = editorial_review(script)
-        final_validation = validate_output(reviewed_script, expected_stories=10)
-        if debug:
-            print(f"✅ Editorial review completed: {len(reviewed_script)} characters")
-            print(f"   Final validation: {final_validation}")
-    else:
-        reviewed_script = script
-        final_validation = script_validation
-    
-    return {
+        final_key = "script"
+        if editor in ("incremental", "parallel"):
+            import agents_editor
+            review = (agents_editor.incremental_editorial_review if editor == "incremental"
+                      else agents_editor.parallel_editorial_review)
+            stages.append(Stage(
+                "editorial", lambda draft: review(draft, debug=debug),
+                inputs=("draft",), output="script",
+                payload=lambda draft: {"editor": editor, "script": draft}, validator=validate_script))
+        else:
+            stages.append(Stage(
+                "editorial", editorial_review, inputs=("draft",), output="script",
+                payload=editorial_messages, validator=validate_script))
+
+    # Off the critical path: both only need the final script and run concurrently
+    if metadata:
+        stages.append(Stage(
+            "metadata", lambda script: generate_metadata(script, date_str), inputs=(final_key,),
+            payload=lambda script: metadata_messages(script, date_str), validator=validate_metadata))
+    if translate:
+        stages.append(Stage(
+            "translate", translate_script, inputs=(final_key,), output="script_zh",
+            payload=translation_messages, validator=validate_translation))
+
+    # A checkpoint is only reused by a run with the same model and output budget
+    for stage in stages:
+        if stage.tracked and stage.payload is not None:
+            stage.payload = _with_call_settings(stage.payload, call_settings(stage.name, tiering, budgets.get(stage.name)))
+
+    # Each stage runs on its configured model tier first and is rerun on the
+    # larger model only when its output fails validation
+    if tiering:
+        from agents_tiering import tiered
+        for stage in stages:
+            if stage.tracked:
+                stage.run = tiered(stage.name, stage.run, stage.validator or validate_output,
+                                   stage.expected_stories, debug=debug)
+    return stages
+
+def _debug_hook(event: str, stage: str, data: Dict) -> None:
+    if event == "stage_start":
+        print(f"🔍 {stage} started...")
+    elif "validation" in data and not data.get("reused"):
+        print(f"✅ {stage} completed in {data['seconds']:.1f}s")
+        print(f"   Validation: {data['validation']}")
+
+def generate_episode_v3(date_str: str = None, with_editor: bool = True, debug: bool = True,
+                        sharded_research: bool = False, shard_workers: int = None,
+                        checkpoint=None, structured_handoff: bool = False,
+                        prioritizer: str = "llm", dedup: bool = False, story_history=None,
+                        compact_inputs: bool = True, metadata: bool = False,
+                        translate: bool = False, editor: str = "full", writer: str = "single",
+                        tiering: bool = False, repair: bool = False) -> Dict:
+    date_str = date_str or str(dt_date.today())
+    dedup_report = {}
+    graph = StageGraph(v3_stages(
+        date_str, with_editor=with_editor, debug=debug, sharded_research=sharded_research,
+        shard_workers=shard_workers, structured_handoff=structured_handoff, prioritizer=prioritizer,
+        dedup=dedup, story_history=story_history, compact_inputs=compact_inputs,
+        metadata=metadata, translate=translate, editor=editor, writer=writer,
+        dedup_report=dedup_report, tiering=tiering, repair=repair))
+
+    if debug:
+        print(f"🔍 Starting V3 pipeline for {date_str}...")
+
+    try:
+        run = graph.run(checkpoint=checkpoint, debug=debug, hooks=[_debug_hook] if debug else ())
+    except Exception as exc:
+        if checkpoint is not None:
+            checkpoint.finish(error=exc)
+        raise
+
+    if checkpoint is not None:
+        checkpoint.finish()
+    if debug:
+        print(f"⏱️  Critical path: {' -> '.join(run.critical_path)}")
+        print(f"🗄️  Response cache: {response_cache.stats()}")
+
+    values, validations = run.values, run.validations
+    research_validation = validations["research"]
+    if dedup:
+        research_validation = dict(research_validation, **dedup_report)
+    script_validation = validations["script"]
+
+    result = {
         "date": date_str,
-        "research": research,
-        "summary": summary,
-        "script": reviewed_script,
+        "research": values["research"],
+        "summary": values["summary"],
+        "script": values["script"] if with_editor else values["draft"],
         "validations": {
             "research": research_validation,
-            "summary": summary_validation,
+            "summary": validations["prioritize"],
             "script": script_validation,
-            "final": final_validation
+            "final": validations["editorial"] if with_editor else script_validation
         }
     }
+    if metadata:
+        result["metadata"] = parse_metadata(values["metadata"])
+        result["validations"]["metadata"] = validations["metadata"]
+    if translate:
+        result["script_zh"] = values["script_zh"]
+        result["validations"]["translation"] = validations["translate"]
+    return result
 
 if __name__ == "__main__":
     episode = generate_episode_v3(debug=True)
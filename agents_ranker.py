@@ -0,0 +1,134 @@
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from agents_stories import Story, headline_similarity, normalize_headline
+
+# Local fast-path prioritizer
+# Features:
+# - Deterministic ranking of parsed research without an LLM round-trip
+# - Source tiers taken from the research prompt's prioritized source lists
+# - Recency from the DATE field, Elon Musk company exclusions, duplicate suppression
+# - Confidence score so callers can fall back to the LLM prioritizer
+
+# Prioritized sources from the research prompt, highest tier first
+NEWS_SOURCES = [
+    "the information", "the verge", "tbnp", "the gradient", "import ai", "papers with code",
+    "semafor", "wired", "axios", "bloomberg", "techcrunch", "the ai exchange",
+]
+COMPANY_SOURCES = [
+    "anthropic", "openai", "google", "deepmind", "meta", "aws", "amazon", "hugging face",
+    "mistral", "cohere",
+]
+INDUSTRY_VOICES = [
+    "@rowancheung", "@alexalbert__", "@sama", "@darioamodei", "@satyanadella", "@reidhoffman",
+]
+
+SOURCE_TIER_WEIGHTS = {
+    "news": 1.0,
+    "company": 0.85,
+    "voice": 0.6,
+    "other": 0.3,
+}
+
+EXCLUDED_RE = re.compile(
+    r"\b(tesla|spacex|neuralink|xai|grok|elon musk|musk|twitter|x\.com|starlink|boring company)\b",
+    re.IGNORECASE,
+)
+
+SCORE_WEIGHTS = {"tier": 0.45, "recency": 0.35, "completeness": 0.2}
+DUPLICATE_THRESHOLD = 0.6
+MIN_CONFIDENCE = 0.7
+
+
+@dataclass
+class RankResult:
+    stories: List[Story]
+    scores: List[float]
+    confidence: float
+    excluded: List[Tuple[Story, str]] = field(default_factory=list)
+
+
+def source_tier(story: Story) -> str:
+    source = story.source.lower()
+    publication = story.publication.lower()
+    if any(name in publication or name in source for name in NEWS_SOURCES):
+        return "news"
+    if any(name in publication for name in COMPANY_SOURCES):
+        return "company"
+    if any(handle in source for handle in INDUSTRY_VOICES):
+        return "voice"
+    return "other"
+
+
+def recency_score(story: Story, target_date: str) -> Optional[float]:
+    """1.0 for the target date, 0.7 for the day before, 0.4 if undated, None outside the window"""
+    if not story.published:
+        return 0.4
+    try:
+        age = (datetime.strptime(target_date, "%Y-%m-%d") - datetime.strptime(story.published, "%Y-%m-%d")).days
+    except ValueError:
+        return 0.4
+    return {0: 1.0, 1: 0.7}.get(age)
+
+
+def completeness_score(story: Story) -> float:
+    parts = [bool(story.source), bool(story.summary), bool(story.impact), story.url is not None]
+    return sum(parts) / len(parts)
+
+
+def rank_stories(stories: List[Story], target_date: str, count: int = 10) -> RankResult:
+    """Pick *count* stories by source tier, recency and completeness.
+
+    Confidence drops when there are fewer eligible stories than slots or when
+    picks rely on unknown sources or missing dates.
+    """
+    excluded = []
+    candidates = []
+    for story in stories:
+        text = f"{story.headline} {story.summary} {story.source}"
+        if EXCLUDED_RE.search(text):
+            excluded.append((story, "excluded company"))
+            continue
+        recency = recency_score(story, target_date)
+        if recency is None:
+            excluded.append((story, "outside 24-hour window"))
+            continue
+        tier = source_tier(story)
+        score = (
+            SCORE_WEIGHTS["tier"] * SOURCE_TIER_WEIGHTS[tier]
+            + SCORE_WEIGHTS["recency"] * recency
+            + SCORE_WEIGHTS["completeness"] * completeness_score(story)
+        )
+        candidates.append((score, tier, story))
+
+    # Stable sort keeps research order between equal scores
+    candidates.sort(key=lambda item: item[0], reverse=True)
+
+    selected = []
+    seen_headlines = []
+    for score, tier, story in candidates:
+        headline = normalize_headline(story.headline)
+        if any(headline_similarity(headline, seen) >= DUPLICATE_THRESHOLD for seen in seen_headlines):
+            excluded.append((story, "duplicate"))
+            continue
+        seen_headlines.append(headline)
+        selected.append((score, tier, story))
+        if len(selected) == count:
+            break
+
+    if not selected:
+        return RankResult(stories=[], scores=[], confidence=0.0, excluded=excluded)
+
+    certainty = [
+        (0.5 if tier != "other" else 0.0) + (0.5 if story.published else 0.0)
+        for _, tier, story in selected
+    ]
+    confidence = min(1.0, len(selected) / count) * (sum(certainty) / len(certainty))
+    return RankResult(
+        stories=[story for _, _, story in selected],
+        scores=[round(score, 3) for score, _, _ in selected],
+        confidence=round(confidence, 3),
+        excluded=excluded,
+    )
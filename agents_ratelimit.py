@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from typing import Optional
+
+# Client-side rate limiting for Anthropic calls
+# Features:
+# - Token buckets for requests-per-minute and tokens-per-minute
+# - Blocking acquire shared by every thread in the process
+# - Reservations settled against actual usage once a response arrives
+# - Disabled (no waiting) unless a limit is configured
+
+AOK_RATE_RPM = int(os.getenv("AOK_RATE_RPM", "0"))
+AOK_RATE_TPM = int(os.getenv("AOK_RATE_TPM", "0"))
+
+
+class TokenBucket:
+    """Bucket refilled continuously at *per_minute* units, holding at most one minute's worth"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until *amount* is available; requests larger than the bucket wait for a full one"""
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self.rate) if self.rate else 0.0
+
+
+class RateLimiter:
+    """Requests-per-minute plus tokens-per-minute limiter.
+
+    acquire() blocks until one request and *tokens* estimated tokens are
+    available. settle() corrects the token bucket once the real usage is
+    known, so underestimates slow later calls down instead of overrunning
+    the API limit.
+    """
+
+    def __init__(self, rpm: int = AOK_RATE_RPM, tpm: int = AOK_RATE_TPM):
+        self._condition = threading.Condition()
+        self.configure(rpm, tpm)
+
+    def configure(self, rpm: int = 0, tpm: int = 0) -> None:
+        with self._condition:
+            self.requests = TokenBucket(rpm) if rpm else None
+            self.tokens = TokenBucket(tpm) if tpm else None
+            self.waited_seconds = 0.0
+            self._condition.notify_all()
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def acquire(self, tokens: int = 0, timeout: Optional[float] = None) -> float:
+        """Block until the call may proceed; returns the seconds spent waiting"""
+        started = time.monotonic()
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                wait = 0.0
+                for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+                    if bucket is not None:
+                        bucket.refill(now)
+                        wait = max(wait, bucket.wait_time(amount))
+                if wait <= 0:
+                    if self.requests is not None:
+                        self.requests.level -= 1
+                    if self.tokens is not None:
+                        self.tokens.level -= tokens
+                    waited = now - started
+                    self.waited_seconds += waited
+                    return waited
+                if timeout is not None and now - started + wait > timeout:
+                    raise TimeoutError(f"Rate limiter would wait {wait:.1f}s, over the {timeout}s timeout")
+                self._condition.wait(wait)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Charge (or refund) the difference between the reservation and real usage"""
+        with self._condition:
+            if self.tokens is not None:
+                self.tokens.refill(time.monotonic())
+                self.tokens.level -= actual_tokens - estimated_tokens
+                self._condition.notify_all()
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,178 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+from agents_client import run_anthropic_chat
+from agents_pipeline_v3 import _date_window, cached_prompt, clean_agent_output
+from agents_stories import Story, format_stories, normalize_headline, parse_stories
+from agents_tiering import submit_in_context
+from agents_validation import MIN_CITATIONS, scan
+
+# Targeted repair of STORY-list stage output that fails validation
+# Features:
+# - Each validation issue becomes the smallest follow-up that fixes it:
+#   too few stories -> "N more stories not in this list", too few citations
+#   or missing fields -> "revise stories 3 and 7"
+# - Surplus and out-of-window stories and search leakage are fixed locally
+# - Repairs are merged into the existing list and re-validated, for at most
+#   max_rounds rounds, instead of regenerating the whole stage
+
+MAX_REPAIR_ROUNDS = 2
+REPAIR_MAX_TOKENS = 4096
+
+MORE_STORIES_INSTRUCTIONS = """
+Add stories to the AI news shortlist of the Apes On Knowledge podcast. How many are needed, the date window, the stories already selected and the research to choose from are given at the end.
+
+REQUIREMENTS:
+- Only stories NOT already selected (no second story about the same announcement)
+- Only stories from the date window
+- Must have verified sources
+- Attribute each summary to its source, e.g. "TechCrunch reports that..."
+
+OUTPUT FORMAT (one block per story):
+
+STORY: [Headline]
+SOURCE: [Publication] - [Article title]
+DATE: [Publication date, YYYY-MM-DD]
+SUMMARY: [What happened - 2-3 sentences]
+IMPACT: [Why it matters to AI practitioners]
+
+Return ONLY the new stories. No commentary or explanations.
+"""
+
+FIX_STORIES_INSTRUCTIONS = """
+Revise stories of the AI news shortlist of the Apes On Knowledge podcast. Each story given at the end is listed with the fixes it needs; change nothing else.
+
+Keep each story's "STORY N:" number and headline and the SOURCE/DATE/SUMMARY/IMPACT format.
+
+Return ONLY the revised stories. No commentary or explanations.
+"""
+
+CITE_FIX = 'Attribute the SUMMARY to its source, e.g. "TechCrunch reports that..."'
+SOURCE_FIX = "Add the SOURCE line: publication and article title or URL"
+SUMMARY_FIX = "Add a 2-3 sentence SUMMARY of what happened"
+
+
+def plan_repairs(stories: List[Story], validation: Dict, expected_stories: int = 10,
+                 target_date: str = None) -> Tuple[List[Story], int, Dict[int, List[str]]]:
+    """Apply the local fixes and list the model requests still needed.
+
+    Returns the kept stories, how many more stories to request, and
+    {index into kept stories: fixes} for the stories to revise.
+    """
+    issues = " ".join(validation.get("issues", [])).lower()
+    kept = list(stories)
+    if target_date and "24-hour window" in issues:
+        allowed = set(_date_window(target_date))
+        kept = [story for story in kept if not story.published or story.published in allowed]
+    kept = kept[:expected_stories]
+
+    fixes: Dict[int, List[str]] = {}
+    if "missing sources" in issues:
+        for index, story in enumerate(kept):
+            if not story.source:
+                fixes.setdefault(index, []).append(SOURCE_FIX)
+    if "missing summaries" in issues:
+        for index, story in enumerate(kept):
+            if not story.summary:
+                fixes.setdefault(index, []).append(SUMMARY_FIX)
+    if "citation" in issues:
+        # Only as many stories as it takes to reach MIN_CITATIONS
+        needed = MIN_CITATIONS - scan(format_stories(kept, numbered=True)).citation_count
+        uncited = [index for index, story in enumerate(kept) if not scan(story.to_block()).citation_count]
+        for index in uncited[:max(0, needed)]:
+            fixes.setdefault(index, []).append(CITE_FIX)
+    return kept, max(0, expected_stories - len(kept)), fixes
+
+
+def more_stories_messages(stories: List[Story], count: int, target_date: str, source: str = None) -> List[Dict]:
+    today, yesterday = _date_window(target_date)
+    selected = "\n".join(f"- {story.headline}" for story in stories) or "(none)"
+    pool = f"Research to choose from:\n{source}" if source else "Find them with web search."
+    return cached_prompt(MORE_STORIES_INSTRUCTIONS, f"""Stories needed: {count}
+Date window: only stories from {today} or {yesterday}
+
+Already selected (do not repeat):
+{selected}
+
+{pool}""")
+
+
+def fix_stories_messages(stories: List[Story], fixes: Dict[int, List[str]]) -> List[Dict]:
+    blocks = []
+    for index, story_fixes in sorted(fixes.items()):
+        needed = "\n".join(f"- {fix}" for fix in story_fixes)
+        blocks.append(f"Fixes:\n{needed}\n{stories[index].to_block(index + 1)}")
+    return cached_prompt(FIX_STORIES_INSTRUCTIONS, "Stories to revise:\n\n" + "\n\n".join(blocks))
+
+
+def request_more_stories(stories: List[Story], count: int, target_date: str, source: str = None,
+                         stage: str = "prioritize") -> List[Story]:
+    """Up to *count* new stories whose headlines are not already in *stories*"""
+    messages = more_stories_messages(stories, count, target_date, source)
+    options = {"tools": None} if source else {}
+    result = clean_agent_output(run_anthropic_chat(messages, max_tokens=REPAIR_MAX_TOKENS, stage=stage, **options))
+    seen = {normalize_headline(story.headline) for story in stories}
+    added = []
+    for story in parse_stories(result):
+        key = normalize_headline(story.headline)
+        if key not in seen:
+            seen.add(key)
+            added.append(story)
+    return added[:count]
+
+
+def request_fixes(stories: List[Story], fixes: Dict[int, List[str]], stage: str = "prioritize") -> Dict[int, Story]:
+    """{index: revised story}; stories the answer does not return are left out"""
+    result = run_anthropic_chat(fix_stories_messages(stories, fixes), max_tokens=REPAIR_MAX_TOKENS,
+                                stage=stage, tools=None)
+    revised = {}
+    for story in parse_stories(clean_agent_output(result)):
+        if story.rank is not None and story.rank - 1 in fixes:
+            revised[story.rank - 1] = story
+    return revised
+
+
+def _result(future, default, stage: str):
+    """A repair request's result, or *default* when it was not needed or failed"""
+    if future is None:
+        return default
+    try:
+        return future.result()
+    except Exception as exc:
+        logging.warning(f"{stage} repair request failed: {exc}")
+        return default
+
+
+def repair_story_list(output: str, validator: Callable[[str, int], Dict], expected_stories: int = 10,
+                      target_date: str = None, source: str = None, stage: str = "prioritize",
+                      max_rounds: int = MAX_REPAIR_ROUNDS, debug: bool = False) -> str:
+    """Patch a numbered STORY list until *validator* passes or max_rounds runs out.
+
+    *source* is the research the list was chosen from; without it, missing
+    stories are found with web search. Returns the best list reached, which
+    may still fail validation.
+    """
+    validation = validator(output, expected_stories)
+    for round_number in range(1, max_rounds + 1):
+        if validation["valid"]:
+            break
+        stories = parse_stories(clean_agent_output(output))
+        stories, missing, fixes = plan_repairs(stories, validation, expected_stories, target_date)
+        if debug:
+            print(f"   🩹 {stage} repair round {round_number}: {missing} more stories, "
+                  f"revising {[index + 1 for index in sorted(fixes)]}")
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            more = submit_in_context(pool, request_more_stories, stories, missing, target_date, source, stage) \
+                if missing else None
+            fixed = submit_in_context(pool, request_fixes, stories, fixes, stage) if fixes else None
+            added = _result(more, [], stage)
+            revised = _result(fixed, {}, stage)
+
+        repaired = format_stories([revised.get(i, story) for i, story in enumerate(stories)] + added, numbered=True)
+        if repaired == output:
+            break
+        output = repaired
+        validation = validator(output, expected_stories)
+    return output
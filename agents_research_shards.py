@@ -0,0 +1,177 @@
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from agents_client import run_anthropic_chat
+from agents_pipeline_v3 import cached_prompt, clean_agent_output
+from agents_stories import format_stories, headline_similarity, normalize_headline, parse_stories
+from agents_tiering import submit_in_context
+
+# Fan-out research for the V3 pipeline
+# Features:
+# - Research split into company, outlet and topic shards
+# - At most SHARD_MAX_WORKERS shards in flight (AOK_SHARD_WORKERS, default 4);
+#   the shared rate limiter (agents_ratelimit) paces them further when
+#   AOK_RATE_RPM/AOK_RATE_TPM are set
+# - Results merged and de-duplicated by URL/headline into the
+#   STORY/SOURCE/DATE/SUMMARY/IMPACT format the prioritizer expects
+
+SHARD_MAX_TOKENS = 4096
+SHARD_MAX_WORKERS = max(1, int(os.getenv("AOK_SHARD_WORKERS", "4")))
+
+
+@dataclass(frozen=True)
+class ResearchShard:
+    name: str
+    kind: str  # "company", "outlet" or "topic"
+    focus: str
+    stories: int = 5
+
+
+COMPANY_SHARDS = [
+    ResearchShard("company:openai", "company", "OpenAI"),
+    ResearchShard("company:google", "company", "Google AI and Google DeepMind"),
+    ResearchShard("company:meta", "company", "Meta AI"),
+    ResearchShard("company:anthropic", "company", "Anthropic"),
+    ResearchShard("company:microsoft", "company", "Microsoft AI"),
+    ResearchShard("company:amazon", "company", "Amazon and AWS AI"),
+    ResearchShard("company:nvidia", "company", "Nvidia"),
+    ResearchShard("company:open-models", "company", "Hugging Face, Mistral, Cohere and other open-model labs"),
+]
+
+OUTLET_SHARDS = [
+    ResearchShard("outlet:techcrunch", "outlet", "site:techcrunch.com"),
+    ResearchShard("outlet:theverge", "outlet", "site:theverge.com"),
+    ResearchShard("outlet:bloomberg", "outlet", "site:bloomberg.com"),
+    ResearchShard("outlet:theinformation", "outlet", "site:theinformation.com"),
+    ResearchShard("outlet:wired", "outlet", "site:wired.com"),
+    ResearchShard("outlet:axios", "outlet", "site:axios.com"),
+]
+
+TOPIC_SHARDS = [
+    ResearchShard("topic:research", "topic", "AI research papers and model releases"),
+    ResearchShard("topic:policy", "topic", "AI policy, regulation and geopolitics"),
+    ResearchShard("topic:funding", "topic", "AI funding rounds, acquisitions and earnings"),
+    ResearchShard("topic:infrastructure", "topic", "AI chips, data centers and compute infrastructure"),
+]
+
+DEFAULT_SHARDS = COMPANY_SHARDS + OUTLET_SHARDS + TOPIC_SHARDS
+
+
+def select_shards(kinds: Optional[Iterable[str]] = None, names: Optional[Iterable[str]] = None) -> List[ResearchShard]:
+    """Filter DEFAULT_SHARDS by kind ("company", "outlet", "topic") and/or exact name"""
+    kinds = set(kinds or [])
+    names = set(names or [])
+    return [
+        shard for shard in DEFAULT_SHARDS
+        if (not kinds or shard.kind in kinds) and (not names or shard.name in names)
+    ]
+
+
+SHARD_INSTRUCTIONS = """
+You are a Research Agent for "Apes On Knowledge" - AI Daily News. Find AI news in the scope given at the end, from the LAST 24 HOURS ONLY (the date window is given at the end).
+
+MANDATORY REQUIREMENTS:
+1. Use web search to find actual recent news
+2. Only include stories published inside the date window
+3. Find at most the number of stories given at the end; return fewer rather than padding with old news
+4. Include exact source citations for each story
+
+CRITICAL OUTPUT FORMAT:
+Return ONLY a list of stories in this exact format:
+
+STORY: [Exact headline from source]
+SOURCE: [Publication name] - [Article title/URL]
+DATE: [Publication date, YYYY-MM-DD]
+SUMMARY: [2-3 sentences about what happened]
+IMPACT: [Why it matters to AI practitioners]
+
+---
+
+DO NOT include any search commentary, explanations, or process notes in your output. Return ONLY the formatted story list.
+"""
+
+
+def shard_messages(shard: ResearchShard, date: str) -> List[Dict]:
+    # Every shard shares the instructions; only the scope and dates vary
+    target_date = datetime.strptime(date, "%Y-%m-%d")
+    yesterday = (target_date - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    if shard.kind == "outlet":
+        scope = f'AI news published by {shard.focus} (search with "{shard.focus} AI {date}")'
+    elif shard.kind == "company":
+        scope = f'AI news about {shard.focus} (search "{shard.focus} news {date}")'
+    else:
+        scope = f'AI news about {shard.focus} (search "{shard.focus} {date}")'
+
+    return cached_prompt(SHARD_INSTRUCTIONS, f"""Scope: {scope}
+Date window: only stories published on {date} or {yesterday}
+Stories: up to {shard.stories}""")
+
+
+def collect_shard(shard: ResearchShard, date: str) -> str:
+    result = run_anthropic_chat(shard_messages(shard, date), max_tokens=SHARD_MAX_TOKENS, stage="research")
+    return clean_agent_output(result)
+
+
+def _normalize_url(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return None
+    url = url.lower()
+    url = re.sub(r"^https?://(www\.)?", "", url)
+    return url.split("?")[0].split("#")[0].rstrip("/")
+
+
+def merge_research(results: Iterable[str], similarity_threshold: float = 0.8) -> str:
+    """Merge shard outputs, dropping stories whose URL or headline was already seen"""
+    merged = []
+    seen_urls = set()
+    seen_headlines = []
+    for text in results:
+        for story in parse_stories(text):
+            url = _normalize_url(story.url)
+            headline = normalize_headline(story.headline)
+            if url and url in seen_urls:
+                continue
+            if any(headline_similarity(headline, seen) >= similarity_threshold for seen in seen_headlines):
+                continue
+            if url:
+                seen_urls.add(url)
+            seen_headlines.append(headline)
+            merged.append(story)
+
+    return format_stories(merged, separator="\n---\n")
+
+
+def collect_research_sharded(date: str, shards: Optional[List[ResearchShard]] = None,
+                             max_workers: Optional[int] = None, debug: bool = False) -> str:
+    """Run every shard concurrently and return the merged, de-duplicated story list.
+
+    *max_workers* defaults to SHARD_MAX_WORKERS. A failing shard is logged and
+    skipped; the call only raises when every shard failed.
+    """
+    shards = shards if shards is not None else DEFAULT_SHARDS
+    max_workers = max_workers or SHARD_MAX_WORKERS
+    results = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {submit_in_context(pool, collect_shard, shard, date): shard for shard in shards}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                results[shard.name] = future.result()
+                if debug:
+                    print(f"   🔎 Shard {shard.name}: {len(parse_stories(results[shard.name]))} stories")
+            except Exception as exc:
+                logging.warning(f"Research shard {shard.name} failed: {exc}")
+                errors[shard.name] = exc
+
+    if shards and not results:
+        raise RuntimeError(f"All {len(shards)} research shards failed: {errors}")
+
+    # Merge in declared shard order so the output is deterministic
+    return merge_research(results[shard.name] for shard in shards if shard.name in results)
@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import anthropic
+
+# Resilient call layer for Anthropic requests
+# Features:
+# - Per-stage deadlines covering every attempt of a call
+# - Full-jitter exponential backoff on retryable errors (429, 5xx, 529, timeouts)
+# - Circuit breaker that fails fast while the API keeps failing; only API
+#   responses and API errors move it, local errors leave it untouched
+# - Rate-limiter waits happen before an attempt's timeout is computed, and an
+#   attempt with less than MIN_ATTEMPT_SECONDS left fails fast
+# - Optional hedged duplicate request once a call runs past the stage's latency percentile
+# - resilient_call_async(): the same policy for the asyncio pipeline, sharing the breaker
+
+T = TypeVar("T")
+
+STAGE_DEADLINES = {
+    "research": 300.0,
+    "prioritize": 120.0,
+    "script": 180.0,
+    "editorial": 180.0,
+}
+DEFAULT_DEADLINE = 180.0
+
+MAX_ATTEMPTS = 4
+MIN_ATTEMPT_SECONDS = 5.0
+BACKOFF_BASE = 2.0
+BACKOFF_CAP = 30.0
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 60.0
+
+# Hedging: stages that may send a duplicate request, the latency percentile that
+# triggers it, and how many samples are needed before the percentile is trusted
+HEDGED_STAGES = {s.strip() for s in os.getenv("AOK_HEDGE_STAGES", "").split(",") if s.strip()}
+HEDGE_PERCENTILE = 0.9
+HEDGE_MIN_SAMPLES = 5
+LATENCY_WINDOW = 50
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the API while the circuit breaker is open"""
+
+
+def reached_api(exc: Exception) -> bool:
+    """Whether *exc* is an Anthropic answer or transport failure, as opposed to a local error"""
+    return isinstance(exc, anthropic.APIError)
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, anthropic.APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(exc, anthropic.APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS
+    return False
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    """Full-jitter delay before retry number *attempt* (0-based)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probe after a cool-down"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self._probing):
+                retry_in = self.reset_seconds - (time.monotonic() - self.opened_at)
+                raise CircuitOpenError(f"Anthropic circuit open after {self.failures} failures; "
+                                       f"retry in {max(0.0, retry_in):.0f}s")
+            if state == "half_open":
+                self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_neutral(self) -> None:
+        """An attempt that failed before reaching the API frees a half-open probe, nothing else"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Recent successful call durations per stage"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self.window = window
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, stage: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(q * len(samples)) - 1)]
+
+
+circuit_breaker = CircuitBreaker()
+latency_tracker = LatencyTracker()
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="aok-hedge")
+
+
+def _hedged(fn: Callable[[float], T], timeout: float, hedge_after: float,
+            acquire: Optional[Callable[[], None]] = None) -> T:
+    """Run *fn*, starting one duplicate if it has not finished after *hedge_after* seconds"""
+    started = time.monotonic()
+    futures = {_hedge_pool.submit(fn, timeout)}
+    done, _ = wait(futures, timeout=hedge_after)
+    if not done:
+        logging.info(f"Hedging request after {hedge_after:.1f}s")
+
+        def twin():
+            if acquire is not None:
+                acquire()
+            return fn(max(MIN_ATTEMPT_SECONDS, timeout - (time.monotonic() - started)))
+
+        futures.add(_hedge_pool.submit(twin))
+
+    error = None
+    pending = futures
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # The slower twin is left to finish in the background
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def _attempt_timeout(stage: Optional[str], expires: float) -> float:
+    """Seconds left for the next attempt, failing fast when too little remains to be useful"""
+    remaining = expires - time.monotonic()
+    if remaining < MIN_ATTEMPT_SECONDS:
+        raise TimeoutError(f"{stage or 'chat'} deadline reached before the request could be sent")
+    return remaining
+
+
+def _record_non_retryable(breaker: CircuitBreaker, exc: Exception) -> None:
+    if reached_api(exc):
+        # The API answered (e.g. a 400), so it is not degraded
+        breaker.record_success()
+    else:
+        # A local error says nothing about the API's health
+        breaker.record_neutral()
+
+
+def resilient_call(stage: Optional[str], fn: Callable[[float], T], deadline: Optional[float] = None,
+                   hedge: Optional[bool] = None, breaker: CircuitBreaker = circuit_breaker,
+                   sleep: Callable[[float], None] = time.sleep,
+                   acquire: Optional[Callable[[], None]] = None) -> T:
+    """Call fn(timeout) with retries, backoff, circuit breaking and optional hedging.
+
+    *fn* receives the seconds left before the stage deadline and should pass
+    them on as the request timeout. *acquire* (e.g. a rate-limiter wait) runs
+    before every attempt, ahead of that timeout being computed. Non-retryable
+    errors propagate at once; retryable ones are retried until MAX_ATTEMPTS or
+    the deadline.
+    """
+    deadline = deadline or STAGE_DEADLINES.get(stage, DEFAULT_DEADLINE)
+    hedge = stage in HEDGED_STAGES if hedge is None else hedge
+    expires = time.monotonic() + deadline
+
+    for attempt in range(MAX_ATTEMPTS):
+        if acquire is not None:
+            acquire()
+        remaining = _attempt_timeout(stage, expires)
+        breaker.before_call()
+        started = time.monotonic()
+        try:
+            hedge_after = latency_tracker.percentile(stage, HEDGE_PERCENTILE) if hedge else None
+            if hedge_after is not None and hedge_after < remaining:
+                result = _hedged(fn, remaining, hedge_after, acquire)
+            else:
+                result = fn(remaining)
+        except Exception as exc:
+            if not is_retryable(exc):
+                _record_non_retryable(breaker, exc)
+                raise
+            breaker.record_failure()
+            delay = backoff_delay(attempt)
+            if attempt == MAX_ATTEMPTS - 1 or time.monotonic() + delay >= expires:
+                raise
+            logging.warning(f"{stage or 'chat'} attempt {attempt + 1} failed ({exc}); retrying in {delay:.1f}s")
+            sleep(delay)
+            continue
+        breaker.record_success()
+        latency_tracker.record(stage, time.monotonic() - started)
+        return result
+
+
+async def resilient_call_async(stage: Optional[str], fn: Callable[[float], Awaitable[T]],
+                               deadline: Optional[float] = None, breaker: CircuitBreaker = circuit_breaker,
+                               sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+                               acquire: Optional[Callable[[], Awaitable[None]]] = None) -> T:
+    """resilient_call() for coroutines, without hedging.
+
+    Deadlines, backoff, the circuit breaker and the latency samples are
+    shared with the threaded pipelines.
+    """
+    deadline = deadline or STAGE_DEADLINES.get(stage, DEFAULT_DEADLINE)
+    expires = time.monotonic() + deadline
+
+    for attempt in range(MAX_ATTEMPTS):
+        if acquire is not None:
+            await acquire()
+        remaining = _attempt_timeout(stage, expires)
+        breaker.before_call()
+        started = time.monotonic()
+        try:
+            result = await fn(remaining)
+        except Exception as exc:
+            if not is_retryable(exc):
+                _record_non_retryable(breaker, exc)
+                raise
+            breaker.record_failure()
+            delay = backoff_delay(attempt)
+            if attempt == MAX_ATTEMPTS - 1 or time.monotonic() + delay >= expires:
+                raise
+            logging.warning(f"{stage or 'chat'} attempt {attempt + 1} failed ({exc}); retrying in {delay:.1f}s")
+            await sleep(delay)
+            continue
+        breaker.record_success()
+        latency_tracker.record(stage, time.monotonic() - started)
+        return result
@@ -0,0 +1,156 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+# Typed story records exchanged between pipeline stages
+# Features:
+# - Parser for STORY/SOURCE/DATE/SUMMARY/IMPACT agent output
+# - Compact one-line-per-story serialization for downstream prompts
+# - Structured validation on fields instead of regex counts over prose
+
+STORY_FIELDS = ("STORY", "SOURCE", "DATE", "SUMMARY", "IMPACT")
+
+_FIELD_RE = re.compile(r"^[\s*#>-]*(STORY(?:\s+\d+)?|SOURCE|DATE|SUMMARY|IMPACT)\s*\**\s*:\s*\**\s*(.*)$", re.IGNORECASE)
+_URL_RE = re.compile(r"https?://[^\s)\]]+", re.IGNORECASE)
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+@dataclass(slots=True)
+class Story:
+    headline: str
+    source: str = ""
+    date: str = ""
+    summary: str = ""
+    impact: str = ""
+    rank: Optional[int] = None
+
+    @property
+    def url(self) -> Optional[str]:
+        match = _URL_RE.search(self.source)
+        return match.group(0).rstrip(".,;'\"") if match else None
+
+    @property
+    def publication(self) -> str:
+        return self.source.split(" - ", 1)[0].strip()
+
+    @property
+    def published(self) -> Optional[str]:
+        """First ISO date found in the DATE field"""
+        match = _DATE_RE.search(self.date)
+        return match.group(0) if match else None
+
+    def to_block(self, number: Optional[int] = None) -> str:
+        label = f"STORY {number}" if number is not None else "STORY"
+        lines = [f"{label}: {self.headline}"]
+        for field, value in (("SOURCE", self.source), ("DATE", self.date),
+                             ("SUMMARY", self.summary), ("IMPACT", self.impact)):
+            if value:
+                lines.append(f"{field}: {value}")
+        return "\n".join(lines)
+
+
+def parse_stories(text: str) -> List[Story]:
+    """Turn STORY/SOURCE/DATE/SUMMARY/IMPACT blocks into Story records.
+
+    Numbered headers ("STORY 3:") set Story.rank; lines without a field
+    label are appended to the previous field.
+    """
+    stories = []
+    current = None
+    last_field = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line == "---":
+            continue
+        match = _FIELD_RE.match(line)
+        if match:
+            label = match.group(1).upper().split()
+            value = match.group(2).strip().strip("*").strip()
+            if label[0] == "STORY":
+                current = Story(headline=value, rank=int(label[1]) if len(label) > 1 else None)
+                stories.append(current)
+                last_field = "headline"
+            elif current is not None:
+                last_field = label[0].lower()
+                setattr(current, last_field, value)
+        elif current is not None and last_field:
+            setattr(current, last_field, f"{getattr(current, last_field)} {line}".strip())
+    return [story for story in stories if story.headline]
+
+
+def normalize_headline(headline: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", headline.lower()))
+
+
+def headline_similarity(a: str, b: str) -> float:
+    """Token Jaccard similarity of two normalized headlines"""
+    tokens_a, tokens_b = set(a.split()), set(b.split())
+    if not tokens_a or not tokens_b:
+        return 0.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+def format_stories(stories: Iterable[Story], numbered: bool = False, separator: str = "\n\n") -> str:
+    """Render records back into the agents' STORY block format"""
+    return separator.join(
+        story.to_block(i if numbered else None) for i, story in enumerate(stories, 1)
+    )
+
+
+def _compact(value: str) -> str:
+    return " ".join(value.replace("|", "/").split())
+
+
+def serialize_stories(stories: Iterable[Story]) -> str:
+    """Minimal hand-off form: a header row then one pipe-separated row per story"""
+    rows = ["id|headline|source|date|summary|impact"]
+    for i, story in enumerate(stories, 1):
+        rows.append("|".join([
+            str(i),
+            _compact(story.headline),
+            _compact(story.source),
+            story.published or _compact(story.date),
+            _compact(story.summary),
+            _compact(story.impact),
+        ]))
+    return "\n".join(rows)
+
+
+def validate_stories(stories: List[Story], expected_stories: int = 10, minimum: bool = False,
+                     target_date: Optional[str] = None) -> Dict:
+    """validate_output equivalent computed from parsed fields.
+
+    With *minimum* the story count only has to reach *expected_stories*
+    (research), otherwise it must match exactly (prioritized list).
+    """
+    issues = []
+
+    count_ok = len(stories) >= expected_stories if minimum else len(stories) == expected_stories
+    if not count_ok:
+        issues.append(f"Expected {'at least ' if minimum else ''}{expected_stories} stories, found {len(stories)}")
+
+    missing_sources = [i for i, story in enumerate(stories, 1) if not story.source]
+    if missing_sources:
+        issues.append(f"Stories missing sources: {missing_sources}")
+
+    missing_summaries = [i for i, story in enumerate(stories, 1) if not story.summary]
+    if missing_summaries:
+        issues.append(f"Stories missing summaries: {missing_summaries}")
+
+    stale = []
+    if target_date:
+        allowed = {target_date, (datetime.strptime(target_date, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")}
+        stale = [i for i, story in enumerate(stories, 1) if story.published and story.published not in allowed]
+        if stale:
+            issues.append(f"Stories outside the 24-hour window: {stale}")
+
+    return {
+        "valid": len(issues) == 0,
+        "issues": issues,
+        "story_count": len(stories),
+        "citation_count": len(stories) - len(missing_sources),
+        "has_leakage": False,
+        "missing_sources": missing_sources,
+        "stale_stories": stale,
+    }
@@ -0,0 +1,146 @@
+import time
+from datetime import date as dt_date
+from typing import Callable, Dict, Iterator, List
+
+from agents_cache import make_cache_key, response_cache
+from agents_validation import validate_script
+import agents_client
+import agents_pipeline_v3 as v3
+
+# Streaming variant of the V3 pipeline
+# Features:
+# - Uses the SDK streaming Messages API so text arrives as it is generated
+# - clean_agent_output applied line by line to the partial text
+# - Emits stage_start / text / search / stage_end / done events for SSE clients
+
+
+class StreamLineCleaner:
+    """Incrementally apply clean_agent_output to complete lines of streamed text"""
+
+    def __init__(self):
+        self._buffer = ""
+        self.lines: List[str] = []
+
+    def feed(self, chunk: str) -> List[str]:
+        self._buffer += chunk
+        *complete, self._buffer = self._buffer.split("\n")
+        return self._clean(complete)
+
+    def flush(self) -> List[str]:
+        remainder, self._buffer = self._buffer, ""
+        return self._clean([remainder])
+
+    def _clean(self, raw_lines: List[str]) -> List[str]:
+        cleaned = []
+        for line in raw_lines:
+            line = v3.clean_agent_output(line + "\n")
+            if line:
+                cleaned.append(line)
+        self.lines.extend(cleaned)
+        return cleaned
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+def stream_anthropic_chat(messages: List[Dict], model=agents_client.DEFAULT_MODEL, max_tokens=8192,
+                          stage: str = None, use_cache: bool = True) -> Iterator[Dict]:
+    """Yield {"type": "text"|"search", ...} events while a response streams in.
+
+    Cached responses are replayed as a single text event.
+    """
+    messages = agents_client.drop_short_cache_markers(messages, model)
+    cache_key = make_cache_key(model, messages, agents_client.WEB_SEARCH_TOOLS, max_tokens)
+    if use_cache:
+        cached = response_cache.get(cache_key, stage)
+        if cached is not None:
+            yield {"type": "text", "text": cached["text"], "cached": True}
+            return
+
+    text_content = ""
+    with agents_client.current_client().messages.stream(
+        model=model,
+        messages=messages,
+        tools=agents_client.WEB_SEARCH_TOOLS,
+        max_tokens=max_tokens
+    ) as stream:
+        for event in stream:
+            if event.type == "text":
+                text_content += event.text
+                yield {"type": "text", "text": event.text}
+            elif event.type == "content_block_start" and getattr(event.content_block, "type", "") == "server_tool_use":
+                yield {"type": "search", "tool": event.content_block.name}
+
+    if use_cache:
+        response_cache.set(cache_key, {"model": model, "text": text_content.strip()}, stage)
+
+
+def _run_stage(stage: str, messages: List[Dict], expected_stories: int,
+               validator: Callable[[str, int], Dict] = v3.validate_output) -> Iterator[Dict]:
+    started = time.monotonic()
+    yield {"event": "stage_start", "data": {"stage": stage}}
+
+    cleaner = StreamLineCleaner()
+    for chunk in stream_anthropic_chat(messages, max_tokens=agents_client.stage_max_tokens(stage), stage=stage):
+        if chunk["type"] == "search":
+            yield {"event": "search", "data": {"stage": stage, "tool": chunk["tool"]}}
+            continue
+        for line in cleaner.feed(chunk["text"]):
+            yield {"event": "text", "data": {"stage": stage, "text": line}}
+    for line in cleaner.flush():
+        yield {"event": "text", "data": {"stage": stage, "text": line}}
+
+    output = cleaner.text
+    validation = validator(output, expected_stories)
+    yield {
+        "event": "stage_end",
+        "data": {
+            "stage": stage,
+            "chars": len(output),
+            "seconds": round(time.monotonic() - started, 2),
+            "validation": validation,
+        },
+        "output": output,
+    }
+
+
+def generate_episode_v3_stream(date_str: str = None, with_editor: bool = True) -> Iterator[Dict]:
+    """Streaming counterpart of generate_episode_v3.
+
+    Yields {"event": ..., "data": ...} dicts; the last one is a "done" event
+    whose data is the same result dict generate_episode_v3 returns.
+    """
+    date_str = date_str or str(dt_date.today())
+    outputs = {}
+    validations = {}
+
+    def run(stage, messages, expected, validator=v3.validate_output):
+        for item in _run_stage(stage, messages, expected, validator):
+            if item["event"] == "stage_end":
+                outputs[stage] = item.pop("output")
+                validations[stage] = item["data"]["validation"]
+            yield item
+
+    yield from run("research", v3.research_messages(date_str), 15)
+    yield from run("prioritize", v3.prioritize_messages(outputs["research"], date_str), 10)
+    yield from run("script", v3.script_messages(outputs["prioritize"], date_str), 10, validate_script)
+    if with_editor:
+        yield from run("editorial", v3.editorial_messages(outputs["script"]), 10, validate_script)
+
+    final_stage = "editorial" if with_editor else "script"
+    yield {
+        "event": "done",
+        "data": {
+            "date": date_str,
+            "research": outputs["research"],
+            "summary": outputs["prioritize"],
+            "script": outputs[final_stage],
+            "validations": {
+                "research": validations["research"],
+                "summary": validations["prioritize"],
+                "script": validations["script"],
+                "final": validations[final_stage],
+            },
+        },
+    }
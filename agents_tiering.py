@@ -0,0 +1,108 @@
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from agents_metrics import metrics_store
+
+# Model tiering for the V3 pipeline
+# Features:
+# - Each stage starts on a configurable model tier (STAGE_TIERS, overridable
+#   with AOK_STAGE_TIERS="prioritize=small,editorial=small")
+# - The stage output is checked with the stage's validator; only a failing
+#   result is rerun on the next larger tier
+# - Per-tier latency and pass/fail are recorded in the metrics log
+#
+# The tier's model is carried in a context variable that run_anthropic_chat
+# reads, so stage functions need no model argument. Stages that fan out to
+# their own thread pool submit through submit_in_context() to keep it.
+
+TIER_ORDER = ["small", "large"]
+
+MODEL_TIERS = {
+    "small": os.getenv("AOK_MODEL_SMALL", "claude-3-5-haiku-20241022"),
+    "large": os.getenv("AOK_MODEL_LARGE", "claude-3-5-sonnet-20241022"),
+}
+
+# Reformatting work starts small; web research, writing and translation
+# start (and stay) on the large model
+DEFAULT_STAGE_TIERS = {
+    "research": "large",
+    "prioritize": "small",
+    "script": "large",
+    "editorial": "small",
+    "metadata": "small",
+    "translate": "large",
+}
+
+_stage_model = contextvars.ContextVar("aok_stage_model", default=None)
+
+
+def parse_stage_tiers(value: str) -> Dict[str, str]:
+    """"stage=tier,stage=tier" -> {stage: tier}; unknown tiers raise ValueError"""
+    tiers = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        stage, _, tier = item.partition("=")
+        tier = tier.strip()
+        if tier not in MODEL_TIERS:
+            raise ValueError(f"Unknown model tier '{tier}' for stage '{stage.strip()}', expected one of {TIER_ORDER}")
+        tiers[stage.strip()] = tier
+    return tiers
+
+
+STAGE_TIERS = dict(DEFAULT_STAGE_TIERS, **parse_stage_tiers(os.getenv("AOK_STAGE_TIERS", "")))
+
+
+def current_model() -> Optional[str]:
+    """Model chosen by the enclosing use_model() block, if any"""
+    return _stage_model.get()
+
+
+@contextmanager
+def use_model(model: str):
+    token = _stage_model.set(model)
+    try:
+        yield
+    finally:
+        _stage_model.reset(token)
+
+
+def submit_in_context(pool, fn, *args, **kwargs):
+    """pool.submit() that runs *fn* with the caller's model choice"""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def escalation_path(stage: str, tiers: Optional[Dict[str, str]] = None) -> List[str]:
+    """Tiers to try for *stage*, starting at its configured tier"""
+    start = (tiers or STAGE_TIERS).get(stage, TIER_ORDER[-1])
+    return TIER_ORDER[TIER_ORDER.index(start):]
+
+
+def tiered(stage: str, run_fn: Callable, validator: Callable, expected_stories: int = 10,
+           tiers: Optional[Dict[str, str]] = None, debug: bool = False) -> Callable:
+    """Wrap a stage function so it runs on the stage's tier and escalates on validation failure.
+
+    The last tier's output is returned even when it fails, so the graph
+    records the failing validation as it would without tiering.
+    """
+    path = escalation_path(stage, tiers)
+
+    def run(*inputs):
+        for tier in path:
+            started = time.monotonic()
+            with use_model(MODEL_TIERS[tier]):
+                output = run_fn(*inputs)
+            validation = validator(output, expected_stories)
+            metrics_store.record_tier(stage, tier, MODEL_TIERS[tier], time.monotonic() - started,
+                                      passed=validation["valid"])
+            if validation["valid"]:
+                return output
+            if tier != path[-1]:
+                logging.info(f"{stage} failed validation on the {tier} tier, escalating: {validation.get('issues')}")
+                if debug:
+                    print(f"   ⬆️  {stage}: {tier} tier failed validation, escalating")
+        return output
+
+    return run
@@ -0,0 +1,305 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, Optional
+
+import anthropic
+
+# Record/replay transport for the Anthropic client
+# Features:
+# - AOK_LLM_MODE=record wraps the real client and saves every messages.create
+#   (and messages.stream) request/response pair as a JSON fixture
+# - AOK_LLM_MODE=replay serves those fixtures from a local stand-in client, so the
+#   pipelines, GenerateScriptView and the test_pipeline* commands run with no network
+# - Injected replay latency: a fixed delay or the recorded one, optionally scaled
+# - use_transport(): a client (and cache/history switches) scoped to a context
+#   instead of patched into modules; stage and fan-out threads inherit it
+#
+# Record with the response cache off (--no-cache / AOK_CACHE_ENABLED=0) so every
+# call reaches the client and gets a fixture.
+
+LLM_MODE = os.getenv("AOK_LLM_MODE", "live").lower()
+FIXTURE_DIR = os.getenv(
+    "AOK_FIXTURE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "llm"),
+)
+# Seconds per replayed call, or "recorded" to sleep for the recorded latency
+REPLAY_LATENCY = os.getenv("AOK_REPLAY_LATENCY", "0")
+REPLAY_LATENCY_SCALE = float(os.getenv("AOK_REPLAY_LATENCY_SCALE", "1"))
+
+# Request options that do not change the answer and are left out of fixture keys.
+# max_tokens is excluded because it is sized from history (agents_budget).
+_UNKEYED_OPTIONS = {"max_tokens", "timeout", "stream", "extra_headers"}
+
+
+class FixtureNotFoundError(LookupError):
+    """Replay mode found no recorded response for a request"""
+
+
+def fixture_key(request: Dict) -> str:
+    keyed = {k: v for k, v in request.items() if k not in _UNKEYED_OPTIONS}
+    serialized = json.dumps(keyed, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def _to_namespace(value):
+    """JSON data -> attribute access, enough for code that reads SDK response objects"""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: _to_namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_to_namespace(v) for v in value]
+    return value
+
+
+def _dump(response) -> Dict:
+    if hasattr(response, "model_dump"):
+        return response.model_dump(mode="json")
+    return json.loads(json.dumps(response, default=lambda o: vars(o)))
+
+
+class FixtureStore:
+    def __init__(self, directory: str = FIXTURE_DIR):
+        self.directory = directory
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def save(self, request: Dict, response, latency: float) -> str:
+        key = fixture_key(request)
+        os.makedirs(self.directory, exist_ok=True)
+        record = {
+            "request": {k: v for k, v in request.items() if k not in ("timeout", "extra_headers")},
+            "response": _dump(response),
+            "latency": round(latency, 3),
+        }
+        tmp_path = f"{self.path(key)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=1, default=str)
+        os.replace(tmp_path, self.path(key))
+        return key
+
+    def load(self, request: Dict) -> Dict:
+        key = fixture_key(request)
+        try:
+            with open(self.path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            stage_hint = str(request.get("messages", ""))[:80]
+            raise FixtureNotFoundError(
+                f"No recorded response {key[:12]} in {self.directory} for request {stage_hint!r}; "
+                f"record it with AOK_LLM_MODE=record"
+            ) from None
+
+
+def replay_delay(recorded: float, latency: Optional[str] = None) -> float:
+    """Seconds to wait before a replayed response; *latency* overrides REPLAY_LATENCY"""
+    latency = REPLAY_LATENCY if latency is None else latency
+    if latency == "recorded":
+        return recorded * REPLAY_LATENCY_SCALE
+    return float(latency) * REPLAY_LATENCY_SCALE
+
+
+class _ReplayStream:
+    """Minimal MessageStream stand-in emitting text and server_tool_use block events"""
+
+    def __init__(self, message, delay: float):
+        self.message = message
+        self.delay = delay
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self) -> Iterator:
+        blocks = getattr(self.message, "content", [])
+        per_event = self.delay / max(1, len(blocks))
+        for block in blocks:
+            if per_event:
+                time.sleep(per_event)
+            if getattr(block, "type", "") == "server_tool_use":
+                yield SimpleNamespace(type="content_block_start", content_block=block)
+            elif hasattr(block, "text"):
+                for line in block.text.splitlines(keepends=True):
+                    yield SimpleNamespace(type="text", text=line)
+
+    def get_final_message(self):
+        return self.message
+
+
+class _ReplayMessages:
+    def __init__(self, store: FixtureStore, latency: Optional[str] = None):
+        self.store = store
+        self.latency = latency
+
+    def create(self, **request):
+        record = self.store.load(request)
+        time.sleep(replay_delay(record.get("latency", 0), self.latency))
+        return _to_namespace(record["response"])
+
+    def stream(self, **request):
+        record = self.store.load(request)
+        return _ReplayStream(_to_namespace(record["response"]), replay_delay(record.get("latency", 0), self.latency))
+
+
+class ReplayClient:
+    """Offline stand-in for anthropic.Client serving recorded fixtures"""
+
+    def __init__(self, directory: str = FIXTURE_DIR, latency: Optional[str] = None):
+        self.store = FixtureStore(directory)
+        self.messages = _ReplayMessages(self.store, latency)
+
+    def with_options(self, **options):
+        return self
+
+
+class _RecordingStream:
+    def __init__(self, inner, store: FixtureStore, request: Dict):
+        self.inner = inner
+        self.store = store
+        self.request = request
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        self.stream = self.inner.__enter__()
+        return self
+
+    def __iter__(self):
+        return iter(self.stream)
+
+    def get_final_message(self):
+        return self.stream.get_final_message()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            try:
+                self.store.save(self.request, self.stream.get_final_message(), time.monotonic() - self.started)
+            except Exception as save_exc:
+                logging.warning(f"Could not record streamed Anthropic fixture: {save_exc}")
+        return self.inner.__exit__(exc_type, exc, tb)
+
+
+class _RecordingMessages:
+    def __init__(self, inner, store: FixtureStore):
+        self.inner = inner
+        self.store = store
+
+    def create(self, **request):
+        started = time.monotonic()
+        response = self.inner.create(**request)
+        key = self.store.save(request, response, time.monotonic() - started)
+        logging.info(f"Recorded Anthropic fixture {key[:12]}")
+        return response
+
+    def stream(self, **request):
+        return _RecordingStream(self.inner.stream(**request), self.store, request)
+
+
+class RecordingClient:
+    """Wraps a real client and saves every response as a replay fixture"""
+
+    def __init__(self, inner, directory: str = FIXTURE_DIR):
+        self.inner = inner
+        self.store = FixtureStore(directory)
+        self.messages = _RecordingMessages(inner.messages, self.store)
+
+    def with_options(self, **options):
+        return RecordingClient(self.inner.with_options(**options), self.store.directory)
+
+
+class _AsyncReplayMessages:
+    def __init__(self, store: FixtureStore, latency: Optional[str] = None):
+        self.store = store
+        self.latency = latency
+
+    async def create(self, **request):
+        record = self.store.load(request)
+        await asyncio.sleep(replay_delay(record.get("latency", 0), self.latency))
+        return _to_namespace(record["response"])
+
+
+class _AsyncRecordingMessages:
+    def __init__(self, inner, store: FixtureStore):
+        self.inner = inner
+        self.store = store
+
+    async def create(self, **request):
+        started = time.monotonic()
+        response = await self.inner.create(**request)
+        await asyncio.to_thread(self.store.save, request, response, time.monotonic() - started)
+        return response
+
+
+class AsyncReplayClient:
+    def __init__(self, directory: str = FIXTURE_DIR, latency: Optional[str] = None):
+        self.messages = _AsyncReplayMessages(FixtureStore(directory), latency)
+
+    def with_options(self, **options):
+        return self
+
+
+class AsyncRecordingClient:
+    def __init__(self, inner, directory: str = FIXTURE_DIR):
+        self.inner = inner
+        self.directory = directory
+        self.messages = _AsyncRecordingMessages(inner.messages, FixtureStore(directory))
+
+    def with_options(self, **options):
+        return AsyncRecordingClient(self.inner.with_options(**options), self.directory)
+
+
+def make_client(api_key: Optional[str] = None, mode: str = LLM_MODE):
+    """anthropic.Client, or its recording/replaying stand-in per AOK_LLM_MODE"""
+    if mode == "replay":
+        return ReplayClient()
+    client = anthropic.Client(api_key=api_key)
+    return RecordingClient(client) if mode == "record" else client
+
+
+def make_async_client(api_key: Optional[str] = None, mode: str = LLM_MODE):
+    if mode == "replay":
+        return AsyncReplayClient()
+    client = anthropic.AsyncAnthropic(api_key=api_key)
+    return AsyncRecordingClient(client) if mode == "record" else client
+
+
+@dataclass(frozen=True)
+class TransportScope:
+    client: Any
+    cache: bool = True
+    history: bool = True
+
+
+_transport_scope = contextvars.ContextVar("aok_transport_scope", default=None)
+
+
+@contextmanager
+def use_transport(client, cache: bool = True, history: bool = True):
+    """Send the model calls made in this context to *client*.
+
+    cache=False skips the response cache and history=False keeps the calls
+    out of the max_tokens history (agents_budget), e.g. for benchmarks.
+    """
+    token = _transport_scope.set(TransportScope(client, cache, history))
+    try:
+        yield
+    finally:
+        _transport_scope.reset(token)
+
+
+def transport_scope() -> Optional[TransportScope]:
+    """The enclosing use_transport() settings, if any"""
+    return _transport_scope.get()
+
+
+def offline() -> bool:
+    """True when calls are served from fixtures and no API key is needed"""
+    return LLM_MODE == "replay"
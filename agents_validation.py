@@ -0,0 +1,262 @@
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Shared script validation for the pipelines and review_pipeline_output
+# Features:
+# - Every check compiled into one alternation regex, so a script is scanned
+#   once (search leakage, story markers, citations, dates, opening/closing)
+# - validate_output(): the per-stage pipeline check for STORY lists
+# - validate_script(): the same checks for scripts, counting headline sections
+# - review_script(): the fuller editorial review with issues and a 0-100 score
+# - review_archive(): batch re-scoring of many (date, script) pairs
+
+LEAKAGE_INDICATORS = [
+    "Let me search",
+    "I'll search for",
+    "Based on the search results",
+    "Let me verify",
+    "I need to search",
+]
+
+MIN_CITATIONS = 5
+
+# Group order matters where alternatives could start at the same position:
+# ISO dates go before the numbered-list pattern so "2025-05-01." is one date.
+_SCANNER = re.compile("|".join([
+    "(?P<leak>" + "|".join(re.escape(indicator) for indicator in LEAKAGE_INDICATORS) + ")",
+    r"(?P<marker>STORY \d+:)",
+    r"(?P<title>Story \d+:)",
+    r"(?P<date>\d{4}-\d{2}-\d{2})",
+    r"(?P<numbered>\d+\.)",
+    r"(?P<citation>(?i:reports|according to|announced))",
+    r"(?P<hello>Hello world)",
+    r"(?P<show>Apes On Knowledge)",
+    r"(?P<newsbot>A-OK Newsbot)",
+    r"(?P<signoff>signing off)",
+]))
+
+
+@dataclass
+class ScriptScan:
+    leakage: Counter = field(default_factory=Counter)
+    dates: Counter = field(default_factory=Counter)
+    counts: Counter = field(default_factory=Counter)
+
+    @property
+    def has_leakage(self) -> bool:
+        return bool(self.leakage)
+
+    @property
+    def story_markers(self) -> int:
+        """Count of "STORY N:" markers, the pipeline's story format"""
+        return self.counts["marker"]
+
+    @property
+    def story_count(self) -> int:
+        """Best guess across "STORY N:", "Story N:" and numbered-list formats"""
+        return max(self.counts["marker"], self.counts["title"], self.counts["numbered"])
+
+    @property
+    def citation_count(self) -> int:
+        return self.counts["citation"]
+
+    @property
+    def has_opening(self) -> bool:
+        return bool(self.counts["hello"] and self.counts["show"])
+
+    @property
+    def has_closing(self) -> bool:
+        return bool(self.counts["newsbot"] and self.counts["signoff"])
+
+    def date_mentions(self, *dates: str) -> int:
+        return sum(self.dates[d] for d in dates)
+
+
+def scan(text: str) -> ScriptScan:
+    """One pass over *text* collecting every validation signal"""
+    result = ScriptScan()
+    for match in _SCANNER.finditer(text):
+        kind = match.lastgroup
+        if kind == "leak":
+            result.leakage[match.group()] += 1
+        elif kind == "date":
+            result.dates[match.group()] += 1
+        else:
+            result.counts[kind] += 1
+    return result
+
+
+def validate_output(content: str, expected_stories: int = 10) -> Dict:
+    """Validate agent output quality"""
+    found = scan(content)
+    issues = []
+    if found.has_leakage:
+        issues.append("Search process leakage detected")
+    if found.story_markers != expected_stories:
+        issues.append(f"Expected {expected_stories} stories, found {found.story_markers}")
+    if found.citation_count < MIN_CITATIONS:
+        issues.append(f"Insufficient citations: {found.citation_count}")
+
+    return {
+        "valid": len(issues) == 0,
+        "issues": issues,
+        "story_count": found.story_markers,
+        "citation_count": found.citation_count,
+        "has_leakage": found.has_leakage
+    }
+
+
+_MARKED_HEADLINE = re.compile(r"^(#{1,4}\s|\*\*|\[?STORY \d+|\[?Story \d+)")
+_SENTENCE_END = ('.', '!', '?', '…', '"', '”', "'", ':', ';', ')')
+_OUTRO_START = re.compile(r"^\W*(Across today's stories|Until tomorrow)", re.IGNORECASE)
+# A line ending like this is a spoken phrase running on, not a headline
+_CONTINUES = (',', '-', '–', '—')
+
+
+@dataclass
+class Section:
+    kind: str  # "intro", "story" or "outro"
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    @property
+    def headline(self) -> Optional[str]:
+        return self.lines[0] if self.kind == "story" and self.lines else None
+
+
+def _is_paragraph(line: str) -> bool:
+    line = line.strip()
+    return line.endswith(_SENTENCE_END) and not _OUTRO_START.match(line)
+
+
+def is_headline(line: str, following: Optional[str] = None) -> bool:
+    """Whether *line* opens a story section.
+
+    Marked lines (##, **, [Story N], STORY N:) always do. A bare headline is
+    recognised by where the script format puts it: a short line without
+    closing punctuation, directly followed by the story's first paragraph.
+    Scripts arrive one paragraph per line (clean_agent_output drops blank
+    lines), so *following* is the next non-empty line. Spoken one-liners
+    before another short line, sign-offs and run-on phrases do not qualify.
+    """
+    line = line.strip()
+    if _MARKED_HEADLINE.match(line):
+        return True
+    if not 0 < len(line) <= 150 or line.endswith(_SENTENCE_END + _CONTINUES):
+        return False
+    return following is not None and _is_paragraph(following)
+
+
+def split_script(script: str) -> List[Section]:
+    """Intro, one section per story (headline + paragraphs) and outro.
+
+    Intro and outro are always present, empty when the script lacks them.
+    """
+    intro, outro = Section("intro"), Section("outro")
+    stories: List[Section] = []
+    lines = [line.strip() for line in script.splitlines() if line.strip()]
+    for index, line in enumerate(lines):
+        if outro.lines or _OUTRO_START.match(line):
+            outro.lines.append(line)
+        elif is_headline(line, lines[index + 1] if index + 1 < len(lines) else None):
+            stories.append(Section("story", [line]))
+        elif stories:
+            stories[-1].lines.append(line)
+        else:
+            intro.lines.append(line)
+    return [intro] + stories + [outro]
+
+
+def join_sections(sections: List[Section]) -> str:
+    return "\n".join(section.text for section in sections if section.lines)
+
+
+def validate_script(content: str, expected_stories: int = 10) -> Dict:
+    """validate_output() for script-shaped output (the script and editorial stages).
+
+    Scripts carry bare headlines, not "STORY N:" markers, so stories are
+    counted as split_script() sections: a headline with at least one paragraph.
+    """
+    found = scan(content)
+    story_count = sum(1 for s in split_script(content) if s.kind == "story" and len(s.lines) > 1)
+    issues = []
+    if found.has_leakage:
+        issues.append("Search process leakage detected")
+    if story_count != expected_stories:
+        issues.append(f"Expected {expected_stories} stories, found {story_count}")
+    if found.citation_count < MIN_CITATIONS:
+        issues.append(f"Insufficient citations: {found.citation_count}")
+
+    return {
+        "valid": len(issues) == 0,
+        "issues": issues,
+        "story_count": story_count,
+        "citation_count": found.citation_count,
+        "has_leakage": found.has_leakage
+    }
+
+
+def review_script(script: str, target_date: Union[date, str], expected_stories: int = 10) -> Dict:
+    """Editorial review of a final script: issues, metrics and a 0-100 score"""
+    if isinstance(target_date, str):
+        target_date = date.fromisoformat(target_date)
+    found = scan(script)
+    date_mentions = found.date_mentions(str(target_date), str(target_date - timedelta(days=1)))
+
+    issues = []
+    if found.has_leakage:
+        issues.append("❌ AI search process visible in final script")
+    if not found.has_opening:
+        issues.append("❌ Missing proper opening format")
+    if not found.has_closing:
+        issues.append("❌ Missing proper closing format")
+    if found.story_count < expected_stories:
+        issues.append(f"❌ Only {found.story_count} stories found (need {expected_stories})")
+    elif found.story_count > expected_stories:
+        issues.append(f"❌ Too many stories: {found.story_count} (need exactly {expected_stories})")
+    if found.citation_count < MIN_CITATIONS:
+        issues.append(f"❌ Insufficient citations: {found.citation_count} (need {MIN_CITATIONS}+ for credibility)")
+    if date_mentions == 0:
+        issues.append("❌ No date mentions (may be using old news)")
+
+    score = 100
+    score -= len([i for i in issues if i.startswith('❌')]) * 20
+    score -= len([i for i in issues if i.startswith('⚠️')]) * 10
+
+    return {
+        "issues": issues,
+        "score": max(0, score),
+        "leakage": dict(found.leakage),
+        "has_opening": found.has_opening,
+        "has_closing": found.has_closing,
+        "story_count": found.story_count,
+        "citation_count": found.citation_count,
+        "date_mentions": date_mentions,
+    }
+
+
+def _review_pair(pair: Tuple[Union[date, str], str]) -> Tuple[Union[date, str], Dict]:
+    target_date, script = pair
+    return target_date, review_script(script or "", target_date)
+
+
+def review_archive(pairs: Iterable[Tuple[Union[date, str], str]],
+                   workers: int = 1, chunksize: int = 64) -> Iterator[Tuple[Union[date, str], Dict]]:
+    """review_script() over (date, script) pairs, in order.
+
+    With workers > 1 the scripts are scored in a process pool; scanning is
+    CPU-bound, so threads would not help.
+    """
+    if workers <= 1:
+        yield from map(_review_pair, pairs)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_review_pair, pairs, chunksize=chunksize)
@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from agents_client import run_anthropic_chat
+from agents_pipeline_v3 import cached_prompt, clean_agent_output
+from agents_stories import Story, parse_stories
+from agents_tiering import submit_in_context
+
+# Per-story script writing for the V3 pipeline
+# Features:
+# - Each story's two paragraphs are written concurrently from its Story record
+# - The closing analysis is a separate call running alongside the stories
+# - The fixed intro and sign-off are stitched around them locally, so wall
+#   time is about one story call instead of ten in a row
+# - Each call sees only its own story record, so the writer reads the
+#   uncompacted prioritizer output: the script-stage input budget is sized
+#   for all ten stories in one prompt, and compacting would only strip the
+#   IMPACT lines the second paragraphs and the closing are written from
+
+STORY_MAX_TOKENS = 1024
+CLOSING_MAX_TOKENS = 512
+
+INTRO = ("Hello world… welcome back to Apes On Knowledge, your daily dose of distilled AI news from across the planet. "
+         "I'm your host, A-OK Newsbot… Let's get into today's most important headlines in artificial intelligence.")
+SIGNOFF = "Until tomorrow, this is A-OK Newsbot… signing off."
+
+
+STORY_INSTRUCTIONS = """
+Write one story of today's Apes On Knowledge podcast script, for radio delivery, from the story record given at the end.
+
+MANDATORY FORMAT:
+
+[The story headline, exactly as given]
+
+[First paragraph: What happened with source citation like "TechCrunch reports in 'Article Title' that..."]
+
+[Second paragraph: Why it matters to AI practitioners]
+
+Return ONLY the headline line and the two paragraphs. No greeting, no sign-off, no transitions to other stories, no commentary.
+"""
+
+
+def story_messages(story: Story, number: int, total: int) -> List[Dict]:
+    # Every story call shares the instructions, so all but the first read them from the prompt cache
+    return cached_prompt(STORY_INSTRUCTIONS, f"Story {number} of {total}\n\nStory record:\n{story.to_block()}")
+
+
+def write_story(story: Story, number: int, total: int) -> str:
+    result = run_anthropic_chat(story_messages(story, number, total), max_tokens=STORY_MAX_TOKENS,
+                                stage="script", tools=None)
+    return clean_agent_output(result)
+
+
+CLOSING_INSTRUCTIONS = """
+Write the closing analysis paragraph of today's Apes On Knowledge podcast script.
+
+It must start with "Across today's stories, we see" and identify 2-3 key themes connecting the stories given at the end, in 3-4 sentences for radio delivery.
+
+Return ONLY the paragraph. No sign-off, no commentary.
+"""
+
+
+def closing_messages(stories: List[Story]) -> List[Dict]:
+    digest = "\n".join(f"- {story.headline}: {story.impact or story.summary}" for story in stories)
+    return cached_prompt(CLOSING_INSTRUCTIONS, f"Today's stories:\n{digest}")
+
+
+def write_closing(stories: List[Story]) -> str:
+    result = run_anthropic_chat(closing_messages(stories), max_tokens=CLOSING_MAX_TOKENS,
+                                stage="script", tools=None)
+    return clean_agent_output(result)
+
+
+def write_script_parallel(prioritized_summary: str, max_workers: int = 11) -> str:
+    """write_script() with one call per story plus one for the closing analysis, all concurrent.
+
+    Takes the prioritizer's STORY blocks. Raises if any story fails, since a
+    script with a missing story would fail validation anyway.
+    """
+    stories = parse_stories(prioritized_summary)
+    if not stories:
+        raise ValueError("No stories to write: the prioritized summary has no STORY blocks")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        closing = submit_in_context(pool, write_closing, stories)
+        parts = [submit_in_context(pool, write_story, story, number, len(stories))
+                 for number, story in enumerate(stories, 1)]
+        # Submission order is story order, so results stitch back in order
+        body = [part.result() for part in parts]
+        return "\n".join([INTRO, *body, closing.result(), SIGNOFF])
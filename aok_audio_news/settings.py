@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Full-text search over the episode archive
     'rest_framework',  # Django REST Framework
     'digests',  # Add the digests app
     'feed_generator', # Add the feed_generator app
@@ -0,0 +1,63 @@
+from typing import Dict, Iterable, Optional
+
+from django.utils import timezone
+
+from .models import PipelineRun, StageResult
+
+__all__ = ["PipelineCheckpoint"]
+
+
+class PipelineCheckpoint:
+    """Database-backed checkpoint store passed to ``generate_episode_v3(checkpoint=...)``.
+
+    Every stage's output is saved with the hash of its inputs. A rerun for the
+    same date reuses stored stages whose input hash still matches and that
+    have not been invalidated, so work resumes at the first stage that is
+    missing, invalidated, failed validation or is fed by changed upstream
+    output.
+    """
+
+    def __init__(self, date, pipeline_version: str = "v3", stages: Iterable[str] = (),
+                 rerun_from: Optional[str] = None):
+        self.stages = list(stages)
+        self.run, _ = PipelineRun.objects.get_or_create(date=date, pipeline_version=pipeline_version)
+        self.run.status = PipelineRun.STATUS_RUNNING
+        self.run.error = None
+        self.run.save(update_fields=["status", "error", "updated_at"])
+        self.reused = []
+        if rerun_from:
+            self.invalidate(rerun_from)
+
+    def invalidate(self, from_stage: str) -> int:
+        """Mark *from_stage* and every later stage as needing a rerun."""
+        if from_stage not in self.stages:
+            raise ValueError(f"Unknown stage '{from_stage}', expected one of {self.stages}")
+        later = self.stages[self.stages.index(from_stage):]
+        return self.run.stages.filter(stage__in=later).update(invalidated=True)
+
+    def load(self, stage: str, input_hash: str) -> Optional[Dict]:
+        result = self.run.stages.filter(stage=stage, input_hash=input_hash, invalidated=False).first()
+        # A stage whose output failed validation is rerun rather than reused
+        if result is None or (result.validation or {}).get("valid") is False:
+            return None
+        self.reused.append(stage)
+        return {"output": result.output, "validation": result.validation}
+
+    def save(self, stage: str, input_hash: str, output: str, validation: Dict, duration_seconds: float) -> None:
+        StageResult.objects.update_or_create(
+            run=self.run,
+            stage=stage,
+            defaults={
+                "input_hash": input_hash,
+                "output": output,
+                "validation": validation,
+                "duration_seconds": duration_seconds,
+                "invalidated": False,
+                "created_at": timezone.now(),
+            },
+        )
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.run.status = PipelineRun.STATUS_FAILED if error else PipelineRun.STATUS_COMPLETED
+        self.run.error = f"{type(error).__name__}: {error}" if error else None
+        self.run.save(update_fields=["status", "error", "updated_at"])
@@ -0,0 +1,161 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date as dt_date, timedelta
+import os
+import sys
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from digests.models import DailyDigest
+
+
+class Command(BaseCommand):
+    help = 'Generate v3 episode scripts for a date range, several dates at a time under a shared rate limit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=str, required=True, help='First date to generate (YYYY-MM-DD)')
+        parser.add_argument('--end', type=str, required=True, help='Last date to generate, inclusive (YYYY-MM-DD)')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=3,
+            help='Dates generated at the same time'
+        )
+        parser.add_argument(
+            '--rpm',
+            type=int,
+            default=int(os.getenv('AOK_RATE_RPM', '50')),
+            help='Anthropic requests per minute shared by all dates (0 disables)'
+        )
+        parser.add_argument(
+            '--tpm',
+            type=int,
+            default=int(os.getenv('AOK_RATE_TPM', '80000')),
+            help='Anthropic tokens per minute shared by all dates (0 disables)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate dates that already have a script'
+        )
+        parser.add_argument(
+            '--no-editor',
+            action='store_true',
+            help='Skip the editorial review step'
+        )
+        parser.add_argument(
+            '--sharded',
+            action='store_true',
+            help='Fan research out across company/outlet/topic shards'
+        )
+        parser.add_argument(
+            '--prioritizer',
+            choices=['llm', 'local', 'auto'],
+            default='llm',
+            help='Story selection: LLM call, local ranker, or local with LLM fallback on low confidence'
+        )
+
+    def handle(self, *args, **options):
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+        from agents_pipeline_v3 import STAGES, generate_episode_v3
+        from agents_ratelimit import rate_limiter
+        from agents_transport import offline
+        from digests.checkpoints import PipelineCheckpoint
+
+        try:
+            start = dt_date.fromisoformat(options['start'])
+            end = dt_date.fromisoformat(options['end'])
+        except ValueError as exc:
+            raise CommandError(f'Invalid date: {exc}')
+        if start > end:
+            raise CommandError('--start must be on or before --end')
+        if not os.getenv('ANTHROPIC_API_KEY') and not offline():
+            raise CommandError('ANTHROPIC_API_KEY not found')
+
+        dates = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        if not options['force']:
+            done = set(
+                DailyDigest.objects.filter(date__in=dates)
+                .exclude(summary_text_en='')
+                .exclude(summary_text_en__startswith='[LLM call failed')
+                .values_list('date', flat=True)
+            )
+            skipped = [d for d in dates if d in done]
+            dates = [d for d in dates if d not in done]
+            if skipped:
+                self.stdout.write(f"⏭️  Skipping {len(skipped)} dates that already have scripts (use --force to regenerate)")
+
+        if not dates:
+            self.stdout.write(self.style.SUCCESS('✅ Nothing to backfill'))
+            return
+
+        rate_limiter.configure(rpm=options['rpm'], tpm=options['tpm'])
+        self.stdout.write(self.style.SUCCESS(f"🤖 Backfilling {len(dates)} episodes from {dates[0]} to {dates[-1]}"))
+        self.stdout.write(f"   🔀 Concurrency: {options['concurrency']} dates")
+        self.stdout.write(f"   🚦 Rate limit: {options['rpm'] or 'unlimited'} RPM, {options['tpm'] or 'unlimited'} TPM")
+
+        output_lock = threading.Lock()
+
+        def log(message, style=None):
+            with output_lock:
+                self.stdout.write(style(message) if style else message)
+
+        def generate(target_date):
+            started = time.monotonic()
+            log(f"   ▶️  {target_date} started")
+            checkpoint = PipelineCheckpoint(target_date, pipeline_version='v3', stages=STAGES)
+            try:
+                result = generate_episode_v3(
+                    date_str=str(target_date),
+                    with_editor=not options['no_editor'],
+                    debug=False,
+                    sharded_research=options['sharded'],
+                    checkpoint=checkpoint,
+                    prioritizer=options['prioritizer'],
+                )
+                DailyDigest.objects.update_or_create(
+                    date=target_date,
+                    defaults={
+                        'summary_text_en': result.get('script', ''),
+                        'llm_prompt': f"Generated APE INTELLIGENCE DAILY script for {target_date} using multi-agent pipeline with web search capabilities.",
+                        'llm_response_raw': {
+                            "research": result.get('research', ''),
+                            "summary": result.get('summary', ''),
+                            "script": result.get('script', ''),
+                            "validations": result.get('validations'),
+                            "generated_via": "agents_pipeline_v3_backfill",
+                        },
+                    },
+                )
+                return result, checkpoint.reused, time.monotonic() - started
+            finally:
+                # Worker threads each hold their own database connection
+                connection.close()
+
+        failures = {}
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            futures = {pool.submit(generate, target_date): target_date for target_date in dates}
+            for finished, future in enumerate(as_completed(futures), 1):
+                target_date = futures[future]
+                prefix = f"[{finished}/{len(dates)}] {target_date}"
+                try:
+                    result, reused, seconds = future.result()
+                except Exception as exc:
+                    failures[target_date] = exc
+                    log(f"   ❌ {prefix} failed: {exc}", self.style.ERROR)
+                    continue
+                final = (result.get('validations') or {}).get('final') or {}
+                status = 'valid' if final.get('valid') else f"{len(final.get('issues', []))} validation issues"
+                reused_note = f", reused {', '.join(reused)}" if reused else ''
+                log(f"   ✅ {prefix} done in {seconds:.0f}s ({status}{reused_note})", self.style.SUCCESS)
+
+        self.stdout.write(f"\n🚦 Time spent waiting on the rate limiter: {rate_limiter.waited_seconds:.0f}s")
+        if failures:
+            self.stdout.write(self.style.ERROR(
+                f"❌ {len(failures)} of {len(dates)} dates failed: {', '.join(str(d) for d in sorted(failures))}"
+            ))
+            self.stdout.write('   Rerun the same command to retry them; finished stages resume from checkpoints.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f"🎉 Backfilled {len(dates)} episodes"))
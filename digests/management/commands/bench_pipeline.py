@@ -0,0 +1,227 @@
+from collections import defaultdict
+from datetime import datetime
+import json
+import math
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+PIPELINES = {
+    # name: (module, entry point, keyword arguments)
+    'v1': ('agents_pipeline', 'generate_episode', {}),
+    'v2': ('agents_pipeline_v2', 'generate_episode_v2', {'debug': False}),
+    'v3': ('agents_pipeline_v3', 'generate_episode_v3', {'debug': False}),
+}
+
+# Regressions smaller than this many seconds are treated as noise
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def distribution(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(q):
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+    return {
+        'n': len(ordered),
+        'min': round(ordered[0], 4),
+        'p50': round(rank(0.5), 4),
+        'p95': round(rank(0.95), 4),
+        'max': round(ordered[-1], 4),
+        'mean': round(statistics.fmean(ordered), 4),
+    }
+
+
+def find_regressions(results, baseline, threshold):
+    """(pipeline, metric, baseline, current) for every p50 that grew by more than *threshold*"""
+    regressions = []
+    for name, current in results['pipelines'].items():
+        previous = baseline.get('pipelines', {}).get(name)
+        if not previous:
+            continue
+        pairs = [('total', previous.get('total'), current.get('total'))]
+        pairs += [(f"stage:{stage}", previous['stages'].get(stage), stats)
+                  for stage, stats in current['stages'].items()]
+        for metric, before, after in pairs:
+            if not before or not after:
+                continue
+            if after['p50'] > before['p50'] * (1 + threshold) and after['p50'] - before['p50'] > MIN_REGRESSION_SECONDS:
+                regressions.append((name, metric, before['p50'], after['p50']))
+        before_mem = previous.get('peak_memory_bytes', {}).get('p50')
+        after_mem = current.get('peak_memory_bytes', {}).get('p50')
+        if before_mem and after_mem and after_mem > before_mem * (1 + threshold):
+            regressions.append((name, 'peak_memory_bytes', before_mem, after_mem))
+    return regressions
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the agents pipelines against replayed Anthropic fixtures and check for regressions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pipelines',
+            type=str,
+            default='v3',
+            help='Comma-separated pipelines to run (v1, v2, v3)'
+        )
+        parser.add_argument('--runs', type=int, default=5, help='Runs per pipeline')
+        parser.add_argument('--date', type=str, required=True, help='Episode date the fixtures were recorded for')
+        parser.add_argument(
+            '--fixtures',
+            type=str,
+            default=None,
+            help='Fixture directory (defaults to AOK_FIXTURE_DIR)'
+        )
+        parser.add_argument(
+            '--latency',
+            type=str,
+            default=None,
+            help='Injected latency per replayed call: seconds or "recorded" (defaults to AOK_REPLAY_LATENCY)'
+        )
+        parser.add_argument('--output', type=str, default=None, help='Write JSON results to this path')
+        parser.add_argument('--baseline', type=str, default=None, help='Baseline JSON to compare against')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='Allowed relative p50 slowdown before a stage counts as regressed (0.2 = 20%%)'
+        )
+        parser.add_argument(
+            '--write-baseline',
+            action='store_true',
+            help='Save these results as the new baseline instead of comparing'
+        )
+
+    def handle(self, *args, **options):
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+        import importlib
+        import agents_transport
+        from agents_metrics import capture_metrics, summarize
+        from agents_validation import validate_output, validate_script
+
+        names = [name.strip() for name in options['pipelines'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in PIPELINES]
+        if unknown:
+            raise CommandError(f"Unknown pipelines: {', '.join(unknown)} (choose from {', '.join(PIPELINES)})")
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1')
+        fixture_dir = options['fixtures'] or agents_transport.FIXTURE_DIR
+        if not os.path.isdir(fixture_dir):
+            raise CommandError(f"No fixtures in {fixture_dir}; record some with AOK_LLM_MODE=record")
+        if options['write_baseline'] and not options['baseline']:
+            raise CommandError('--write-baseline needs --baseline')
+
+        results = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'date': options['date'],
+            'runs': options['runs'],
+            'latency': options['latency'] or agents_transport.REPLAY_LATENCY,
+            'pipelines': {},
+        }
+
+        for name in names:
+            module_name, entry_point, kwargs = PIPELINES[name]
+            module = importlib.import_module(module_name)
+            self.stdout.write(self.style.SUCCESS(f"\n⏱️  Benchmarking {name} ({options['runs']} runs)"))
+
+            stage_seconds = defaultdict(list)
+            totals, peaks = [], []
+            tokens = defaultdict(lambda: defaultdict(list))
+            passes = defaultdict(list)
+
+            for run in range(1, options['runs'] + 1):
+                # Offline and uncached so every run replays every call; replayed
+                # usage must not feed the max_tokens history of real runs
+                client = agents_transport.ReplayClient(fixture_dir, latency=options['latency'])
+                with agents_transport.use_transport(client, cache=False, history=False), \
+                        capture_metrics() as records:
+                    tracemalloc.start()
+                    started = time.perf_counter()
+                    try:
+                        result = getattr(module, entry_point)(date_str=options['date'], **kwargs)
+                    except agents_transport.FixtureNotFoundError as exc:
+                        raise CommandError(f"{name}: {exc}")
+                    finally:
+                        elapsed = time.perf_counter() - started
+                        _, peak = tracemalloc.get_traced_memory()
+                        tracemalloc.stop()
+
+                totals.append(elapsed)
+                peaks.append(peak)
+                # Every pipeline module calls the model through agents_client,
+                # which records each call with its stage
+                for stage, entry in summarize(records).items():
+                    if not entry['calls']:
+                        continue
+                    stage_seconds[stage].append(entry['call_seconds_sum'])
+                    for kind in ('input', 'output', 'cache_read', 'cache_write'):
+                        tokens[stage][kind].append(entry[f'{kind}_tokens'])
+                validations = result.get('validations') or {
+                    'summary': validate_output(result.get('summary', ''), expected_stories=10),
+                    'final': validate_script(result.get('script', ''), expected_stories=10),
+                }
+                for stage, validation in validations.items():
+                    passes[stage].append(bool(validation and validation.get('valid')))
+                self.stdout.write(f"   run {run}: {elapsed:.2f}s, peak {peak / 1024:.0f} KiB")
+
+            results['pipelines'][name] = {
+                'total': distribution(totals),
+                'stages': {stage: distribution(values) for stage, values in stage_seconds.items()},
+                'peak_memory_bytes': distribution(peaks),
+                'tokens_per_run': {
+                    stage: {kind: statistics.fmean(values) for kind, values in used.items()}
+                    for stage, used in tokens.items()
+                },
+                'validation_pass_rate': {
+                    stage: round(sum(flags) / len(flags), 3) for stage, flags in passes.items()
+                },
+            }
+            self._write_summary(results['pipelines'][name])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"\n💾 Results written to {options['output']}")
+
+        if not options['baseline']:
+            return
+        if options['write_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"📌 Baseline saved to {options['baseline']}"))
+            return
+
+        try:
+            with open(options['baseline'], 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not read baseline {options['baseline']}: {exc}")
+
+        regressions = find_regressions(results, baseline, options['threshold'])
+        if regressions:
+            for name, metric, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f"   ❌ {name} {metric}: p50 {before} -> {after}"))
+            raise CommandError(f"{len(regressions)} regressions beyond {options['threshold']:.0%} of baseline")
+        self.stdout.write(self.style.SUCCESS(f"\n✅ No regressions beyond {options['threshold']:.0%} of baseline"))
+
+    def _write_summary(self, summary):
+        self.stdout.write(f"   {'stage':<12}{'p50':>9}{'p95':>9}{'max':>9}{'in tok':>9}{'out tok':>9}{'cache rd':>9}{'cache wr':>9}")
+        for stage, stats in sorted(summary['stages'].items()):
+            used = summary['tokens_per_run'].get(stage, {})
+            self.stdout.write(
+                f"   {stage:<12}{stats['p50']:>8.2f}s{stats['p95']:>8.2f}s{stats['max']:>8.2f}s"
+                f"{used.get('input', 0):>9.0f}{used.get('output', 0):>9.0f}"
+                f"{used.get('cache_read', 0):>9.0f}{used.get('cache_write', 0):>9.0f}"
+            )
+        total = summary['total']
+        self.stdout.write(f"   {'total':<12}{total['p50']:>8.2f}s{total['p95']:>8.2f}s{total['max']:>8.2f}s")
+        self.stdout.write(f"   peak memory p50: {summary['peak_memory_bytes']['p50'] / 1024:.0f} KiB")
+        rates = ', '.join(f"{stage} {rate:.0%}" for stage, rate in summary['validation_pass_rate'].items())
+        self.stdout.write(f"   validation pass rate: {rates}")
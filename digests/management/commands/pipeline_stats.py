@@ -0,0 +1,86 @@
+from collections import defaultdict
+from datetime import datetime
+import json
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Show per-stage p50/p95 latency, token and prompt-cache usage and web searches from the pipeline metrics log'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=float,
+            default=30,
+            help='How many days of metrics to include'
+        )
+        parser.add_argument(
+            '--by-day',
+            action='store_true',
+            help='Break the stage table down per calendar day'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the summary as JSON instead of tables'
+        )
+
+    def handle(self, *args, **options):
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+        from agents_metrics import metrics_store, summarize
+
+        records = metrics_store.read(since=time.time() - options['days'] * 86400)
+        if not records:
+            self.stdout.write(self.style.WARNING(f"No metrics recorded in {metrics_store.path} over the last {options['days']:g} days"))
+            return
+
+        if options['by_day']:
+            groups = defaultdict(list)
+            for record in records:
+                groups[datetime.fromtimestamp(record['ts']).date().isoformat()].append(record)
+            summaries = {day: summarize(groups[day]) for day in sorted(groups)}
+        else:
+            summaries = {f"last {options['days']:g} days": summarize(records)}
+
+        if options['json']:
+            self.stdout.write(json.dumps(summaries, indent=2))
+            return
+
+        for period, summary in summaries.items():
+            self.stdout.write(self.style.SUCCESS(f"\n📊 {period}"))
+            self._write_table(summary)
+            self._write_tiers(summary)
+
+    def _write_table(self, summary):
+        def seconds(value):
+            return f"{value:.1f}s" if value is not None else '-'
+
+        total = sum(entry['total_seconds'] for entry in summary.values()) or 1
+        header = f"{'stage':<12}{'runs':>6}{'reused':>8}{'p50':>9}{'p95':>9}{'share':>8}{'calls':>7}{'cached':>8}{'in tok':>10}{'out tok':>10}{'cache rd':>10}{'cache wr':>10}{'search':>8}  stop reasons"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for stage, entry in sorted(summary.items(), key=lambda item: item[1]['total_seconds'], reverse=True):
+            stops = ', '.join(f"{reason}={count}" for reason, count in sorted(entry['stop_reasons'].items())) or '-'
+            self.stdout.write(
+                f"{stage:<12}{entry['runs']:>6}{entry['reused']:>8}"
+                f"{seconds(entry['p50_seconds']):>9}{seconds(entry['p95_seconds']):>9}"
+                f"{entry['total_seconds'] / total:>8.0%}{entry['calls']:>7}{entry['cached_calls']:>8}"
+                f"{entry['input_tokens']:>10}{entry['output_tokens']:>10}"
+                f"{entry.get('cache_read_tokens', 0):>10}{entry.get('cache_write_tokens', 0):>10}{entry['web_searches']:>8}  {stops}"
+            )
+
+    def _write_tiers(self, summary):
+        rows = [(stage, tier, entry) for stage, stage_entry in sorted(summary.items())
+                for tier, entry in stage_entry.get('tiers', {}).items()]
+        if not rows:
+            return
+        self.stdout.write(f"\n{'stage':<12}{'tier':<8}{'attempts':>9}{'pass':>7}{'p50':>9}{'p95':>9}")
+        for stage, tier, entry in rows:
+            self.stdout.write(
+                f"{stage:<12}{tier:<8}{entry['attempts']:>9}{entry['pass_rate']:>7.0%}"
+                f"{entry['p50_seconds']:>8.1f}s{entry['p95_seconds']:>8.1f}s"
+            )
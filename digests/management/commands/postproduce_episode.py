@@ -0,0 +1,68 @@
+from datetime import date as dt_date
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from digests.models import DailyDigest
+
+
+class Command(BaseCommand):
+    help = 'Translate, write metadata for and voice a finished English script, then save every field at once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=str, required=True, help='Episode date (YYYY-MM-DD)')
+        parser.add_argument(
+            '--no-audio',
+            action='store_true',
+            help='Skip English and Mandarin TTS and the uploads'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Reuse checkpointed metadata and translation from an earlier run'
+        )
+
+    def handle(self, *args, **options):
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+        from agents_transport import offline
+        from digests.checkpoints import PipelineCheckpoint
+        from digests.postproduction import run_post_production
+
+        try:
+            target_date = dt_date.fromisoformat(options['date'])
+        except ValueError as exc:
+            raise CommandError(f'Invalid date: {exc}')
+        if not os.getenv('ANTHROPIC_API_KEY') and not offline():
+            raise CommandError('ANTHROPIC_API_KEY not found')
+        if not options['no_audio'] and not os.getenv('ELEVEN_API_KEY'):
+            raise CommandError('ELEVEN_API_KEY not found (use --no-audio to skip TTS)')
+
+        checkpoint = None
+        if options['resume']:
+            checkpoint = PipelineCheckpoint(target_date, pipeline_version='post', stages=['metadata', 'translate'])
+
+        self.stdout.write(self.style.SUCCESS(f"🎬 Post-producing {target_date}"))
+        started = time.monotonic()
+        try:
+            digest = run_post_production(target_date, with_audio=not options['no_audio'],
+                                         checkpoint=checkpoint, debug=True)
+        except DailyDigest.DoesNotExist:
+            raise CommandError(f'No DailyDigest for {target_date}; generate the script first')
+        except Exception as exc:
+            if checkpoint is not None:
+                checkpoint.finish(error=exc)
+            raise CommandError(f'Post-production failed, nothing was saved: {exc}')
+        if checkpoint is not None:
+            checkpoint.finish()
+
+        report = digest.llm_response_raw['post_production']
+        self.stdout.write(f"   Title: {digest.title_en} / {digest.title_zh}")
+        for stage, seconds in report['stage_seconds'].items():
+            self.stdout.write(f"   {stage:<10}{seconds:>7.1f}s")
+        self.stdout.write(f"   Critical path: {' -> '.join(report['critical_path'])}")
+        if digest.audio_url_en:
+            self.stdout.write(f"   🔊 {digest.audio_url_en} ({digest.audio_size_en} bytes)")
+            self.stdout.write(f"   🔊 {digest.audio_url_zh} ({digest.audio_size_zh} bytes)")
+        self.stdout.write(self.style.SUCCESS(f"✅ Saved in {time.monotonic() - started:.1f}s"))
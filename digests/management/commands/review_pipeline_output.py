@@ -1,8 +1,11 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 from digests.models import DailyDigest
-from datetime import date, datetime, timedelta
-import re
+from datetime import date, datetime
+import json
+import os
+import sys
+import time
 
 class Command(BaseCommand):
     help = 'Comprehensive review of pipeline output quality and format'
@@ -19,8 +22,32 @@ class Command(BaseCommand):
             action='store_true',
             help='Show full script content'
         )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-score every stored script instead of reviewing one date'
+        )
+        parser.add_argument('--start', type=str, help='With --all: first date to include (YYYY-MM-DD)')
+        parser.add_argument('--end', type=str, help='With --all: last date to include (YYYY-MM-DD)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='With --all: processes scoring scripts in parallel'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='With --all: print one JSON object per date instead of a table'
+        )
 
     def handle(self, *args, **options):
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+        from agents_validation import review_script
+
+        if options['all']:
+            return self._review_archive(options)
+
         self.stdout.write(self.style.SUCCESS('🔍 Pipeline Output Review'))
         self.stdout.write('=' * 60)
         
@@ -35,85 +62,17 @@ class Command(BaseCommand):
             
             # === CRITICAL ISSUES ANALYSIS ===
             self.stdout.write(self.style.WARNING('\n🚨 CRITICAL ISSUES:'))
-            
-            issues = []
-            
-            # Check for AI search process leakage
-            search_indicators = [
-                "Let me search",
-                "I'll search for",
-                "Based on the search results",
-                "Let me verify",
-                "I need to search"
-            ]
-            
-            search_leakage = any(indicator in script for indicator in search_indicators)
-            if search_leakage:
-                issues.append("❌ AI search process visible in final script")
-                for indicator in search_indicators:
-                    if indicator in script:
-                        count = script.count(indicator)
-                        self.stdout.write(f"   - '{indicator}': {count} occurrences")
-            
-            # Check format requirements
-            has_proper_opening = "Hello world" in script and "Apes On Knowledge" in script
-            has_proper_closing = "A-OK Newsbot" in script and "signing off" in script
-            
-            if not has_proper_opening:
-                issues.append("❌ Missing proper opening format")
-            if not has_proper_closing:
-                issues.append("❌ Missing proper closing format")
-            
-            # Story count analysis
-            story_patterns = [
-                r'STORY \d+:',
-                r'Story \d+:',
-                r'\d+\.',  # numbered list
-            ]
-            
-            story_count = 0
-            for pattern in story_patterns:
-                matches = re.findall(pattern, script)
-                story_count = max(story_count, len(matches))
-            
-            if story_count < 10:
-                issues.append(f"❌ Only {story_count} stories found (need 10)")
-            elif story_count > 10:
-                issues.append(f"❌ Too many stories: {story_count} (need exactly 10)")
-            
-            # Citation analysis
-            citation_patterns = [
-                r'reports in [\'"].*[\'"]',
-                r'according to [A-Z][a-zA-Z\s]+',
-                r'[A-Z][a-zA-Z\s]+ reports',
-                r'announced in',
-                r'published in'
-            ]
-            
-            citation_count = 0
-            for pattern in citation_patterns:
-                citation_count += len(re.findall(pattern, script, re.IGNORECASE))
-            
-            if citation_count < 5:
-                issues.append(f"❌ Insufficient citations: {citation_count} (need 5+ for credibility)")
-            
-            # Date freshness check
-            yesterday = target_date - timedelta(days=1)
-            date_mentions = script.count(str(target_date)) + script.count(str(yesterday))
-            
-            if date_mentions == 0:
-                issues.append("❌ No date mentions (may be using old news)")
-            
-            # Hallucination indicators (removed o3/o4-mini as these models exist)
-            hallucination_flags = [
-                # Note: Removed o3/o4-mini as these are real OpenAI models
-                # "$65 billion",     # Large investment numbers should be verified but not flagged as hallucination
-                # "1 gigawatt",      # Technical claims should be verified but not automatically flagged
-            ]
-            
-            for flag in hallucination_flags:
-                if flag in script:
-                    issues.append(f"⚠️  Potential hallucination: '{flag}' needs verification")
+
+            review = review_script(script, target_date)
+            issues = review['issues']
+            search_leakage = bool(review['leakage'])
+            for indicator, count in review['leakage'].items():
+                self.stdout.write(f"   - '{indicator}': {count} occurrences")
+            has_proper_opening = review['has_opening']
+            has_proper_closing = review['has_closing']
+            story_count = review['story_count']
+            citation_count = review['citation_count']
+            date_mentions = review['date_mentions']
             
             # === SUMMARY ===
             if issues:
@@ -163,10 +122,7 @@ class Command(BaseCommand):
                     self.stdout.write("   🔧 Enforce date constraints: Add 24-hour verification")
             
             # === SCORE ===
-            score = 100
-            score -= len([i for i in issues if i.startswith('❌')]) * 20
-            score -= len([i for i in issues if i.startswith('⚠️')]) * 10
-            score = max(0, score)
+            score = review['score']
             
             if score >= 80:
                 style = self.style.SUCCESS
@@ -181,4 +137,43 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'❌ No script found for {target_date}'))
             self.stdout.write('   Available dates:')
             for digest in DailyDigest.objects.order_by('-date')[:5]:
-                self.stdout.write(f'   - {digest.date}') 
\ No newline at end of file
+                self.stdout.write(f'   - {digest.date}') 
+
+    def _review_archive(self, options):
+        from agents_validation import review_archive
+
+        digests = DailyDigest.objects.exclude(summary_text_en='').order_by('date')
+        try:
+            if options['start']:
+                digests = digests.filter(date__gte=date.fromisoformat(options['start']))
+            if options['end']:
+                digests = digests.filter(date__lte=date.fromisoformat(options['end']))
+        except ValueError as exc:
+            raise CommandError(f'Invalid date: {exc}')
+
+        # Plain (date, script) tuples streamed from the database; no model instances
+        pairs = digests.values_list('date', 'summary_text_en').iterator(chunk_size=500)
+        started = time.monotonic()
+        scores, failing = [], 0
+        if not options['json']:
+            self.stdout.write(f"{'date':<12}{'score':>6}{'stories':>9}{'cites':>7}  issues")
+        for target_date, review in review_archive(pairs, workers=options['workers']):
+            scores.append(review['score'])
+            failing += bool(review['issues'])
+            if options['json']:
+                self.stdout.write(json.dumps(dict(review, date=str(target_date)), ensure_ascii=False))
+                continue
+            issues = '; '.join(issue.lstrip('❌⚠️ ') for issue in review['issues']) or '-'
+            self.stdout.write(
+                f"{str(target_date):<12}{review['score']:>6}{review['story_count']:>9}{review['citation_count']:>7}  {issues}"
+            )
+
+        if options['json']:
+            return
+        if not scores:
+            self.stdout.write(self.style.WARNING('No scripts to review'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"\n🎯 {len(scores)} scripts re-scored in {time.monotonic() - started:.2f}s: "
+            f"mean score {sum(scores) / len(scores):.1f}, {failing} with issues"
+        ))
@@ -27,13 +27,17 @@ class Command(BaseCommand):
         sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
         from agents_pipeline import generate_episode
         
-        # Check API key
+        from agents_transport import FIXTURE_DIR, offline
+        
+        # Check API key (replay mode serves recorded responses and needs none)
         api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
+        if offline():
+            self.stdout.write(f"📼 Replaying recorded Anthropic responses from {FIXTURE_DIR}")
+        elif not api_key:
             self.stdout.write(self.style.ERROR('❌ ANTHROPIC_API_KEY not found'))
             return
-        
-        self.stdout.write(f"✅ API key found: {api_key[:10]}...")
+        else:
+            self.stdout.write(f"✅ API key found: {api_key[:10]}...")
         
         test_date = options['date']
         use_editor = not options['no_editor']
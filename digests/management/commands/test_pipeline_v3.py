@@ -24,6 +24,89 @@ class Command(BaseCommand):
             action='store_true',
             help='Save the result to database'
         )
+        parser.add_argument(
+            '--sharded',
+            action='store_true',
+            help='Fan research out across company/outlet/topic shards'
+        )
+        parser.add_argument(
+            '--shard-workers',
+            type=int,
+            default=None,
+            help='Maximum concurrent research shards (with --sharded; default: AOK_SHARD_WORKERS or 4)'
+        )
+        parser.add_argument(
+            '--structured',
+            action='store_true',
+            help='Hand parsed story records between stages in compact form'
+        )
+        parser.add_argument(
+            '--prioritizer',
+            choices=['llm', 'local', 'auto'],
+            default='llm',
+            help='Story selection: LLM call, local ranker, or local with LLM fallback on low confidence '
+                 '(both local modes fall back when fewer than 10 stories are eligible)'
+        )
+        parser.add_argument(
+            '--dedup',
+            action='store_true',
+            help='Drop near-duplicate stories and stories covered in recent episodes'
+        )
+        parser.add_argument(
+            '--history-days',
+            type=int,
+            default=7,
+            help='How many days of past episodes to check with --dedup'
+        )
+        parser.add_argument(
+            '--editor',
+            choices=['full', 'incremental', 'parallel'],
+            default='full',
+            help='Editorial review of the whole script, only of the sections that fail their checks, or of every story concurrently'
+        )
+        parser.add_argument(
+            '--writer',
+            choices=['single', 'parallel'],
+            default='single',
+            help='Write the script in one call, or one call per story plus the closing analysis'
+        )
+        parser.add_argument(
+            '--tiered',
+            action='store_true',
+            help='Start each stage on its configured model tier (AOK_STAGE_TIERS) and escalate only on validation failure'
+        )
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Patch a prioritized list that fails validation with targeted follow-up requests'
+        )
+        parser.add_argument(
+            '--hedge-research',
+            action='store_true',
+            help='Send a duplicate research request when one runs past the p90 latency'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Save per-stage checkpoints and reuse those from an earlier run for this date'
+        )
+        parser.add_argument(
+            '--rerun-from',
+            type=str,
+            choices=['research', 'prioritize', 'script', 'editorial'],
+            help='Invalidate this checkpointed stage and every later one before running (implies --resume)'
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Disable the on-disk Anthropic response cache'
+        )
+        parser.add_argument(
+            '--refresh',
+            type=str,
+            default='',
+            help='Comma-separated stages to re-query instead of reading from cache (research,prioritize,script,editorial or all)'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('🤖 Testing V3 Agents Pipeline (Content Filtering)'))
@@ -31,39 +114,94 @@ class Command(BaseCommand):
         
         # Import the v3 pipeline
         sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
-        from agents_pipeline_v3 import generate_episode_v3
+        from agents_pipeline_v3 import STAGES, generate_episode_v3
+        from digests.checkpoints import PipelineCheckpoint
+        from agents_cache import response_cache
+        from agents_resilience import HEDGED_STAGES
+        from agents_research_shards import SHARD_MAX_WORKERS
         
-        # Check API key
+        from agents_transport import FIXTURE_DIR, offline
+        
+        # Check API key (replay mode serves recorded responses and needs none)
         api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not api_key:
+        if offline():
+            self.stdout.write(f"📼 Replaying recorded Anthropic responses from {FIXTURE_DIR}")
+        elif not api_key:
             self.stdout.write(self.style.ERROR('❌ ANTHROPIC_API_KEY not found'))
             return
-        
-        self.stdout.write(f"✅ API key found: {api_key[:10]}...")
+        else:
+            self.stdout.write(f"✅ API key found: {api_key[:10]}...")
         
         test_date = options['date']
         use_editor = not options['no_editor']
         save_result = options['save']
+        use_checkpoint = options['resume'] or bool(options['rerun_from'])
+
+        response_cache.enabled = not options['no_cache']
+        response_cache.bypass.update(s.strip() for s in options['refresh'].split(',') if s.strip())
+        if options['hedge_research']:
+            HEDGED_STAGES.add('research')
         
         self.stdout.write(f"\n🔬 Testing V3 pipeline:")
         self.stdout.write(f"   📅 Date: {test_date}")
         self.stdout.write(f"   ⏰ 24-hour constraint: ENABLED")
         self.stdout.write(f"   🧹 Content filtering: ENABLED")
         self.stdout.write(f"   ✅ Validation: ENABLED")
-        self.stdout.write(f"   🧠 Editor: {'Enabled' if use_editor else 'Disabled'}")
+        self.stdout.write(f"   ✍️  Writer: {options['writer']}")
+        self.stdout.write(f"   🧠 Editor: {options['editor'] if use_editor else 'Disabled'}")
+        self.stdout.write(f"   🪜 Model tiering: {'Yes' if options['tiered'] else 'No'}")
+        self.stdout.write(f"   🩹 Repair: {'Yes' if options['repair'] else 'No'}")
+        self.stdout.write(f"   🧱 Structured hand-off: {'Yes' if options['structured'] else 'No'}")
+        self.stdout.write(f"   🏅 Prioritizer: {options['prioritizer']}")
+        self.stdout.write(f"   🔀 Sharded research: {'Yes (' + str(options['shard_workers'] or SHARD_MAX_WORKERS) + ' workers)' if options['sharded'] else 'No'}")
         self.stdout.write(f"   💾 Save to DB: {'Yes' if save_result else 'No'}")
+        self.stdout.write(f"   ⏭️  Checkpoints: {'Enabled' if use_checkpoint else 'Disabled'}")
+        self.stdout.write(f"   🗄️  Response cache: {'Enabled' if response_cache.enabled else 'Disabled'}")
+        if response_cache.bypass:
+            self.stdout.write(f"   🔄 Refresh stages: {', '.join(sorted(response_cache.bypass))}")
         
         try:
             self.stdout.write("\n⏳ Running V3 agents pipeline...")
             self.stdout.write("   This may take several minutes due to web searches and validation...")
             
+            story_history = None
+            if options['dedup']:
+                from datetime import date as dt_date
+                from digests.story_history import load_story_history
+                story_history = load_story_history(dt_date.fromisoformat(test_date), days=options['history_days'])
+                self.stdout.write(f"   🧹 Story history: {len(story_history.indexed_dates)} recent episodes indexed")
+
+            checkpoint = None
+            if use_checkpoint:
+                checkpoint = PipelineCheckpoint(
+                    test_date,
+                    pipeline_version='v3',
+                    stages=STAGES,
+                    rerun_from=options['rerun_from'],
+                )
+
             episode_result = generate_episode_v3(
                 date_str=test_date,
                 with_editor=use_editor,
-                debug=False  # Disable debug to reduce noise
+                debug=False,  # Disable debug to reduce noise
+                sharded_research=options['sharded'],
+                shard_workers=options['shard_workers'],
+                checkpoint=checkpoint,
+                structured_handoff=options['structured'],
+                prioritizer=options['prioritizer'],
+                dedup=options['dedup'],
+                story_history=story_history,
+                editor=options['editor'],
+                writer=options['writer'],
+                tiering=options['tiered'],
+                repair=options['repair'],
             )
             
             self.stdout.write(self.style.SUCCESS('\n✅ V3 Pipeline completed successfully!'))
+            self.stdout.write(f"   🗄️  Cache stats: {response_cache.stats()}")
+            if checkpoint is not None:
+                reused = ', '.join(checkpoint.reused) or 'none'
+                self.stdout.write(f"   ⏭️  Resumed from checkpoint (reused stages: {reused})")
             
             # Show detailed validation results
             validations = episode_result.get('validations', {})
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.21 on 2026-10-17 23:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('digests', '0003_dailydigest_audio_size_en_dailydigest_audio_size_zh'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineRun',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('pipeline_version', models.CharField(default='v3', max_length=32)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=16)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Pipeline Run',
+                'verbose_name_plural': 'Pipeline Runs',
+                'ordering': ['-date'],
+                'unique_together': {('date', 'pipeline_version')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StageResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(max_length=32)),
+                ('input_hash', models.CharField(max_length=64)),
+                ('output', models.TextField()),
+                ('validation', models.JSONField(blank=True, null=True)),
+                ('duration_seconds', models.FloatField(default=0)),
+                ('invalidated', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stages', to='digests.pipelinerun')),
+            ],
+            options={
+                'verbose_name': 'Stage Result',
+                'verbose_name_plural': 'Stage Results',
+                'ordering': ['run', 'created_at'],
+                'unique_together': {('run', 'stage')},
+            },
+        ),
+    ]
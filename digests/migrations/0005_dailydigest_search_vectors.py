@@ -0,0 +1,111 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The search vectors are maintained by a Postgres trigger, so every write path
+# (save(), QuerySet.update(), bulk_create/bulk_update, raw SQL) keeps them in
+# sync. The Mandarin vector indexes CJK character bigrams, mirroring
+# digests.search.cjk_bigrams, which builds the query side. Other backends (the
+# sqlite test database) skip the trigger and indexes and fall back to
+# icontains lookups.
+
+CREATE_TRIGGER_SQL = r"""
+CREATE OR REPLACE FUNCTION digests_cjk_bigrams(value text) RETURNS text AS $$
+DECLARE
+    token text;
+    tokens text[] := '{}';
+BEGIN
+    FOR token IN SELECT (regexp_matches(coalesce(value, ''), '[㐀-䶿一-鿿豈-﫿]+', 'g'))[1] LOOP
+        IF length(token) = 1 THEN
+            tokens := tokens || token;
+        END IF;
+        FOR i IN 1 .. length(token) - 1 LOOP
+            tokens := tokens || substr(token, i, 2);
+        END LOOP;
+    END LOOP;
+    FOR token IN SELECT lower((regexp_matches(coalesce(value, ''), '[A-Za-z0-9]+', 'g'))[1]) LOOP
+        tokens := tokens || token;
+    END LOOP;
+    RETURN array_to_string(tokens, ' ');
+END
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION digests_dailydigest_search_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector_en :=
+        setweight(to_tsvector('english', coalesce(NEW.title_en, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(NEW.description_en, '') || ' ' || coalesce(NEW.keywords_en, '')), 'B')
+        || setweight(to_tsvector('english', coalesce(NEW.summary_text_en, '')), 'C');
+    NEW.search_vector_zh :=
+        setweight(to_tsvector('simple', digests_cjk_bigrams(NEW.title_zh)), 'A')
+        || setweight(to_tsvector('simple', digests_cjk_bigrams(coalesce(NEW.description_zh, '') || ' ' || coalesce(NEW.keywords_zh, ''))), 'B')
+        || setweight(to_tsvector('simple', digests_cjk_bigrams(NEW.summary_text_zh)), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS digests_dailydigest_search_update ON digests_dailydigest;
+CREATE TRIGGER digests_dailydigest_search_update
+    BEFORE INSERT OR UPDATE ON digests_dailydigest
+    FOR EACH ROW EXECUTE FUNCTION digests_dailydigest_search_update();
+
+-- Backfill existing rows through the trigger
+UPDATE digests_dailydigest SET title_en = title_en;
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS digests_dailydigest_search_update ON digests_dailydigest;
+DROP FUNCTION IF EXISTS digests_dailydigest_search_update();
+DROP FUNCTION IF EXISTS digests_cjk_bigrams(text);
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGGER_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGGER_SQL)
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """AddIndex that only touches the database on Postgres; the model state always has the index."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('digests', '0004_pipelinerun_stageresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailydigest',
+            name='search_vector_en',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='dailydigest',
+            name='search_vector_zh',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        AddPostgresIndex(
+            model_name='dailydigest',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector_en'], name='digest_search_en_gin'),
+        ),
+        AddPostgresIndex(
+            model_name='dailydigest',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector_zh'], name='digest_search_zh_gin'),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
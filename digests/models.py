@@ -1,4 +1,6 @@
 import uuid
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 
@@ -20,11 +22,68 @@ class DailyDigest(models.Model):
     llm_prompt = models.TextField()
     llm_response_raw = models.JSONField(blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
+    # Full-text search vectors, maintained by a Postgres trigger on every write (see migration 0005)
+    search_vector_en = SearchVectorField(blank=True, null=True, editable=False)
+    search_vector_zh = SearchVectorField(blank=True, null=True, editable=False)
 
     class Meta:
         verbose_name = 'Daily Digest'
         verbose_name_plural = 'Daily Digests'
         ordering = ['-date']
+        indexes = [
+            GinIndex(fields=['search_vector_en'], name='digest_search_en_gin'),
+            GinIndex(fields=['search_vector_zh'], name='digest_search_zh_gin'),
+        ]
 
     def __str__(self):
-        return f"{self.date} - {self.title_en}" 
\ No newline at end of file
+        return f"{self.date} - {self.title_en}"
+
+
+class PipelineRun(models.Model):
+    """One resumable agents-pipeline run per date and pipeline version."""
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    date = models.DateField()
+    pipeline_version = models.CharField(max_length=32, default='v3')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Pipeline Run'
+        verbose_name_plural = 'Pipeline Runs'
+        ordering = ['-date']
+        unique_together = [('date', 'pipeline_version')]
+
+    def __str__(self):
+        return f"{self.date} - {self.pipeline_version} ({self.status})"
+
+
+class StageResult(models.Model):
+    """Checkpointed output of one pipeline stage, keyed by a hash of its inputs."""
+    run = models.ForeignKey(PipelineRun, related_name='stages', on_delete=models.CASCADE)
+    stage = models.CharField(max_length=32)
+    input_hash = models.CharField(max_length=64)
+    output = models.TextField()
+    validation = models.JSONField(blank=True, null=True)
+    duration_seconds = models.FloatField(default=0)
+    invalidated = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Stage Result'
+        verbose_name_plural = 'Stage Results'
+        ordering = ['run', 'created_at']
+        unique_together = [('run', 'stage')]
+
+    def __str__(self):
+        return f"{self.run.date} - {self.stage}"
@@ -0,0 +1,142 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.db import transaction
+
+from .models import DailyDigest
+from .utils.elevenlabs import DEFAULT_VOICE_ID, synthesize_chunked
+from .utils.vercel_blob import delete_blobs, upload_bytes
+
+from agents_graph import Stage, StageGraph
+from agents_pipeline_v3 import (generate_metadata, metadata_messages, parse_metadata, translate_script,
+                                translation_messages, validate_metadata, validate_translation)
+
+__all__ = ["post_production_stages", "run_post_production"]
+
+VOICE_IDS = {
+    "en": os.getenv("ELEVEN_VOICE_ID_EN", DEFAULT_VOICE_ID),
+    "zh": os.getenv("ELEVEN_VOICE_ID_ZH", DEFAULT_VOICE_ID),
+}
+
+
+def _audio_stage(lang: str, script_key: str, synthesize_fn: Callable[..., bytes]) -> Stage:
+    def speak(script: str) -> bytes:
+        return synthesize_fn(script, VOICE_IDS[lang])
+
+    return Stage(f"tts_{lang}", speak, inputs=(script_key,), output=f"audio_{lang}", tracked=False)
+
+
+def _require_valid(metadata: str, script_zh: str) -> str:
+    """*script_zh*, once metadata and translation both pass validation"""
+    issues = validate_metadata(metadata)["issues"] + validate_translation(script_zh)["issues"]
+    if issues:
+        raise ValueError(f"Post-production output failed validation: {'; '.join(issues)}")
+    return script_zh
+
+
+def post_production_stages(target_date: date, with_audio: bool = True,
+                           synthesize_fn: Callable[..., bytes] = synthesize_chunked) -> List[Stage]:
+    """Everything after the final English script, as a stage graph.
+
+    English TTS only needs the English script, so it runs alongside the
+    translation; Mandarin TTS starts once the translation lands and both it
+    and the metadata pass validation. Metadata for both languages comes from
+    one call on the English script.
+    """
+    date_str = str(target_date)
+    stages = [
+        Stage("metadata", lambda script: generate_metadata(script, date_str), inputs=("script_en",),
+              payload=lambda script: metadata_messages(script, date_str), validator=validate_metadata),
+        Stage("translate", translate_script, inputs=("script_en",), output="script_zh",
+              payload=translation_messages, validator=validate_translation),
+        Stage("validate", _require_valid, inputs=("metadata", "script_zh"), output="script_zh_valid", tracked=False),
+    ]
+    if with_audio:
+        stages.append(_audio_stage("en", "script_en", synthesize_fn))
+        stages.append(_audio_stage("zh", "script_zh_valid", synthesize_fn))
+    return stages
+
+
+def _discard(urls: Iterable[str], delete_fn: Callable[[List[str]], None]) -> None:
+    urls = list(urls)
+    if not urls:
+        return
+    try:
+        delete_fn(urls)
+    except Exception as exc:
+        logging.warning(f"Could not delete orphaned audio {urls}: {exc}")
+
+
+def _upload_audio(audio: Dict[str, bytes], target_date: date, upload_fn: Callable[..., str],
+                  delete_fn: Callable[[List[str]], None]) -> Dict[str, str]:
+    """{lang: url}, uploaded concurrently; if any upload fails the others are deleted"""
+    with ThreadPoolExecutor(max_workers=len(audio)) as pool:
+        futures = {lang: pool.submit(upload_fn, data, prefix=f"audio/{lang}/{target_date:%Y/%m/%d}")
+                   for lang, data in audio.items()}
+    urls, errors = {}, []
+    for lang, future in futures.items():
+        try:
+            urls[lang] = future.result()
+        except Exception as exc:
+            errors.append(exc)
+    if errors:
+        _discard(urls.values(), delete_fn)
+        raise errors[0]
+    return urls
+
+
+def run_post_production(target_date: date, script_en: Optional[str] = None, with_audio: bool = True,
+                        checkpoint=None, debug: bool = False,
+                        synthesize_fn: Callable[..., bytes] = synthesize_chunked,
+                        upload_fn: Callable[..., str] = upload_bytes,
+                        delete_fn: Callable[[List[str]], None] = delete_blobs) -> DailyDigest:
+    """Translate, describe and voice the episode for *target_date*, then save it.
+
+    *script_en* defaults to the stored ``summary_text_en``. Nothing is written
+    unless every stage succeeds and the metadata and translation pass
+    validation; then the audio is uploaded and all fields land in one
+    transaction. Audio uploaded for a save that fails is deleted again.
+    """
+    if script_en is None:
+        script_en = DailyDigest.objects.get(date=target_date).summary_text_en
+    if not script_en or script_en.startswith("[LLM call failed"):
+        raise ValueError(f"No English script for {target_date} to post-produce")
+
+    graph = StageGraph(post_production_stages(target_date, with_audio=with_audio, synthesize_fn=synthesize_fn))
+    hooks = [lambda event, stage, data: print(f"   {'▶️ ' if event == 'stage_start' else '✅'} {stage}")] if debug else ()
+    run = graph.run({"script_en": script_en}, checkpoint=checkpoint, debug=debug, hooks=hooks)
+    values = run.values
+
+    fields = dict(parse_metadata(values["metadata"]), summary_text_zh=values["script_zh"])
+    urls = {}
+    if with_audio:
+        audio = {lang: values[f"audio_{lang}"] for lang in ("en", "zh")}
+        urls = _upload_audio(audio, target_date, upload_fn, delete_fn)
+        for lang, data in audio.items():
+            fields[f"audio_url_{lang}"] = urls[lang]
+            fields[f"audio_size_{lang}"] = len(data)
+
+    try:
+        with transaction.atomic():
+            digest, _ = DailyDigest.objects.select_for_update().get_or_create(
+                date=target_date,
+                defaults={"summary_text_en": script_en, "llm_prompt": ""},
+            )
+            for field, value in fields.items():
+                setattr(digest, field, value)
+            digest.summary_text_en = script_en
+            raw = dict(digest.llm_response_raw or {})
+            raw["post_production"] = {
+                "validations": run.validations,
+                "stage_seconds": {name: round(end - start, 3) for name, (start, end) in run.timings.items()},
+                "critical_path": run.critical_path,
+            }
+            digest.llm_response_raw = raw
+            digest.save()
+    except Exception:
+        _discard(urls.values(), delete_fn)
+        raise
+    return digest
@@ -0,0 +1,86 @@
+import re
+
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+)
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+
+# Full-text search over the episode archive
+# Features:
+# - English tsvector (title > description/keywords > script) with the 'english' config,
+#   kept current by a database trigger (migration 0005)
+# - Mandarin tsvector built from CJK character bigrams with the 'simple' config,
+#   since stock Postgres has no Chinese parser; cjk_bigrams() matches the
+#   trigger's digests_cjk_bigrams() so queries tokenize like the index
+# - Ranked hits with snippets; plain icontains fallback on non-Postgres databases
+
+_CJK_RUN_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+SNIPPET_CHARS = 160
+
+
+def postgres_enabled() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def cjk_bigrams(text: str) -> str:
+    """Space-separated CJK bigrams (single characters kept as-is) plus any Latin words"""
+    tokens = []
+    for run in _CJK_RUN_RE.findall(text or ""):
+        if len(run) == 1:
+            tokens.append(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(word.lower() for word in _WORD_RE.findall(text or ""))
+    return " ".join(tokens)
+
+
+def make_snippet(text: str, query: str, width: int = SNIPPET_CHARS) -> str:
+    """Window of *text* around the first occurrence of any query term"""
+    text = " ".join((text or "").split())
+    lowered = text.lower()
+    terms = [query.lower()] + [t for t in cjk_bigrams(query).split() + query.lower().split() if t]
+    positions = [lowered.find(term) for term in terms if term and term in lowered]
+    if not positions:
+        return text[:width]
+    start = max(0, min(positions) - width // 3)
+    snippet = text[start:start + width]
+    return f"{'…' if start else ''}{snippet}{'…' if start + width < len(text) else ''}"
+
+
+def search_digests(queryset, query: str, lang: str = "en", start=None, end=None):
+    """Matching digests ordered by rank, newest first on ties.
+
+    Every row carries ``rank``; on Postgres English rows also carry a
+    highlighted ``snippet``.
+    """
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+
+    if not postgres_enabled():
+        fields = ["title_en", "description_en", "summary_text_en"] if lang == "en" else \
+            ["title_zh", "description_zh", "summary_text_zh"]
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f"{field}__icontains": query})
+        return queryset.filter(condition).annotate(rank=Value(0.0, output_field=FloatField())).order_by("-date")
+
+    if lang == "zh":
+        search_query = SearchQuery(cjk_bigrams(query) or query, config="simple", search_type="plain")
+        vector = "search_vector_zh"
+        queryset = queryset.filter(search_vector_zh=search_query)
+    else:
+        search_query = SearchQuery(query, config="english", search_type="websearch")
+        vector = "search_vector_en"
+        queryset = queryset.filter(search_vector_en=search_query).annotate(
+            snippet=SearchHeadline(
+                "summary_text_en", search_query, config="english",
+                start_sel="<b>", stop_sel="</b>", max_words=35, min_words=15,
+            )
+        )
+    return queryset.annotate(rank=SearchRank(F(vector), search_query)).order_by("-rank", "-date")
@@ -4,13 +4,15 @@ from .models import DailyDigest
 class DailyDigestSerializer(serializers.ModelSerializer):
     class Meta:
         model = DailyDigest
-        fields = '__all__'
+        exclude = ['search_vector_en', 'search_vector_zh']
 
 class TTSSerializer(serializers.Serializer):
     text = serializers.CharField()
     lang = serializers.CharField(default='en')
     # Default ElevenLabs voice ID (Rachel - accessible clone)
     voice = serializers.CharField(default='9DDKJLIKJqVKLbRZb3kO')
+    # Opt-in: voice long scripts as concurrent chunks joined frame by frame
+    chunked = serializers.BooleanField(default=False)
 
 class PublishSerializer(serializers.Serializer):
     audio_url = serializers.URLField()
@@ -22,4 +24,23 @@ class PublishSerializer(serializers.Serializer):
     transcript_url = serializers.URLField(required=False)
 
 class ScriptGenerationSerializer(serializers.Serializer):
-    date = serializers.DateField(required=False) 
\ No newline at end of file
+    date = serializers.DateField(required=False)
+    # Opt-in: checkpoint each stage and reuse outputs from an earlier run for
+    # the same date; rerun_from implies it
+    resume = serializers.BooleanField(default=False)
+    rerun_from = serializers.ChoiceField(
+        choices=['research', 'prioritize', 'script', 'editorial'],
+        required=False,
+    )
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    lang = serializers.ChoiceField(choices=['en', 'zh'], default='en')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] > data['end']:
+            raise serializers.ValidationError('start must be on or before end')
+        return data
@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+from typing import Optional
+
+from .models import DailyDigest
+
+from agents_dedup import StoryHistoryIndex
+
+__all__ = ["load_story_history"]
+
+
+def load_story_history(target_date: date, days: int = 7, path: Optional[str] = None) -> StoryHistoryIndex:
+    """Load the persisted story index and sync it with the episodes from the last *days*.
+
+    Only scripts that actually exist are indexed, so a date whose episode is
+    generated later is picked up on the next refresh, and a date whose
+    episode was regenerated has its entries replaced. The index only matches
+    episodes from since <= date < target_date, even when it also holds later
+    ones (a backfill of an older date, or a rerun of *target_date*).
+    """
+    index = StoryHistoryIndex.load(path) if path else StoryHistoryIndex.load()
+    since = target_date - timedelta(days=days)
+    index.prune(str(since))
+    index.since, index.until = str(since), str(target_date)
+
+    recent = (
+        DailyDigest.objects
+        .filter(date__gte=since, date__lt=target_date)
+        .exclude(summary_text_en="")
+        .exclude(summary_text_en__startswith="[LLM call failed")
+        .values_list("date", "summary_text_en", "llm_response_raw")
+    )
+    indexed = dict(index.fingerprints)
+    for digest_date, script, raw in recent:
+        # The prioritized STORY list, when the generating view kept it
+        summary = raw.get("summary", "") if isinstance(raw, dict) else ""
+        index.add_script(str(digest_date), script, summary)
+
+    if index.fingerprints != indexed or not index.indexed_dates:
+        index.save()
+    return index
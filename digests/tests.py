@@ -1,9 +1,69 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
-from digests.models import DailyDigest
-import uuid
+from rest_framework.test import APITestCase, APITransactionTestCase
+from digests.checkpoints import PipelineCheckpoint
+from digests.models import DailyDigest, PipelineRun, StageResult
+from digests.postproduction import run_post_production
+from digests.search import cjk_bigrams
+from digests.story_history import load_story_history
+from digests.utils import vercel_blob
+from digests.utils.elevenlabs import TTSError, split_text, synthesize_chunked
+from digests.utils.mp3 import concat_mp3
+import asyncio
+import os
+import requests
+import shutil
+import io
+import json
+import tempfile
+import threading
+import time
 from datetime import date
+from types import SimpleNamespace
+from unittest import mock
+
+import agents_client
+import agents_editor
+import agents_pipeline
+import agents_pipeline_async
+import agents_pipeline_v2
+import agents_pipeline_v3
+import agents_writer
+import agents_repair
+import agents_research_shards
+import agents_resilience
+import agents_tiering
+import agents_validation
+from agents_budget import OutputHistory, compact_stories, estimate_tokens
+from agents_cache import ResponseCache, make_cache_key
+from agents_dedup import StoryHistoryIndex, dedupe_stories
+from agents_graph import Stage, StageGraph
+from agents_resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, resilient_call
+from agents_ratelimit import RateLimiter, TokenBucket
+from agents_metrics import MetricsStore, capture_metrics, metrics_store, summarize
+from agents_validation import review_script, scan, validate_output, validate_script
+from agents_transport import FixtureNotFoundError, RecordingClient, ReplayClient, use_transport
+from agents_ranker import MIN_CONFIDENCE, rank_stories
+from agents_research_shards import merge_research
+from agents_tiering import MODEL_TIERS
+from agents_stories import Story, format_stories, parse_stories, serialize_stories, validate_stories
+from agents_streaming import StreamLineCleaner
+
+
+def setUpModule():
+    # Test cases that swap only the client or tiering store still record
+    # through the global metrics store; keep that out of .cache/metrics.jsonl
+    global _metrics_dir, _metrics_path
+    _metrics_dir, _metrics_path = tempfile.mkdtemp(), metrics_store.path
+    metrics_store.path = os.path.join(_metrics_dir, 'metrics.jsonl')
+
+
+def tearDownModule():
+    metrics_store.path = _metrics_path
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
 
 class DailyDigestAPITestCase(APITestCase):
     def setUp(self):
@@ -49,4 +109,1487 @@ class DailyDigestAPITestCase(APITestCase):
 
         # Confirm deletion
         response = self.client.get(detail_url)
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND) 
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND) 
+
+class ResponseCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.messages = [{'role': 'user', 'content': 'hello'}]
+
+    def test_hit_miss_and_bypass(self):
+        cache = ResponseCache(directory=self.tmpdir, ttl=60, max_bytes=0, bypass=['research'])
+        key = make_cache_key('model', self.messages, [], 100)
+        self.assertIsNone(cache.get(key))
+        cache.set(key, {'text': 'cached'})
+        self.assertEqual(cache.get(key)['text'], 'cached')
+        self.assertIsNone(cache.get(key, stage='research'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['bypassed'], 1)
+        self.assertNotEqual(key, make_cache_key('model', self.messages, [], 200))
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(directory=self.tmpdir, ttl=0, max_bytes=250)
+        for i in range(5):
+            cache.set(f'{i:064x}', {'text': 'x' * 100})
+        self.assertGreater(cache.evictions, 0)
+        self.assertIsNotNone(cache.get(f'{4:064x}'))
+        self.assertIsNone(cache.get(f'{0:064x}'))
+
+
+class ResearchShardMergeTestCase(SimpleTestCase):
+    def test_merge_dedupes_by_url_and_headline(self):
+        techcrunch = (
+            "STORY: OpenAI launches new reasoning model\n"
+            "SOURCE: TechCrunch - https://techcrunch.com/2025/05/01/openai-model/\n"
+            "DATE: 2025-05-01\n"
+            "SUMMARY: OpenAI shipped a model.\n"
+            "IMPACT: Faster agents.\n"
+            "---\n"
+            "STORY: Nvidia unveils new chip\n"
+            "SOURCE: TechCrunch - Nvidia chip\n"
+        )
+        company = (
+            "STORY: OpenAI Launches New Reasoning Model!\n"
+            "SOURCE: OpenAI Blog - https://openai.com/blog/model\n"
+            "---\n"
+            "STORY: Different headline entirely\n"
+            "SOURCE: The Verge - https://www.techcrunch.com/2025/05/01/openai-model\n"
+            "---\n"
+            "STORY: Anthropic expands Claude availability\n"
+            "SOURCE: Anthropic News\n"
+        )
+        merged = merge_research([techcrunch, company])
+        headlines = [story.headline for story in parse_stories(merged)]
+        self.assertEqual(headlines, [
+            'OpenAI launches new reasoning model',
+            'Nvidia unveils new chip',
+            'Anthropic expands Claude availability',
+        ])
+        self.assertIn('IMPACT: Faster agents.', merged)
+
+    def test_shards_run_bounded_on_shared_instructions(self):
+        client = FakeClient()
+        create = client.messages.create
+        lock = threading.Lock()
+        in_flight = [0, 0]  # current, peak
+
+        def slow_create(**request):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.1)
+            with lock:
+                in_flight[0] -= 1
+            return create(**request)
+
+        client.messages.create = slow_create
+        with use_transport(client, cache=False, history=False):
+            agents_research_shards.collect_research_sharded('2025-05-01')
+
+        self.assertEqual(in_flight[1], agents_research_shards.SHARD_MAX_WORKERS)
+        self.assertEqual(len(client.messages.requests), len(agents_research_shards.DEFAULT_SHARDS))
+        instructions = {request['messages'][0]['content'][0]['text'] for request in client.messages.requests}
+        self.assertEqual(instructions, {agents_research_shards.SHARD_INSTRUCTIONS})
+
+
+class StreamLineCleanerTestCase(SimpleTestCase):
+    def test_cleans_complete_lines_as_they_arrive(self):
+        cleaner = StreamLineCleaner()
+        self.assertEqual(cleaner.feed('Let me search for AI news\nSTORY: Hea'), [])
+        self.assertEqual(cleaner.feed('dline\n\n  SOURCE: Wired  \nI\'ll look'), ['STORY: Headline', 'SOURCE: Wired'])
+        self.assertEqual(cleaner.feed(' for more\nDATE: 2025-05-01'), [])
+        self.assertEqual(cleaner.flush(), ['DATE: 2025-05-01'])
+        self.assertEqual(cleaner.text, 'STORY: Headline\nSOURCE: Wired\nDATE: 2025-05-01')
+
+
+class GenerateScriptStreamViewTestCase(APITransactionTestCase):
+    # The digest is saved from the pipeline's thread, outside the test's transaction
+    def test_streams_events_and_saves_digest(self):
+        result = {'date': '2025-05-01', 'script': 'Hello world', 'validations': {}}
+        events = [
+            {'event': 'stage_start', 'data': {'stage': 'research'}},
+            {'event': 'text', 'data': {'stage': 'research', 'text': 'STORY: Headline'}},
+            {'event': 'done', 'data': result},
+        ]
+        with mock.patch('digests.views.generate_episode_v3_stream', return_value=(e for e in events)):
+            response = self.client.get(reverse('generate-script-stream'), {'date': '2025-05-01'},
+                                       HTTP_ACCEPT='text/event-stream')
+            body = b''.join(response.streaming_content).decode()
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: stage_start\ndata: {"stage": "research"}\n\n', body)
+        self.assertIn('event: done', body)
+        self.assertEqual(DailyDigest.objects.get(date=date(2025, 5, 1)).summary_text_en, 'Hello world')
+
+    def test_disconnect_stops_the_pipeline(self):
+        research_done = threading.Event()
+        closed = threading.Event()
+
+        def pipeline(**kwargs):
+            try:
+                yield {'event': 'stage_start', 'data': {'stage': 'research'}}
+                research_done.wait(5)
+                yield {'event': 'stage_start', 'data': {'stage': 'prioritize'}}
+                yield {'event': 'done', 'data': {'script': 'Hello world', 'validations': {}}}
+            finally:
+                closed.set()
+
+        with mock.patch('digests.views.generate_episode_v3_stream', side_effect=pipeline):
+            response = self.client.get(reverse('generate-script-stream'), {'date': '2025-05-01'},
+                                       HTTP_ACCEPT='text/event-stream')
+            content = iter(response.streaming_content)
+            next(content)
+            self.assertIn(b'event: stage_start', next(content))
+            response.close()
+            research_done.set()
+            self.assertTrue(closed.wait(5))
+
+        self.assertFalse(DailyDigest.objects.exists())
+
+
+class PipelineCheckpointTestCase(TestCase):
+    def run_pipeline(self, editorial, **checkpoint_kwargs):
+        checkpoint = PipelineCheckpoint(date(2025, 5, 1), stages=agents_pipeline_v3.STAGES, **checkpoint_kwargs)
+        with mock.patch.multiple(
+            agents_pipeline_v3,
+            collect_research=self.research,
+            prioritize_and_filter=self.prioritize,
+            write_script=self.write,
+            editorial_review=editorial,
+        ):
+            result = agents_pipeline_v3.generate_episode_v3('2025-05-01', debug=False, checkpoint=checkpoint)
+        return result, checkpoint
+
+    def setUp(self):
+        # Outputs that pass validation, so every stage is eligible for reuse
+        def stories(count):
+            return fake_story_blocks(count, numbered=True).replace('SUMMARY: Lab', 'SUMMARY: TechCrunch reports Lab')
+        self.research = mock.Mock(return_value=stories(15))
+        self.prioritize = mock.Mock(return_value=stories(10))
+        self.write = mock.Mock(return_value=fake_script(10))
+        self.polished = fake_script(10).replace('faster releases', 'faster, better releases')
+
+    def test_rerun_resumes_from_failed_stage(self):
+        with self.assertRaises(TimeoutError):
+            self.run_pipeline(mock.Mock(side_effect=TimeoutError('editor timed out')))
+        self.assertEqual(PipelineRun.objects.get().status, PipelineRun.STATUS_FAILED)
+
+        result, checkpoint = self.run_pipeline(mock.Mock(return_value=self.polished))
+        self.assertEqual(result['script'], self.polished)
+        self.assertEqual(checkpoint.reused, ['research', 'prioritize', 'script'])
+        self.assertEqual(self.research.call_count, 1)
+        self.assertEqual(self.write.call_count, 1)
+        self.assertEqual(PipelineRun.objects.get().status, PipelineRun.STATUS_COMPLETED)
+        self.assertEqual(StageResult.objects.count(), 4)
+
+    def test_rerun_from_invalidates_later_stages(self):
+        self.run_pipeline(mock.Mock(return_value=self.polished))
+        _, checkpoint = self.run_pipeline(mock.Mock(return_value=self.polished), rerun_from='script')
+        self.assertEqual(checkpoint.reused, ['research', 'prioritize'])
+        self.assertEqual(self.write.call_count, 2)
+
+    def test_model_or_budget_change_reruns_research(self):
+        self.run_pipeline(mock.Mock(return_value=self.polished))
+        with mock.patch.dict(agents_pipeline_v3.STAGE_MAX_TOKENS, research=4096):
+            _, checkpoint = self.run_pipeline(mock.Mock(return_value=self.polished))
+        self.assertEqual(checkpoint.reused, ['prioritize', 'script', 'editorial'])
+        with agents_tiering.use_model('claude-other'):
+            _, checkpoint = self.run_pipeline(mock.Mock(return_value=self.polished))
+        self.assertEqual(checkpoint.reused, [])
+        self.assertEqual(self.research.call_count, 3)
+
+    def test_stage_that_failed_validation_is_rerun(self):
+        self.run_pipeline(mock.Mock(return_value=self.polished))
+        StageResult.objects.filter(stage='script').update(validation={'valid': False, 'issues': ['too short']})
+        _, checkpoint = self.run_pipeline(mock.Mock(return_value=self.polished))
+        self.assertEqual(checkpoint.reused, ['research', 'prioritize', 'editorial'])
+        self.assertEqual(self.write.call_count, 2)
+
+    def test_api_response_and_stored_output(self):
+        result = {'research': 'STORY: research', 'summary': 'STORY 1: summary', 'script': 'Hello world',
+                  'validations': {'final': {'valid': True}}}
+        with mock.patch('digests.views.generate_episode_v3', return_value=result):
+            response = self.client.post(reverse('generate-script'), {'date': '2025-05-01'},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(response.json()), {'date', 'script', 'digest_id', 'created',
+                                                'pipeline_run_id', 'reused_stages'})
+        stored = DailyDigest.objects.get(date=date(2025, 5, 1)).llm_response_raw
+        self.assertEqual(stored, {'research': 'STORY: research', 'summary': 'STORY 1: summary',
+                                  'script': 'Hello world', 'validations': {'final': {'valid': True}},
+                                  'generated_via': 'agents_pipeline_v3'})
+
+    def test_api_checkpoints_only_when_asked(self):
+        result = {'script': 'Hello world', 'validations': {}}
+        with mock.patch('digests.views.generate_episode_v3', return_value=result) as generate:
+            self.client.post(reverse('generate-script'), {'date': '2025-05-01'}, content_type='application/json')
+            self.assertIsNone(generate.call_args.kwargs['checkpoint'])
+            self.client.post(reverse('generate-script'), {'date': '2025-05-01', 'resume': True},
+                             content_type='application/json')
+            self.assertIsInstance(generate.call_args.kwargs['checkpoint'], PipelineCheckpoint)
+        self.assertEqual(PipelineRun.objects.count(), 1)
+
+
+class DictCheckpoint:
+    def __init__(self):
+        self.stored = {}
+        self.reused = []
+
+    def load(self, stage, input_hash):
+        stored = self.stored.get((stage, input_hash))
+        if stored is not None:
+            self.reused.append(stage)
+        return stored
+
+    def save(self, stage, input_hash, output, validation, duration_seconds):
+        self.stored[(stage, input_hash)] = {'output': output, 'validation': validation}
+
+
+class StageGraphTestCase(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(metrics_store, 'enabled', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def slow(self, value, seconds=0.2):
+        def run(*inputs):
+            time.sleep(seconds)
+            return value + ''.join(inputs)
+        return run
+
+    def test_independent_stages_run_concurrently_and_resume(self):
+        stages = [
+            Stage('draft', self.slow('d'), inputs=('date',)),
+            Stage('metadata', self.slow('m'), inputs=('draft',), validator=lambda out, n: {'valid': True}),
+            Stage('translate', self.slow('t'), inputs=('draft',), output='draft_zh'),
+        ]
+        checkpoint = DictCheckpoint()
+        started = time.monotonic()
+        result = StageGraph(stages).run({'date': '2025-05-01'}, checkpoint=checkpoint)
+        # metadata and translation overlap, so the run takes two stage lengths, not three
+        self.assertLess(time.monotonic() - started, 0.55)
+        self.assertEqual(result.values['draft_zh'], 'td2025-05-01')
+        self.assertEqual(result.validations['metadata'], {'valid': True})
+        self.assertEqual(result.critical_path[0], 'draft')
+        self.assertEqual(len(result.critical_path), 2)
+
+        events = []
+        rerun = StageGraph(stages).run({'date': '2025-05-01'}, checkpoint=checkpoint,
+                                       hooks=[lambda event, stage, data: events.append((event, stage))])
+        self.assertEqual(sorted(rerun.reused), ['draft', 'metadata', 'translate'])
+        self.assertNotIn('stage_start', [event for event, _ in events])
+
+    def test_rejects_cycles_missing_inputs_and_raises_stage_errors(self):
+        with self.assertRaisesMessage(ValueError, 'cycle'):
+            StageGraph([Stage('a', str, inputs=('b',)), Stage('b', str, inputs=('a',))])
+        with self.assertRaisesMessage(ValueError, 'date'):
+            StageGraph([Stage('a', str, inputs=('date',))]).run()
+        downstream = mock.Mock()
+        with self.assertRaises(TimeoutError):
+            StageGraph([
+                Stage('a', mock.Mock(side_effect=TimeoutError('slow'))),
+                Stage('b', downstream, inputs=('a',)),
+            ]).run()
+        downstream.assert_not_called()
+
+    def test_v3_metadata_and_translation_follow_the_final_script(self):
+        stages = agents_pipeline_v3.v3_stages('2025-05-01', metadata=True, translate=True, debug=False)
+        graph = StageGraph(stages)
+        self.assertEqual(graph.by_key['metadata'].inputs, ('script',))
+        self.assertEqual(graph.by_key['script_zh'].inputs, ('script',))
+        self.assertEqual([s.name for s in graph.order if s.tracked][:4], agents_pipeline_v3.STAGES[:4])
+
+
+class PostProductionTestCase(TestCase):
+    metadata = json.dumps({
+        'title_en': 'Model launches', 'title_zh': '模型发布', 'description_en': 'Ten stories.',
+        'description_zh': '十个故事。', 'keywords_en': 'ai, models', 'keywords_zh': '人工智能, 模型',
+    })
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.object(metrics_store, 'enabled', False),
+            mock.patch('digests.postproduction.generate_metadata', return_value=self.metadata),
+            mock.patch('digests.postproduction.translate_script', side_effect=self.translate),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        DailyDigest.objects.create(date=date(2025, 5, 1), title_en='', description_en='',
+                                   summary_text_en='Hello world script', llm_prompt='p')
+        self.uploads = []
+
+    def translate(self, script):
+        time.sleep(0.2)
+        return '你好世界，欢迎收听'
+
+    def synthesize(self, text, voice_id):
+        time.sleep(0.2)
+        return text.encode('utf-8')
+
+    def upload(self, data, prefix):
+        self.uploads.append(prefix)
+        return f'https://blob.example/{prefix}/episode.mp3'
+
+    def test_english_tts_overlaps_translation_and_fields_are_saved_together(self):
+        started = time.monotonic()
+        digest = run_post_production(date(2025, 5, 1), synthesize_fn=self.synthesize, upload_fn=self.upload)
+        # translate -> Mandarin TTS is the critical path; English TTS runs beside it
+        self.assertLess(time.monotonic() - started, 0.55)
+        self.assertEqual(digest.llm_response_raw['post_production']['critical_path'], ['translate', 'validate', 'tts_zh'])
+
+        digest = DailyDigest.objects.get(date=date(2025, 5, 1))
+        self.assertEqual(digest.title_zh, '模型发布')
+        self.assertEqual(digest.summary_text_zh, '你好世界，欢迎收听')
+        self.assertEqual(digest.audio_url_en, 'https://blob.example/audio/en/2025/05/01/episode.mp3')
+        self.assertEqual(digest.audio_size_zh, len('你好世界，欢迎收听'.encode('utf-8')))
+        self.assertTrue(digest.llm_response_raw['post_production']['validations']['metadata']['valid'])
+
+    def test_failed_stage_saves_nothing(self):
+        def failing_upload(data, prefix):
+            raise RuntimeError('blob down')
+
+        with self.assertRaisesMessage(RuntimeError, 'blob down'):
+            run_post_production(date(2025, 5, 1), synthesize_fn=self.synthesize, upload_fn=failing_upload)
+        digest = DailyDigest.objects.get(date=date(2025, 5, 1))
+        self.assertEqual(digest.title_en, '')
+        self.assertIsNone(digest.summary_text_zh)
+
+    def test_failed_save_deletes_uploaded_audio(self):
+        deleted = []
+        with mock.patch.object(DailyDigest, 'save', side_effect=RuntimeError('db down')):
+            with self.assertRaisesMessage(RuntimeError, 'db down'):
+                run_post_production(date(2025, 5, 1), synthesize_fn=self.synthesize, upload_fn=self.upload,
+                                    delete_fn=deleted.extend)
+        self.assertEqual(sorted(deleted), ['https://blob.example/audio/en/2025/05/01/episode.mp3',
+                                           'https://blob.example/audio/zh/2025/05/01/episode.mp3'])
+
+    def test_invalid_translation_skips_mandarin_tts_and_uploads(self):
+        voiced = []
+
+        def synthesize(text, voice_id):
+            voiced.append(text)
+            return b'mp3'
+
+        with mock.patch('digests.postproduction.translate_script', return_value='Hello world, untranslated'):
+            with self.assertRaisesMessage(ValueError, 'failed validation'):
+                run_post_production(date(2025, 5, 1), synthesize_fn=synthesize, upload_fn=self.upload)
+        self.assertNotIn('Hello world, untranslated', voiced)
+        self.assertEqual(self.uploads, [])
+        self.assertIsNone(DailyDigest.objects.get(date=date(2025, 5, 1)).summary_text_zh)
+
+    def test_keywords_are_cut_to_the_column_length(self):
+        keywords = ', '.join(f'keyword{i}' for i in range(40))
+        metadata = json.dumps(dict(json.loads(self.metadata), keywords_en=keywords))
+        with mock.patch('digests.postproduction.generate_metadata', return_value=metadata):
+            digest = run_post_production(date(2025, 5, 1), with_audio=False)
+        self.assertLessEqual(len(digest.keywords_en), 255)
+        self.assertTrue(keywords.startswith(digest.keywords_en))
+        self.assertTrue(digest.keywords_en.endswith('keyword22, keyword23'))
+
+
+class StoryRecordTestCase(SimpleTestCase):
+    research = (
+        "**STORY 1:** Anthropic ships a new model\n"
+        "SOURCE: The Verge - https://www.theverge.com/a | b\n"
+        "DATE: 2025-05-01\n"
+        "SUMMARY: Anthropic released a model.\n"
+        "It is faster.\n"
+        "IMPACT: Cheaper agents.\n"
+        "---\n"
+        "STORY: Old news resurfaces\n"
+        "DATE: 2025-04-01\n"
+    )
+
+    def test_parse_serialize_and_validate(self):
+        stories = parse_stories(self.research)
+        self.assertEqual([s.rank for s in stories], [1, None])
+        self.assertEqual(stories[0].summary, 'Anthropic released a model. It is faster.')
+        self.assertEqual(stories[0].publication, 'The Verge')
+        self.assertEqual(stories[0].url, 'https://www.theverge.com/a')
+
+        compact = serialize_stories(stories)
+        self.assertEqual(compact.splitlines()[1],
+                         '1|Anthropic ships a new model|The Verge - https://www.theverge.com/a / b|2025-05-01|'
+                         'Anthropic released a model. It is faster.|Cheaper agents.')
+        self.assertEqual(parse_stories(format_stories(stories, numbered=True))[1].rank, 2)
+
+        validation = validate_stories(stories, expected_stories=2, target_date='2025-05-01')
+        self.assertFalse(validation['valid'])
+        self.assertEqual(validation['missing_sources'], [2])
+        self.assertEqual(validation['stale_stories'], [2])
+
+    def test_structured_prioritizer_uses_ids(self):
+        stories = [Story(headline=f'Story {i}', source='Wired', summary='s') for i in range(1, 13)]
+        with mock.patch.object(agents_pipeline_v3, 'run_anthropic_chat', return_value='12, 3, 3, 99') as chat:
+            selected = agents_pipeline_v3.prioritize_stories(stories, '2025-05-01')
+        self.assertEqual([s.headline for s in selected[:3]], ['Story 12', 'Story 3', 'Story 1'])
+        self.assertEqual(len(selected), 10)
+        self.assertIsNone(chat.call_args.kwargs['tools'])
+
+
+class LocalRankerTestCase(SimpleTestCase):
+    def story(self, headline, source='TechCrunch - https://techcrunch.com/x', published='2025-05-01'):
+        return Story(headline=headline, source=source, date=published, summary='s', impact='i')
+
+    def test_ranks_excludes_and_dedupes(self):
+        stories = [
+            self.story('Tiny blog covers model release', source='Some Blog'),
+            self.story('Tesla adds AI to cars'),
+            self.story('OpenAI ships GPT update', published='2025-04-20'),
+            self.story('Anthropic launches Claude feature'),
+            self.story('Anthropic launches new Claude feature'),
+        ] + [self.story(headline) for headline in [
+            'Nvidia earnings beat forecasts', 'Microsoft opens Copilot APIs', 'Apple buys speech startup',
+            'IBM releases Granite weights', 'Oracle expands GPU cloud', 'Intel delays Falcon Shores',
+            'Samsung unveils HBM4 memory', 'Cohere raises Series E', 'Mistral debuts coding model',
+            'Adobe adds video generation',
+        ]]
+
+        result = rank_stories(stories, '2025-05-01')
+        headlines = [s.headline for s in result.stories]
+        self.assertEqual(len(headlines), 10)
+        self.assertEqual(headlines[0], 'Anthropic launches Claude feature')
+        self.assertNotIn('Tiny blog covers model release', headlines)
+        reasons = {s.headline: reason for s, reason in result.excluded}
+        self.assertEqual(reasons['Tesla adds AI to cars'], 'excluded company')
+        self.assertEqual(reasons['OpenAI ships GPT update'], 'outside 24-hour window')
+        self.assertEqual(reasons['Anthropic launches new Claude feature'], 'duplicate')
+        self.assertEqual(result.confidence, 1.0)
+
+    def test_low_confidence_when_short_of_stories(self):
+        result = rank_stories([self.story('Only story', source='Unknown')], '2025-05-01')
+        self.assertLess(result.confidence, MIN_CONFIDENCE)
+
+    def test_local_prioritizer_falls_back_when_short_of_stories(self):
+        research = format_stories([self.story(f'Eligible story {i}') for i in range(6)]
+                                  + [self.story('Stale story', published='2025-04-20')], separator='\n---\n')
+        stage = next(s for s in agents_pipeline_v3.v3_stages('2025-05-01', prioritizer='local', debug=False)
+                     if s.name == 'prioritize')
+        full_list = fake_story_blocks(10, numbered=True)
+        with mock.patch.object(agents_pipeline_v3, 'prioritize_and_filter', return_value=full_list) as llm:
+            summary = stage.run(research, research)
+        llm.assert_called_once_with(research, '2025-05-01')
+        self.assertEqual(len(parse_stories(summary)), 10)
+
+
+class StoryDedupTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+
+    def test_clusters_within_run_and_checks_recent_episodes(self):
+        DailyDigest.objects.create(
+            date=date(2025, 4, 30),
+            summary_text_en=(
+                "Hello world… welcome back to Apes On Knowledge.\n"
+                "Nvidia unveils Blackwell Ultra GPUs\n"
+                "The Verge reports that Nvidia unveiled Blackwell Ultra GPUs at its developer conference, "
+                "promising faster inference for large language models across cloud providers."
+            ),
+        )
+        stories = [
+            Story(headline='Meta releases Llama 5 open weights', source='TechCrunch',
+                  summary='Meta released Llama 5 with open weights and a larger context window.'),
+            Story(headline='Meta releases Llama 5 with open weights', source='The Verge - https://theverge.com/llama5',
+                  summary='Meta released Llama 5 with open weights and a larger context window.'),
+            Story(headline='Nvidia unveils Blackwell Ultra GPUs', source='Bloomberg',
+                  summary='Nvidia unveiled Blackwell Ultra GPUs promising faster inference for large language models.'),
+        ]
+
+        history = load_story_history(date(2025, 5, 1), path=os.path.join(self.tmpdir, 'index.json'))
+        self.assertEqual(history.indexed_dates, {'2025-04-30'})
+        kept, dropped = dedupe_stories(stories, history)
+
+        self.assertEqual([s.source for s in kept], ['The Verge - https://theverge.com/llama5'])
+        self.assertEqual(len(dropped), 2)
+        self.assertIn('covered on 2025-04-30', dropped[1][1])
+
+        reloaded = StoryHistoryIndex.load(os.path.join(self.tmpdir, 'index.json'))
+        self.assertEqual(len(reloaded.sections), len(history.sections))
+
+    def test_history_matches_only_episodes_before_the_target_date(self):
+        llama = Story(headline='Meta releases Llama 5 open weights', source='TechCrunch',
+                      summary='Meta released Llama 5 with open weights and a larger context window.')
+        # The prioritized STORY list is indexed when the episode kept it
+        DailyDigest.objects.create(date=date(2025, 5, 2), summary_text_en='Hello world script',
+                                   llm_response_raw={'summary': llama.to_block(1)})
+        path = os.path.join(self.tmpdir, 'index.json')
+        later = load_story_history(date(2025, 5, 3), path=path)
+        self.assertIn('covered on 2025-05-02', dedupe_stories([llama], later)[1][0][1])
+
+        # A backfill of an earlier date reuses the persisted index, which already holds 2025-05-02
+        earlier = load_story_history(date(2025, 5, 1), path=path)
+        self.assertIn('2025-05-02', earlier.indexed_dates)
+        self.assertEqual(dedupe_stories([llama], earlier), ([llama], []))
+
+    def test_regenerated_episode_replaces_its_entries(self):
+        llama = Story(headline='Meta releases Llama 5 open weights', source='TechCrunch',
+                      summary='Meta released Llama 5 with open weights and a larger context window.')
+        nvidia = Story(headline='Nvidia unveils Blackwell Ultra GPUs', source='Bloomberg',
+                       summary='Nvidia unveiled Blackwell Ultra GPUs promising faster inference for large language models.')
+        digest = DailyDigest.objects.create(date=date(2025, 5, 2), summary_text_en='Hello world script',
+                                            llm_response_raw={'summary': llama.to_block(1)})
+        path = os.path.join(self.tmpdir, 'index.json')
+        first = load_story_history(date(2025, 5, 3), path=path)
+        self.assertEqual(dedupe_stories([nvidia], first), ([nvidia], []))
+
+        digest.summary_text_en = 'Hello world regenerated script'
+        digest.llm_response_raw = {'summary': nvidia.to_block(1)}
+        digest.save()
+
+        refreshed = load_story_history(date(2025, 5, 3), path=path)
+        self.assertEqual(dedupe_stories([llama], refreshed), ([llama], []))
+        self.assertIn('covered on 2025-05-02', dedupe_stories([nvidia], refreshed)[1][0][1])
+        self.assertEqual(StoryHistoryIndex.load(path).sections, refreshed.sections)
+
+
+class SearchViewTestCase(APITestCase):
+    def setUp(self):
+        for day, title, script, script_zh in [
+            (1, 'Llama 5 ships', 'Meta released Llama 5 with open weights today.', '今天Meta发布了开放权重的Llama 5模型。'),
+            (2, 'Chip export rules', 'New export rules target AI accelerators.', '新的出口规则针对人工智能加速器。'),
+            (3, 'Llama 5 benchmarks', 'Independent labs benchmarked Llama 5 against rivals.', '独立实验室对Llama 5进行了基准测试。'),
+        ]:
+            DailyDigest.objects.create(
+                date=date(2025, 5, day), title_en=title, description_en=title, summary_text_en=script,
+                summary_text_zh=script_zh, llm_prompt='prompt',
+            )
+
+    def test_cjk_bigrams(self):
+        self.assertEqual(cjk_bigrams('人工智能 AI'), '人工 工智 智能 ai')
+
+    def test_search_filters_by_date_and_language(self):
+        response = self.client.get(reverse('search'), {'q': 'Llama', 'end': '2025-05-02'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['date'] for r in response.data['results']], ['2025-05-01'])
+        self.assertIn('Llama 5', response.data['results'][0]['snippet'])
+
+        response = self.client.get(reverse('search'), {'q': '出口规则', 'lang': 'zh'})
+        self.assertEqual([r['date'] for r in response.data['results']], ['2025-05-02'])
+
+        response = self.client.get(reverse('search'), {'q': 'Llama', 'start': '2025-05-03', 'end': '2025-05-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TokenBudgetTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+
+    def test_max_tokens_follow_history_and_truncation(self):
+        history = OutputHistory(os.path.join(self.tmpdir, 'tokens.json'))
+        self.assertEqual(history.suggest_max_tokens('script', 8192), 8192)
+        for tokens in [2000, 2100, 2200, 2300, 2400]:
+            history.record('script', tokens)
+        self.assertEqual(history.suggest_max_tokens('script', 8192), 4096)
+        history.record('script', 4096, truncated=True)
+        reloaded = OutputHistory(history.path)
+        self.assertEqual(reloaded.suggest_max_tokens('script', 8192), 8192)
+
+    def test_workers_sharing_the_history_keep_each_others_records(self):
+        path = os.path.join(self.tmpdir, 'tokens.jsonl')
+        first, second = OutputHistory(path), OutputHistory(path)
+        for tokens in [2000, 2100, 2200]:
+            first.record('script', tokens)
+            second.record('script', tokens + 50)
+        # Neither worker overwrote the other: both see all six outputs
+        self.assertEqual(first.suggest_max_tokens('script', 8192), 3072)
+        self.assertEqual(len(second._refresh()['script']['outputs']), 6)
+
+    def test_log_is_compacted_to_the_retained_history(self):
+        history = OutputHistory(os.path.join(self.tmpdir, 'tokens.jsonl'), max_bytes=2000)
+        for tokens in range(100):
+            history.record('script', 2000 + tokens)
+        history.record('script', 8192, truncated=True)
+        self.assertLess(os.path.getsize(history.path), 4000)
+        reloaded = OutputHistory(history.path)
+        self.assertEqual(reloaded.suggest_max_tokens('script', 8192), history.suggest_max_tokens('script', 8192))
+        self.assertEqual(reloaded._refresh()['script']['truncated'], 1)
+
+    def test_compaction_drops_impact_then_trims_but_keeps_story_count(self):
+        stories = [
+            Story(headline=f'Story {word} happened', source=f'Outlet {i}', date='2025-05-01',
+                  summary='First sentence here. ' + 'Second sentence is long. ' * 20, impact='Matters a lot. ' * 10)
+            for i, word in enumerate(['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta',
+                                      'eta', 'theta', 'iota', 'kappa', 'lambda', 'mu'])
+        ]
+        text = format_stories(stories, numbered=True, separator='\n---\n')
+        compacted, steps = compact_stories(text, budget_tokens=400)
+        self.assertEqual(steps, ['dropped impact', 'trimmed summaries to 2 sentences'])
+        self.assertLessEqual(estimate_tokens(compacted), 400)
+
+        # Never below ten stories, even if the budget is still exceeded
+        compacted, steps = compact_stories(text, budget_tokens=300)
+        self.assertEqual(steps[-1], 'dropped 2 trailing stories')
+        parsed = parse_stories(compacted)
+        self.assertEqual(len(parsed), 10)
+        self.assertEqual(parsed[0].rank, 1)
+        self.assertEqual(compact_stories(text, budget_tokens=10 ** 6), (text, []))
+
+
+class RateLimiterTestCase(SimpleTestCase):
+    def test_bucket_wait_times(self):
+        bucket = TokenBucket(per_minute=60)
+        bucket.level = 0
+        self.assertAlmostEqual(bucket.wait_time(3), 3.0)
+        # Requests larger than the bucket only wait for a full one
+        self.assertAlmostEqual(bucket.wait_time(600), 60.0)
+
+    def test_acquire_blocks_when_budget_spent_and_settles_usage(self):
+        limiter = RateLimiter(rpm=0, tpm=6000)
+        self.assertFalse(limiter.requests)
+        self.assertLess(limiter.acquire(tokens=6000), 0.1)
+        with self.assertRaises(TimeoutError):
+            limiter.acquire(tokens=3000, timeout=1)
+        limiter.settle(estimated_tokens=6000, actual_tokens=3000)
+        self.assertLess(limiter.acquire(tokens=2000, timeout=1), 0.1)
+        self.assertFalse(RateLimiter().enabled)
+
+    def test_prioritizer_window_follows_target_date(self):
+        content = agents_pipeline_v3.prompt_text(agents_pipeline_v3.prioritize_messages('research', '2025-03-02'))
+        self.assertIn('Only stories from 2025-03-02 or 2025-03-01', content)
+
+
+class ResilientCallTestCase(SimpleTestCase):
+    """Transient failures are modelled as ConnectionError so no SDK response objects are needed"""
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+        patcher = mock.patch.object(agents_resilience, 'is_retryable', lambda exc: isinstance(exc, ConnectionError))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_retryable_errors_then_opens_circuit(self):
+        calls = []
+
+        def flaky(timeout):
+            calls.append(timeout)
+            if len(calls) == 1:
+                raise ConnectionError('reset')
+            return 'ok'
+
+        sleeps = []
+        self.assertEqual(resilient_call('script', flaky, breaker=self.breaker, sleep=sleeps.append), 'ok')
+        self.assertEqual(len(calls), 2)
+        self.assertLessEqual(calls[0], 180)
+        self.assertEqual(len(sleeps), 1)
+
+        def always_down(timeout):
+            raise ConnectionError('overloaded')
+
+        # The breaker opens after the second consecutive failure and cuts the retries short
+        with self.assertRaises(CircuitOpenError):
+            resilient_call('script', always_down, breaker=self.breaker, sleep=lambda s: None)
+        self.assertEqual(self.breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            resilient_call('script', flaky, breaker=self.breaker)
+
+    def test_non_retryable_errors_are_not_retried(self):
+        calls = []
+
+        def bad_request(timeout):
+            calls.append(timeout)
+            raise ValueError('bad request')
+
+        with self.assertRaises(ValueError):
+            resilient_call('script', bad_request, breaker=self.breaker)
+        self.assertEqual(len(calls), 1)
+
+    def test_local_errors_leave_the_breaker_alone(self):
+        self.breaker.record_failure()
+
+        def broken(timeout):
+            raise KeyError('bug in the caller')
+
+        # A programming error is not an API answer, so it does not reset the failure count
+        with self.assertRaises(KeyError):
+            resilient_call('script', broken, breaker=self.breaker)
+        self.assertEqual(self.breaker.failures, 1)
+
+    def test_rate_limit_wait_happens_before_the_timeout_is_computed(self):
+        clock = [1000.0]
+        timeouts = []
+
+        def acquire():
+            clock[0] += 100  # queued behind the shared limiter
+
+        with mock.patch.object(agents_resilience.time, 'monotonic', lambda: clock[0]):
+            resilient_call('script', lambda timeout: timeouts.append(timeout), breaker=self.breaker,
+                           acquire=acquire)
+            self.assertEqual(timeouts, [80.0])
+            # A wait that uses up the deadline fails before the request is sent
+            with self.assertRaises(TimeoutError):
+                resilient_call('script', timeouts.append, breaker=self.breaker, deadline=100, acquire=acquire)
+        self.assertEqual(timeouts, [80.0])
+
+    def test_hedges_slow_research_call(self):
+        tracker = LatencyTracker()
+        for _ in range(5):
+            tracker.record('research', 0.05)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        calls = []
+
+        def slow_then_fast(timeout):
+            calls.append(timeout)
+            if len(calls) == 1:
+                release.wait(5)
+                return 'slow'
+            return 'fast'
+
+        with mock.patch.object(agents_resilience, 'latency_tracker', tracker):
+            result = resilient_call('research', slow_then_fast, hedge=True, breaker=self.breaker)
+        self.assertEqual(result, 'fast')
+        self.assertEqual(len(calls), 2)
+
+
+class PipelineMetricsTestCase(APITestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.store = MetricsStore(os.path.join(self.tmpdir, 'metrics.jsonl'))
+
+    def test_summary_and_prometheus_endpoint(self):
+        usage = mock.Mock(input_tokens=1200, output_tokens=800, server_tool_use=mock.Mock(web_search_requests=3))
+        response = mock.Mock(usage=usage, stop_reason='end_turn', content=[])
+        for seconds in (10, 20, 30):
+            self.store.record_call('research', seconds, 'model', response)
+            self.store.record_stage('research', seconds + 1)
+        self.store.record_call('research', 0.01, 'model', cached=True)
+        self.store.record_stage('script', 0, reused=True)
+
+        summary = summarize(self.store.read())
+        self.assertEqual(summary['research']['calls'], 3)
+        self.assertEqual(summary['research']['cached_calls'], 1)
+        self.assertEqual(summary['research']['p50_seconds'], 21)
+        self.assertEqual(summary['research']['p95_seconds'], 31)
+        self.assertEqual(summary['research']['input_tokens'], 3600)
+        self.assertEqual(summary['research']['web_searches'], 9)
+        self.assertEqual(summary['script']['reused'], 1)
+
+        with mock.patch('digests.views.metrics_store', self.store):
+            response = self.client.get(reverse('metrics'), HTTP_ACCEPT='text/plain')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('aok_stage_duration_seconds{stage="research",quantile="0.95"} 31', body)
+        self.assertIn('aok_llm_stop_reasons{stage="research",stop_reason="end_turn"} 3', body)
+
+    def test_log_rotates_by_size_and_reads_stay_bounded(self):
+        store = MetricsStore(os.path.join(self.tmpdir, 'rotating.jsonl'), max_bytes=200, backups=2)
+        for seconds in range(40):
+            store.record_stage('research', seconds)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['rotating.jsonl', 'rotating.jsonl.1', 'rotating.jsonl.2'])
+        records = store.read()
+        self.assertLess(len(records), 40)
+        self.assertEqual(records[-1]['seconds'], 39)
+        self.assertEqual([r['seconds'] for r in records], sorted(r['seconds'] for r in records))
+        self.assertEqual(store.read(since=time.time() + 60), [])
+
+
+def fake_story_blocks(count, numbered=False):
+    return '\n\n'.join(
+        f"STORY{' ' + str(i) if numbered else ''}: Lab {i} ships model {i}\n"
+        f"SOURCE: TechCrunch - https://techcrunch.com/{i}\nDATE: 2025-05-01\n"
+        f"SUMMARY: Lab {i} released model {i}.\nIMPACT: Practitioners get option {i}."
+        for i in range(1, count + 1)
+    )
+
+
+def fake_script(count, cited=True):
+    """A script in the writer's real format: bare headline lines, two paragraphs each"""
+    lead = 'TechCrunch reports that' if cited else 'This week,'
+    return '\n'.join(
+        ['Hello world… welcome back to Apes On Knowledge. I\'m your host, A-OK Newsbot.']
+        + [f"Lab {i} ships model {i}\n{lead} Lab {i} released model {i}.\nPractitioners get option {i}."
+           for i in range(1, count + 1)]
+        + ["Across today's stories, we see faster releases.", 'Until tomorrow, this is A-OK Newsbot… signing off.']
+    )
+
+
+class FakeMessages:
+    """Canned stage answers keyed off the prompt, standing in for the live API.
+
+    Prompt caching is emulated: the blocks up to the last cache_control
+    breakpoint are written to the cache on first sight and read afterwards,
+    unless they are shorter than the model's minimum cacheable prefix.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.prompt_cache = set()
+
+    def cache_usage(self, blocks, model):
+        marked = [i for i, block in enumerate(blocks) if block.get('cache_control')]
+        if not marked:
+            return 0, 0
+        prefix = ''.join(block['text'] for block in blocks[:marked[-1] + 1])
+        if estimate_tokens(prefix) < agents_client.prompt_cache_min_tokens(model):
+            return 0, 0
+        if prefix in self.prompt_cache:
+            return estimate_tokens(prefix), 0
+        self.prompt_cache.add(prefix)
+        return 0, estimate_tokens(prefix)
+
+    def create(self, **request):
+        self.requests.append(request)
+        content = request['messages'][0]['content']
+        cache_read, cache_write = self.cache_usage(content, request['model']) if isinstance(content, list) else (0, 0)
+        prompt = agents_pipeline_v3.prompt_text(request['messages'])
+        if 'Research Agent' in prompt:
+            text = fake_story_blocks(15)
+        elif 'Select EXACTLY 10' in prompt:
+            text = fake_story_blocks(10, numbered=True)
+        else:
+            text = fake_script(10)
+        return SimpleNamespace(
+            content=[SimpleNamespace(type='text', text=text)],
+            usage=SimpleNamespace(input_tokens=100, output_tokens=200, server_tool_use=None,
+                                  cache_read_input_tokens=cache_read, cache_creation_input_tokens=cache_write),
+            stop_reason='end_turn',
+        )
+
+
+class FakeClient:
+    def __init__(self):
+        self.messages = FakeMessages()
+
+    def with_options(self, **options):
+        return self
+
+
+class PromptCachingTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.store = MetricsStore(os.path.join(self.tmpdir, 'metrics.jsonl'))
+        for target, attribute, value in [
+            (agents_pipeline_v3.response_cache, 'enabled', False),
+            (agents_client, 'metrics_store', self.store),
+            (agents_client, 'output_history', OutputHistory(os.path.join(self.tmpdir, 'tokens.json'))),
+            (agents_client, 'anthropic_client', FakeClient()),
+        ]:
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_stable_prefix_is_written_once_then_read(self):
+        # Instructions long enough for the minimum cacheable prefix on every tier
+        instructions = 'Write one story of the podcast script. ' * 300
+        first = agents_pipeline_v3.cached_prompt(instructions, 'Story 1 of 10')
+        second = agents_pipeline_v3.cached_prompt(instructions, 'Story 2 of 10')
+        static, variable = first[0]['content']
+        self.assertEqual(static['cache_control'], {'type': 'ephemeral'})
+        self.assertNotIn('cache_control', variable)
+        self.assertEqual(static, second[0]['content'][0])
+
+        for messages in (first, second):
+            agents_client.run_anthropic_chat(messages, max_tokens=1024, stage='script', tools=None)
+        calls = [r for r in self.store.read() if r['kind'] == 'call']
+        prefix_tokens = estimate_tokens(static['text'])
+        self.assertEqual([(c['cache_write_tokens'], c['cache_read_tokens']) for c in calls],
+                         [(prefix_tokens, 0), (0, prefix_tokens)])
+        summary = summarize(self.store.read())['script']
+        self.assertEqual((summary['cache_write_tokens'], summary['cache_read_tokens']), (prefix_tokens, prefix_tokens))
+
+    def test_marked_prefixes_reach_the_model_minimum(self):
+        # Anthropic silently ignores a breakpoint on a shorter prefix, so none may be sent
+        script, research = fake_script(10), fake_story_blocks(15)
+        stories = parse_stories(research)
+        section = agents_validation.split_script(script)[1]
+        prompts = [
+            ('research', agents_pipeline_v3.research_messages('2025-05-01')),
+            ('prioritize', agents_pipeline_v3.prioritize_messages(research, '2025-05-01')),
+            ('prioritize', agents_repair.more_stories_messages(stories, 2, '2025-05-01', research)),
+            ('prioritize', agents_repair.fix_stories_messages(stories, {0: [agents_repair.CITE_FIX]})),
+            ('script', agents_pipeline_v3.script_messages(research, '2025-05-01')),
+            ('script', agents_writer.story_messages(stories[0], 1, 10)),
+            ('script', agents_writer.closing_messages(stories)),
+            ('editorial', agents_pipeline_v3.editorial_messages(script)),
+            ('editorial', agents_editor.section_edit_messages(section, ['Fix the citation'])),
+            ('metadata', agents_pipeline_v3.metadata_messages(script, '2025-05-01')),
+            ('translate', agents_pipeline_v3.translation_messages(script)),
+        ]
+        client = agents_client.anthropic_client
+        for stage, messages in prompts:
+            for model in MODEL_TIERS.values():
+                agents_client.run_anthropic_chat(messages, model=model, max_tokens=1024, stage=stage, tools=None)
+
+        for request in client.messages.requests:
+            prefix = 0
+            for block in request['messages'][0]['content']:
+                prefix += estimate_tokens(block['text'])
+                if 'cache_control' in block:
+                    self.assertGreaterEqual(prefix, agents_client.prompt_cache_min_tokens(request['model']))
+
+
+class ModelTieringTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.store = MetricsStore(os.path.join(self.tmpdir, 'metrics.jsonl'))
+        self.client = FakeClient()
+        create = self.client.messages.create
+
+        def small_model_drops_stories(**request):
+            # Every answer passes validation, except the small model's prioritizer picking only 8
+            response = create(**request)
+            prompt = agents_pipeline_v3.prompt_text(request['messages'])
+            if 'Research Agent' in prompt or 'Select EXACTLY 10' in prompt:
+                count = 15 if 'Research Agent' in prompt else 10
+                if request['model'] == MODEL_TIERS['small'] and 'Select EXACTLY 10' in prompt:
+                    count = 8
+                response.content[0].text = fake_story_blocks(count, numbered=True).replace(
+                    'SUMMARY: ', 'SUMMARY: TechCrunch reports that ')
+            elif request['model'] == MODEL_TIERS['small'] and self.small_editor_drops_story:
+                response.content[0].text = fake_script(9)
+            return response
+
+        self.small_editor_drops_story = False
+        self.client.messages.create = small_model_drops_stories
+        for target, attribute, value in [
+            (agents_pipeline_v3.response_cache, 'enabled', False),
+            (agents_client, 'output_history', OutputHistory(os.path.join(self.tmpdir, 'tokens.json'))),
+            (agents_client, 'anthropic_client', self.client),
+            (agents_tiering, 'metrics_store', self.store),
+        ]:
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_escalates_only_the_stage_that_fails_validation(self):
+        episode = agents_pipeline_v3.generate_episode_v3('2025-05-01', debug=False, tiering=True)
+        self.assertTrue(episode['validations']['summary']['valid'])
+
+        self.assertEqual([request['model'] for request in self.client.messages.requests],
+                         [MODEL_TIERS['large'], MODEL_TIERS['small'], MODEL_TIERS['large'],
+                          MODEL_TIERS['large'], MODEL_TIERS['small']])
+
+        tiers = {stage: entry['tiers'] for stage, entry in summarize(self.store.read()).items()}
+        self.assertEqual(tiers['prioritize']['small']['pass_rate'], 0)
+        self.assertEqual(tiers['prioritize']['large']['pass_rate'], 1)
+        self.assertEqual(set(tiers['editorial']), {'small'})
+        self.assertEqual(set(tiers['research']), {'large'})
+
+    def test_script_stages_are_validated_by_headline_sections(self):
+        # Scripts have bare headlines, no "STORY N:" markers; a full script passes
+        # on the small tier and one missing a story escalates
+        self.assertEqual(validate_output(fake_script(10))['story_count'], 0)
+        self.assertTrue(validate_script(fake_script(10))['valid'])
+
+        self.small_editor_drops_story = True
+        episode = agents_pipeline_v3.generate_episode_v3('2025-05-01', debug=False, tiering=True)
+        self.assertTrue(episode['validations']['final']['valid'])
+        self.assertEqual(episode['validations']['final']['story_count'], 10)
+        self.assertEqual([request['model'] for request in self.client.messages.requests][-2:],
+                         [MODEL_TIERS['small'], MODEL_TIERS['large']])
+        tiers = summarize(self.store.read())['editorial']['tiers']
+        self.assertEqual((tiers['small']['pass_rate'], tiers['large']['pass_rate']), (0, 1))
+
+    def test_stage_tiers_parse_and_reject_unknown_tiers(self):
+        self.assertEqual(agents_tiering.parse_stage_tiers('script=small, editorial=large'),
+                         {'script': 'small', 'editorial': 'large'})
+        with self.assertRaisesMessage(ValueError, 'Unknown model tier'):
+            agents_tiering.parse_stage_tiers('script=medium')
+        self.assertEqual(agents_tiering.escalation_path('prioritize'), ['small', 'large'])
+        self.assertEqual(agents_tiering.escalation_path('research'), ['large'])
+
+
+class SharedClientTestCase(SimpleTestCase):
+    def test_v1_and_v2_calls_go_through_the_shared_cached_client(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        client = FakeClient()
+        cache = ResponseCache(os.path.join(tmpdir, 'cache'))
+        with mock.patch.object(agents_client, 'anthropic_client', client), \
+                mock.patch.object(agents_client, 'response_cache', cache), \
+                mock.patch.object(agents_client, 'output_history', OutputHistory(os.path.join(tmpdir, 't.json'))):
+            agents_pipeline.generate_episode('2025-05-01')
+            agents_pipeline.generate_episode('2025-05-01')
+            agents_pipeline_v2.generate_episode_v2('2025-05-01', debug=False)
+
+        self.assertEqual(cache.hits, 4)
+        self.assertEqual([request['max_tokens'] for request in client.messages.requests],
+                         [4096] * 4 + [8192, 6144, 8192, 8192])
+        self.assertTrue(all(request['tools'] == agents_client.WEB_SEARCH_TOOLS for request in client.messages.requests))
+
+    def test_transport_scope_reaches_stage_and_fan_out_threads(self):
+        client = FakeClient()
+        with use_transport(client, cache=False, history=False), capture_metrics() as records:
+            agents_pipeline_v3.generate_episode_v3('2025-05-01', debug=False, writer='parallel', editor='parallel')
+        # research + prioritize + 10 stories and the closing + 10 story polishes
+        self.assertEqual(len(client.messages.requests), 23)
+        calls = summarize(records)
+        self.assertEqual((calls['script']['calls'], calls['editorial']['calls']), (11, 10))
+        self.assertEqual(calls['editorial']['runs'], 1)
+
+
+class FakeAsyncMessages:
+    """FakeMessages behind the async client API, with metadata and translation answers.
+
+    Each request takes *delay* seconds; the peak number in flight is kept.
+    """
+
+    def __init__(self, delay=0.05, failures=0):
+        self.sync = FakeMessages()
+        self.delay = delay
+        self.failures = failures
+        self.in_flight = self.peak = 0
+
+    @property
+    def requests(self):
+        return self.sync.requests
+
+    async def create(self, **request):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError('reset')
+            response = self.sync.create(**request)
+        finally:
+            self.in_flight -= 1
+        prompt = agents_pipeline_v3.prompt_text(request['messages'])
+        if 'Return ONLY a JSON object' in prompt:
+            response.content[0].text = PostProductionTestCase.metadata
+        elif 'Translate the podcast script' in prompt:
+            response.content[0].text = '你好世界，欢迎收听今天的人工智能新闻'
+        return response
+
+
+class FakeAsyncClient:
+    def __init__(self, **options):
+        self.messages = FakeAsyncMessages(**options)
+
+    def with_options(self, **options):
+        return self
+
+
+class AsyncPipelineTestCase(APITestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.client_fake = FakeAsyncClient()
+        for target, attribute, value in [
+            (agents_pipeline_v3.response_cache, 'enabled', False),
+            (agents_client, 'output_history', OutputHistory(os.path.join(self.tmpdir, 'tokens.json'))),
+            (agents_pipeline_async, 'async_anthropic_client', self.client_fake),
+            # Transient failures are modelled as ConnectionError, retried without waiting
+            (agents_resilience, 'is_retryable', lambda exc: isinstance(exc, ConnectionError)),
+            (agents_resilience, 'backoff_delay', lambda attempt: 0),
+        ]:
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_episode_goes_through_the_shared_call_layer(self):
+        self.client_fake.messages.failures = 1
+        with capture_metrics() as records, \
+                mock.patch.object(agents_pipeline_async, 'compact_stage_input',
+                                  wraps=agents_pipeline_async.compact_stage_input) as compact:
+            episode = asyncio.run(agents_pipeline_async.generate_episode_async(
+                '2025-05-01', metadata=True, translate=True))
+
+        self.assertTrue(episode['validations']['final']['valid'])
+        self.assertEqual(episode['metadata']['title_zh'], '模型发布')
+        self.assertTrue(episode['validations']['translation']['valid'])
+        self.assertEqual([c.args[0] for c in compact.call_args_list], ['prioritize', 'script'])
+        # The first research attempt failed and was retried by resilient_call_async
+        calls = summarize(records)
+        self.assertEqual({stage: calls[stage]['calls'] for stage in calls},
+                         {stage: 1 for stage in agents_pipeline_v3.STAGES})
+        self.assertEqual(len(self.client_fake.messages.requests), 6)
+        # Metadata and translation were in flight together
+        self.assertEqual(self.client_fake.messages.peak, 2)
+
+    def test_token_history_is_read_off_the_event_loop(self):
+        readers = []
+        history = agents_client.output_history
+        suggest = history.suggest_max_tokens
+
+        def tracking_suggest(stage, default):
+            readers.append(threading.current_thread())
+            return suggest(stage, default)
+
+        async def run():
+            with mock.patch.object(history, 'suggest_max_tokens', tracking_suggest):
+                await agents_pipeline_async.collect_research_async('2025-05-01')
+            return threading.current_thread()
+
+        loop_thread = asyncio.run(run())
+        self.assertTrue(readers)
+        self.assertNotIn(loop_thread, readers)
+
+    def test_async_view_saves_the_episode(self):
+        response = self.client.post(reverse('generate-script-async'), {'date': '2025-05-01'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        digest = DailyDigest.objects.get(date=date(2025, 5, 1))
+        self.assertEqual(digest.summary_text_en, response.json()['script'])
+        self.assertEqual(digest.llm_response_raw['generated_via'], 'agents_pipeline_async')
+        self.assertTrue(digest.llm_response_raw['validations']['final']['valid'])
+
+
+class RecordReplayTransportTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        for target, attribute, value in [
+            (agents_pipeline_v3.response_cache, 'enabled', False),
+            (metrics_store, 'enabled', False),
+            (agents_client, 'output_history', OutputHistory(os.path.join(self.tmpdir, 'tokens.json'))),
+        ]:
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_recorded_pipeline_replays_offline(self):
+        fixtures = os.path.join(self.tmpdir, 'fixtures')
+        live = FakeClient()
+        with mock.patch.object(agents_client, 'anthropic_client', RecordingClient(live, fixtures)):
+            recorded = agents_pipeline_v3.generate_episode_v3('2025-05-01', debug=False)
+        self.assertEqual(len(live.messages.requests), 4)
+        self.assertEqual(len(os.listdir(fixtures)), 4)
+
+        with mock.patch.object(agents_client, 'anthropic_client', ReplayClient(fixtures)):
+            replayed = agents_pipeline_v3.generate_episode_v3('2025-05-01', debug=False)
+            self.assertEqual(replayed, recorded)
+            with self.assertRaises(FixtureNotFoundError):
+                agents_pipeline_v3.generate_episode_v3('2025-05-02', debug=False)
+
+
+class BenchPipelineCommandTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.fixtures = os.path.join(self.tmpdir, 'fixtures')
+        with use_transport(RecordingClient(FakeClient(), self.fixtures), cache=False, history=False), capture_metrics():
+            agents_pipeline_v3.generate_episode_v3('2025-05-01', debug=False)
+
+    def bench(self, **options):
+        call_command('bench_pipeline', date='2025-05-01', runs=2, fixtures=self.fixtures,
+                     stdout=io.StringIO(), **options)
+
+    def test_writes_results_and_flags_regressions(self):
+        output = os.path.join(self.tmpdir, 'results.json')
+        baseline = os.path.join(self.tmpdir, 'baseline.json')
+        self.bench(output=output, baseline=baseline, write_baseline=True)
+
+        with open(output) as f:
+            results = json.load(f)
+        v3 = results['pipelines']['v3']
+        self.assertEqual(set(v3['stages']), {'research', 'prioritize', 'script', 'editorial'})
+        self.assertEqual(v3['tokens_per_run']['script']['input'], 100)
+        self.assertEqual(v3['tokens_per_run']['script']['output'], 200)
+        self.assertEqual(v3['tokens_per_run']['script']['cache_write'], 0)
+        self.assertEqual(v3['total']['n'], 2)
+        self.assertGreater(v3['peak_memory_bytes']['p50'], 0)
+
+        self.bench(baseline=baseline)
+        with self.assertRaisesMessage(CommandError, 'regressions'):
+            self.bench(baseline=baseline, latency='0.1')
+
+
+class ScriptValidationTestCase(TestCase):
+    script = (
+        "Hello world… welcome back to Apes On Knowledge.\n"
+        + ''.join(f"STORY {i}: Lab {i} ships a model\nTechCrunch reports the launch on 2025-05-01!\n" for i in range(1, 11))
+        + "According to Wired, more came too. Let me search for more.\n"
+        "Until tomorrow, this is A-OK Newsbot… signing off."
+    )
+
+    def test_single_pass_scan_feeds_pipeline_and_review_checks(self):
+        found = scan(self.script)
+        self.assertEqual(found.story_markers, 10)
+        self.assertEqual(found.citation_count, 11)
+        self.assertEqual(dict(found.leakage), {'Let me search': 1})
+        self.assertEqual(found.date_mentions('2025-05-01', '2025-04-30'), 10)
+
+        validation = validate_output(self.script)
+        self.assertFalse(validation['valid'])
+        self.assertEqual(validation['issues'], ['Search process leakage detected'])
+
+        review = review_script(self.script, '2025-05-01')
+        self.assertTrue(review['has_opening'] and review['has_closing'])
+        self.assertEqual(review['score'], 80)
+
+    def test_review_command_rescores_archive(self):
+        DailyDigest.objects.create(date=date(2025, 5, 1), title_en='', description_en='',
+                                   summary_text_en=self.script.replace('Let me search for more.', ''), llm_prompt='p')
+        DailyDigest.objects.create(date=date(2025, 5, 2), title_en='', description_en='',
+                                   summary_text_en='Too short', llm_prompt='p')
+        out = io.StringIO()
+        call_command('review_pipeline_output', all=True, json=True, stdout=out)
+        reviews = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([(r['date'], r['score']) for r in reviews], [('2025-05-01', 100), ('2025-05-02', 0)])
+
+
+class IncrementalEditorTestCase(SimpleTestCase):
+    def script(self, uncited=()):
+        stories = []
+        for i in range(1, 11):
+            lead = f"Lab {i} shipped model {i} this week." if i in uncited else f"TechCrunch reports that Lab {i} shipped model {i}."
+            stories.append(f"Lab {i} ships model {i}\n{lead}\nPractitioners get another option.")
+        return (
+            "Hello world… welcome back to Apes On Knowledge, I'm your host, A-OK Newsbot.\n"
+            + "\n".join(stories)
+            + "\nAcross today's stories, we see faster releases.\nUntil tomorrow, this is A-OK Newsbot… signing off."
+        )
+
+    def test_splits_into_intro_stories_and_outro(self):
+        sections = agents_editor.split_script(self.script())
+        self.assertEqual([s.kind for s in sections], ['intro'] + ['story'] * 10 + ['outro'])
+        self.assertEqual(sections[3].headline, 'Lab 3 ships model 3')
+        self.assertEqual(agents_editor.join_sections(sections), self.script())
+
+    def test_spoken_lines_and_sign_offs_are_not_headlines(self):
+        script = '\n'.join([
+            "Hello world… welcome back to Apes On Knowledge.",
+            "Let's dive in",  # followed by a headline, not a paragraph
+            "Lab 1 ships model 1",
+            "TechCrunch reports that Lab 1 shipped model 1.",
+            "And in other news,",  # a run-on phrase
+            "Practitioners get another option.",
+            "Lab 2 ships model 2",
+            "Wired reports that Lab 2 shipped model 2.",
+            "Thanks for listening",  # a sign-off with nothing after it
+        ])
+        sections = agents_validation.split_script(script)
+        self.assertEqual([s.headline for s in sections if s.kind == 'story'],
+                         ['Lab 1 ships model 1', 'Lab 2 ships model 2'])
+        self.assertEqual(sections[0].lines, ["Hello world… welcome back to Apes On Knowledge.", "Let's dive in"])
+        self.assertIn('And in other news,', sections[1].lines)
+        self.assertEqual(sections[2].lines[-1], 'Thanks for listening')
+        self.assertFalse(agents_validation.is_headline('Lab 3 ships model 3'))
+        self.assertTrue(agents_validation.is_headline('## Lab 3 ships model 3'))
+
+    def test_only_flagged_sections_are_sent_and_spliced_back(self):
+        chat = mock.Mock(return_value='Lab 4 ships model 4\nWired reports that Lab 4 shipped model 4.\nPractitioners get another option.')
+        with mock.patch.object(agents_editor, 'run_anthropic_chat', chat):
+            self.assertEqual(agents_editor.incremental_editorial_review(self.script()), self.script())
+            chat.assert_not_called()
+
+            edited = agents_editor.incremental_editorial_review(self.script(uncited={4}))
+        self.assertEqual(chat.call_count, 1)
+        prompt = agents_pipeline_v3.prompt_text(chat.call_args[0][0])
+        self.assertIn('Previous story: Lab 3 ships model 3', prompt)
+        self.assertNotIn('Lab 7', prompt)
+        self.assertIn('Wired reports that Lab 4', edited)
+        self.assertEqual(edited.replace('Wired reports that Lab 4 shipped model 4.', ''),
+                         self.script(uncited={4}).replace('Lab 4 shipped model 4 this week.', ''))
+
+    def test_wrong_story_count_falls_back_to_full_review(self):
+        with mock.patch.object(agents_editor, 'editorial_review', return_value='full') as full:
+            self.assertEqual(agents_editor.incremental_editorial_review(self.script(), expected_stories=9), 'full')
+        full.assert_called_once()
+
+
+class ParallelScriptWriterTestCase(SimpleTestCase):
+    def fake_chat(self, messages, **kwargs):
+        time.sleep(0.1)
+        prompt = agents_pipeline_v3.prompt_text(messages)
+        if 'closing analysis' in prompt:
+            return "Across today's stories, we see faster releases."
+        if 'Section type: story' in prompt:
+            headline = prompt.split('Section to edit:\n', 1)[1].splitlines()[0]
+            return f"{headline}\nWired reports the polished news.\nIt matters."
+        headline = parse_stories(prompt.split('Story record:\n', 1)[1])[0].headline
+        return f"{headline}\nTechCrunch reports the news.\nIt matters to practitioners."
+
+    def test_stories_and_closing_are_written_concurrently_and_stitched_in_order(self):
+        chat = mock.Mock(side_effect=self.fake_chat)
+        started = time.monotonic()
+        with mock.patch.object(agents_writer, 'run_anthropic_chat', chat):
+            script = agents_writer.write_script_parallel(fake_story_blocks(10, numbered=True))
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(chat.call_count, 11)
+
+        lines = script.splitlines()
+        self.assertEqual(lines[0], agents_writer.INTRO)
+        self.assertEqual(lines[-1], agents_writer.SIGNOFF)
+        self.assertEqual(lines[1], 'Lab 1 ships model 1')
+        self.assertEqual(lines[-5], 'Lab 10 ships model 10')
+
+        sections = agents_editor.split_script(script)
+        self.assertEqual([s.kind for s in sections], ['intro'] + ['story'] * 10 + ['outro'])
+        self.assertTrue(validate_script(script)['valid'])
+        with mock.patch.object(agents_editor, 'run_anthropic_chat', chat):
+            edited = agents_editor.parallel_editorial_review(script)
+        self.assertEqual(chat.call_count, 21)
+        self.assertEqual(edited.count('Wired reports the polished news.'), 10)
+        self.assertTrue(edited.endswith(agents_writer.SIGNOFF))
+
+
+class RepairLoopTestCase(SimpleTestCase):
+    def shortlist(self, count, cited):
+        stories = parse_stories(fake_story_blocks(count, numbered=True))
+        for story in stories[:cited]:
+            story.summary = f"Wired reports that {story.summary}"
+        return format_stories(stories, numbered=True)
+
+    def fake_chat(self, messages, **kwargs):
+        prompt = agents_pipeline_v3.prompt_text(messages)
+        if 'Stories needed: 2' in prompt:
+            # One repeat of an existing story, which must be skipped
+            return ('STORY: Lab 3 ships model 3\nSOURCE: Wired - x\nSUMMARY: Repeat.\n\n'
+                    + fake_story_blocks(11).split('\n\n', 8)[-1].replace('SUMMARY: ', 'SUMMARY: Reuters reports that '))
+        revised = parse_stories(prompt.split('Stories to revise:', 1)[1])
+        for story in revised:
+            story.summary = f"The Verge reports that {story.summary}"
+        return '\n\n'.join(story.to_block(story.rank) for story in revised)
+
+    def test_missing_stories_and_citations_are_requested_and_merged(self):
+        output = self.shortlist(8, cited=3)
+        self.assertEqual(validate_output(output)['issues'], ['Expected 10 stories, found 8', 'Insufficient citations: 3'])
+
+        chat = mock.Mock(side_effect=self.fake_chat)
+        with mock.patch.object(agents_repair, 'run_anthropic_chat', chat):
+            repaired = agents_repair.repair_story_list(output, validate_output, target_date='2025-05-01',
+                                                       source=fake_story_blocks(15))
+        self.assertTrue(validate_output(repaired)['valid'])
+        self.assertEqual(chat.call_count, 2)
+
+        fix_prompt = next(agents_pipeline_v3.prompt_text(c.args[0]) for c in chat.call_args_list
+                          if 'Stories to revise' in agents_pipeline_v3.prompt_text(c.args[0]))
+        self.assertIn('STORY 4:', fix_prompt)
+        self.assertIn('STORY 5:', fix_prompt)
+        self.assertNotIn('STORY 6:', fix_prompt)
+        self.assertEqual([story.headline for story in parse_stories(repaired)],
+                         [f'Lab {i} ships model {i}' for i in range(1, 11)])
+
+    def test_surplus_is_trimmed_locally_and_valid_output_is_untouched(self):
+        chat = mock.Mock()
+        with mock.patch.object(agents_repair, 'run_anthropic_chat', chat):
+            trimmed = agents_repair.repair_story_list(self.shortlist(12, cited=12), validate_output)
+            valid = self.shortlist(10, cited=10)
+            self.assertEqual(agents_repair.repair_story_list(valid, validate_output), valid)
+        chat.assert_not_called()
+        self.assertEqual(len(parse_stories(trimmed)), 10)
+
+
+def mp3_frame(label: bytes, xing: bool = False) -> bytes:
+    """One MPEG-1 Layer III frame (128 kbit/s, 44.1 kHz, joint stereo) tagged with *label*"""
+    header, side_info = b'\xff\xfb\x90\x64', bytes(32)
+    body = (b'Xing' if xing else label).ljust(417 - 4 - 32, b'\x00')
+    return header + side_info + body
+
+
+def mp3_file(*labels: bytes) -> bytes:
+    id3v2 = b'ID3\x04\x00\x00\x00\x00\x00\x14' + bytes(20)
+    id3v1 = b'TAG' + bytes(125)
+    return id3v2 + mp3_frame(b'', xing=True) + b''.join(mp3_frame(label) for label in labels) + id3v1
+
+
+class ChunkedTTSTestCase(SimpleTestCase):
+    def test_parts_are_joined_frame_by_frame_without_tags(self):
+        joined = concat_mp3([mp3_file(b'a1', b'a2'), mp3_file(b'b1')])
+        self.assertEqual(joined, mp3_frame(b'a1') + mp3_frame(b'a2') + mp3_frame(b'b1'))
+
+    def test_split_text_uses_paragraph_and_cjk_sentence_boundaries(self):
+        self.assertEqual(split_text('First story.\nSecond story.\n\nThird.', max_chars=30),
+                         ['First story.\nSecond story.', 'Third.'])
+        self.assertEqual(split_text('今天的新闻很多。谷歌发布了新模型！苹果也有消息。', max_chars=10),
+                         ['今天的新闻很多。', '谷歌发布了新模型！', '苹果也有消息。'])
+
+    def test_chunks_are_synthesized_concurrently_in_order(self):
+        calls = []
+
+        def fake_synthesize(text, voice_id, api_key=None, previous_text=None, next_text=None):
+            calls.append((text, previous_text, next_text))
+            time.sleep(0.1)
+            return mp3_file(text.split()[1].encode())
+
+        script = '\n'.join(f'Paragraph {i} of the episode script.' for i in range(6))
+        started = time.monotonic()
+        with mock.patch('digests.utils.elevenlabs.synthesize', side_effect=fake_synthesize):
+            audio = synthesize_chunked(script, 'voice', max_chars=40, max_workers=6)
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(len(calls), 6)
+        self.assertEqual(audio, b''.join(mp3_frame(str(i).encode()) for i in range(6)))
+        first = next(call for call in calls if call[0].startswith('Paragraph 0'))
+        self.assertEqual(first[1:], (None, 'Paragraph 1 of the episode script.'))
+
+
+class StreamingTTSUploadTestCase(APITestCase):
+    def fake_post(self, url, **kwargs):
+        if 'elevenlabs' in url:
+            self.assertTrue(kwargs['stream'])
+            self.assertTrue(url.endswith('/stream'))
+
+            def iter_content(chunk_size):
+                for i in range(4):
+                    self.events.append('tts')
+                    yield bytes([i]) * 1000
+
+            return mock.MagicMock(iter_content=iter_content)
+
+        # Blob upload: the multipart body is a generator consumed as audio arrives
+        body = b''
+        for piece in kwargs['data']:
+            self.events.append('upload')
+            body += piece
+        boundary = kwargs['headers']['Content-Type'].split('boundary=')[1]
+        self.assertTrue(body.startswith(f'--{boundary}\r\n'.encode()))
+        self.assertTrue(body.endswith(f'\r\n--{boundary}--\r\n'.encode()))
+        self.assertIn(b''.join(bytes([i]) * 1000 for i in range(4)), body)
+        return mock.Mock(json=lambda: {'url': 'https://blob.example/tts.mp3'})
+
+    def test_audio_is_piped_into_the_upload_and_sized_on_the_fly(self):
+        self.events = []
+        env = {'ELEVEN_API_KEY': 'key', 'VERCEL_BLOB_TOKEN': 'token'}
+        with mock.patch.dict(os.environ, env), mock.patch('requests.post', side_effect=self.fake_post):
+            response = self.client.post(reverse('tts'), {'text': 'Hello world.', 'chunked': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['audio_size'], 4000)
+        self.assertEqual(response.data['audio_url'], 'https://blob.example/tts.mp3')
+        # The first chunk is read before the upload opens; after that each
+        # chunk is uploaded before the next one is read
+        self.assertEqual(self.events, ['tts', 'upload', 'upload'] + ['tts', 'upload'] * 3 + ['upload'])
+
+    def test_tts_failure_starts_no_upload(self):
+        failing = mock.Mock(side_effect=requests.HTTPError('401 Unauthorized'))
+        env = {'ELEVEN_API_KEY': 'key', 'VERCEL_BLOB_TOKEN': 'token'}
+        with mock.patch.dict(os.environ, env), mock.patch('requests.post', failing):
+            response = self.client.post(reverse('tts'), {'text': 'Hello world.', 'chunked': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        failing.assert_called_once()
+
+    def test_tts_failure_mid_upload_aborts_and_cleans_up(self):
+        closed = []
+
+        def audio(*args, **kwargs):
+            try:
+                yield b'a' * 1000
+                raise TTSError('TTS stream interrupted')
+            finally:
+                closed.append(True)
+
+        def fake_post(url, **kwargs):
+            if url == vercel_blob.BLOB_DELETE_ENDPOINT:
+                deleted.extend(kwargs['json']['urls'])
+                return mock.Mock()
+            # A server that stored the truncated body instead of rejecting it
+            with self.assertRaises(TTSError):
+                for _ in kwargs['data']:
+                    pass
+            return mock.Mock(ok=True, json=lambda: {'url': 'https://blob.example/partial.mp3'})
+
+        deleted = []
+        env = {'ELEVEN_API_KEY': 'key', 'VERCEL_BLOB_TOKEN': 'token'}
+        with mock.patch.dict(os.environ, env), mock.patch('requests.post', side_effect=fake_post), \
+                mock.patch('digests.views.stream_synthesize', side_effect=audio):
+            response = self.client.post(reverse('tts'), {'text': 'Hello world.'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertEqual(closed, [True])
+        self.assertEqual(deleted, ['https://blob.example/partial.mp3'])
+
+    def test_any_upstream_error_is_a_bad_gateway(self):
+        env = {'ELEVEN_API_KEY': 'key', 'VERCEL_BLOB_TOKEN': 'token'}
+        with mock.patch.dict(os.environ, env), mock.patch('requests.post', side_effect=self.fake_post), \
+                mock.patch('digests.views.upload_stream', side_effect=TimeoutError('read timed out')):
+            self.events = []
+            response = self.client.post(reverse('tts'), {'text': 'Hello world.'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertIn('read timed out', response.data['error'])
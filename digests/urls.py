@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DailyDigestViewSet, TTSView, PublishView, GenerateScriptView
+from .views import DailyDigestViewSet, TTSView, PublishView, GenerateScriptView, GenerateScriptStreamView, generate_script_async, SearchView, MetricsView
 
 router = DefaultRouter()
 router.register(r'digests', DailyDigestViewSet, basename='dailydigest')
@@ -10,4 +10,8 @@ urlpatterns = [
     path('tts/', TTSView.as_view(), name='tts'),
     path('publish/', PublishView.as_view(), name='publish'),
     path('generate-script/', GenerateScriptView.as_view(), name='generate-script'),
+    path('generate-script/stream/', GenerateScriptStreamView.as_view(), name='generate-script-stream'),
+    path('generate-script/async/', generate_script_async, name='generate-script-async'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ] 
\ No newline at end of file
@@ -0,0 +1,157 @@
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Final, Iterator, List, Optional
+import requests
+
+from .mp3 import audio_frames
+
+__all__ = ["synthesize", "synthesize_chunked", "stream_synthesize", "iter_synthesize_chunked", "split_text",
+           "TTSError", "DEFAULT_VOICE_ID"]
+
+TTS_ENDPOINT: Final = "https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+TTS_STREAM_ENDPOINT: Final = "https://api.elevenlabs.io/v1/text-to-speech/{voice_id}/stream"
+# Read size for streamed audio; only this much of a stream is held at a time
+STREAM_CHUNK_BYTES: Final = 64 * 1024
+TTS_MODEL: Final = "eleven_multilingual_v2"
+# Default ElevenLabs voice ID (Rachel - accessible clone)
+DEFAULT_VOICE_ID: Final = "9DDKJLIKJqVKLbRZb3kO"
+# Chunk size for synthesize_chunked(), well under the per-request character limit
+CHUNK_CHARS: Final = 2000
+# Concurrent requests per synthesize_chunked() call; keep within the plan's concurrency limit
+TTS_MAX_WORKERS: Final = int(os.getenv("ELEVEN_TTS_WORKERS", "4"))
+
+# Sentence ends: Latin punctuation followed by whitespace, or CJK full-width
+# punctuation, which is not followed by a space in Chinese text
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|(?<=[。！？；…])")
+
+
+class TTSError(RuntimeError):
+    """Raised when ElevenLabs speech synthesis fails."""
+
+
+def _request(text: str, api_key: Optional[str], previous_text: Optional[str],
+             next_text: Optional[str]) -> Dict:
+    """Headers and JSON body shared by synthesize() and stream_synthesize()"""
+    api_key = api_key or os.getenv("ELEVEN_API_KEY")
+    if not api_key:
+        raise TTSError("ELEVEN_API_KEY not configured")
+
+    payload = {
+        "text": text,
+        "model_id": TTS_MODEL,
+        "voice_settings": {
+            "stability": 0.71,
+            "similarity_boost": 0.5,
+        },
+    }
+    if previous_text:
+        payload["previous_text"] = previous_text
+    if next_text:
+        payload["next_text"] = next_text
+    return {"headers": {"xi-api-key": api_key, "Content-Type": "application/json"}, "json": payload}
+
+
+def synthesize(text: str, voice_id: str = DEFAULT_VOICE_ID, api_key: Optional[str] = None,
+               previous_text: Optional[str] = None, next_text: Optional[str] = None) -> bytes:
+    """Return MP3 bytes for *text* spoken by *voice_id*.
+
+    *previous_text*/*next_text* are the neighbouring chunks, which keep the
+    intonation continuous when the audio is stitched together.
+    """
+    request = _request(text, api_key, previous_text, next_text)
+    try:
+        resp = requests.post(TTS_ENDPOINT.format(voice_id=voice_id), **request)
+        resp.raise_for_status()
+    except Exception as exc:
+        raise TTSError(f"TTS generation failed: {exc}") from exc
+    return resp.content
+
+
+def stream_synthesize(text: str, voice_id: str = DEFAULT_VOICE_ID, api_key: Optional[str] = None,
+                      previous_text: Optional[str] = None, next_text: Optional[str] = None) -> Iterator[bytes]:
+    """synthesize() from the streaming endpoint, yielding MP3 bytes as they arrive"""
+    request = _request(text, api_key, previous_text, next_text)
+    try:
+        resp = requests.post(TTS_STREAM_ENDPOINT.format(voice_id=voice_id), stream=True, **request)
+        resp.raise_for_status()
+    except Exception as exc:
+        raise TTSError(f"TTS generation failed: {exc}") from exc
+    with resp:
+        try:
+            yield from resp.iter_content(chunk_size=STREAM_CHUNK_BYTES)
+        except requests.RequestException as exc:
+            raise TTSError(f"TTS stream interrupted: {exc}") from exc
+
+
+def split_text(text: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """Split *text* into chunks of at most *max_chars* at paragraph, then sentence boundaries.
+
+    Sentence boundaries cover both Latin and CJK punctuation, so Mandarin
+    scripts split cleanly too. A single sentence longer than *max_chars* is
+    cut at the last space (or hard at the limit when there is none).
+    """
+    pieces = []
+    for paragraph in (p.strip() for p in text.splitlines()):
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in filter(None, (s.strip() for s in _SENTENCE_END.split(paragraph))):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(sentence[:cut].strip())
+                sentence = sentence[cut:].strip()
+            pieces.append(sentence)
+
+    # Pack whole paragraphs/sentences greedily up to max_chars
+    chunks: List[str] = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] = f"{chunks[-1]}\n{piece}"
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def iter_synthesize_chunked(text: str, voice_id: str = DEFAULT_VOICE_ID, api_key: Optional[str] = None,
+                            max_chars: int = CHUNK_CHARS, max_workers: int = TTS_MAX_WORKERS) -> Iterator[bytes]:
+    """Chunks voiced concurrently and yielded in script order as MP3 frames.
+
+    At most *max_workers* chunks are in flight or waiting to be consumed, so
+    memory stays bounded by the chunk size, not the script length. Text that
+    fits in one chunk is streamed straight from the streaming endpoint.
+    """
+    chunks = split_text(text, max_chars)
+    if len(chunks) <= 1:
+        yield from stream_synthesize(text, voice_id, api_key=api_key)
+        return
+
+    def voice(index: int) -> bytes:
+        return synthesize(chunks[index], voice_id, api_key,
+                          chunks[index - 1] if index > 0 else None,
+                          chunks[index + 1] if index + 1 < len(chunks) else None)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+        pending = deque()
+        submitted = 0
+        for _ in chunks:
+            while submitted < len(chunks) and len(pending) < max_workers:
+                pending.append(pool.submit(voice, submitted))
+                submitted += 1
+            # Parts are consumed in submission order, which is script order
+            yield audio_frames(pending.popleft().result())
+
+
+def synthesize_chunked(text: str, voice_id: str = DEFAULT_VOICE_ID, api_key: Optional[str] = None,
+                       max_chars: int = CHUNK_CHARS, max_workers: int = TTS_MAX_WORKERS) -> bytes:
+    """synthesize() for long scripts: chunks voiced concurrently, joined frame by frame.
+
+    Wall time approaches that of the slowest chunk instead of the whole
+    script. The MP3 parts are concatenated without re-encoding (see
+    digests.utils.mp3). Any chunk failing raises TTSError.
+    """
+    return b"".join(iter_synthesize_chunked(text, voice_id, api_key, max_chars, max_workers))
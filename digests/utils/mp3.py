@@ -0,0 +1,91 @@
+from typing import Iterable, Iterator, Optional, Tuple
+
+__all__ = ["audio_frames", "concat_mp3", "iter_frames"]
+
+# Bitrates in kbit/s by [MPEG-1][layer] and [MPEG-2/2.5][layer]; index 0 is "free", 15 is invalid
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 25: (11025, 12000, 8000)}
+_VERSIONS = {0b11: 1, 0b10: 2, 0b00: 25}
+_LAYERS = {0b11: 1, 0b10: 2, 0b01: 3}
+
+
+def _id3v2_size(data: bytes, offset: int = 0) -> int:
+    """Length of an ID3v2 tag at *offset*, 0 when there is none"""
+    if data[offset:offset + 3] != b"ID3" or len(data) < offset + 10:
+        return 0
+    size = 0
+    for byte in data[offset + 6:offset + 10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[offset + 5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _frame_header(data: bytes, offset: int) -> Optional[Tuple[int, int, int, int]]:
+    """(frame length, MPEG version, layer, channel mode) of the frame at *offset*, or None"""
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    version = _VERSIONS.get((b1 >> 3) & 0b11)
+    layer = _LAYERS.get((b1 >> 1) & 0b11)
+    bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 0b11
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 3 and version != 1:
+        length = 72 * bitrate // sample_rate + padding
+    else:
+        length = 144 * bitrate // sample_rate + padding
+    return length, version, layer, b3 >> 6
+
+
+def _is_info_frame(data: bytes, offset: int, version: int, channel_mode: int) -> bool:
+    """True for a Xing/Info or VBRI header frame, which holds no audio of its own"""
+    mono = channel_mode == 0b11
+    side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    tag = data[offset + 4 + side_info:offset + 8 + side_info]
+    return tag in (b"Xing", b"Info") or data[offset + 36:offset + 40] == b"VBRI"
+
+
+def iter_frames(data: bytes) -> Iterator[Tuple[int, int]]:
+    """(offset, length) of every complete audio frame, skipping tags and junk between frames"""
+    offset = _id3v2_size(data)
+    end = len(data) - 128 if data[-128:-125] == b"TAG" else len(data)  # ID3v1 trailer
+    first = True
+    while offset < end:
+        header = _frame_header(data, offset)
+        if header is None:
+            skip = _id3v2_size(data, offset)
+            offset += skip or 1
+            continue
+        length, version, _, channel_mode = header
+        if offset + length > end:
+            break
+        if not (first and _is_info_frame(data, offset, version, channel_mode)):
+            yield offset, length
+        first = False
+        offset += length
+
+
+def audio_frames(data: bytes) -> bytes:
+    """The MP3 frames of *data* without ID3 tags or a leading Xing/Info/VBRI frame"""
+    return b"".join(data[offset:offset + length] for offset, length in iter_frames(data))
+
+
+def concat_mp3(parts: Iterable[bytes]) -> bytes:
+    """Join MP3 files frame by frame, without re-encoding.
+
+    Per-part tags and Xing/Info headers are dropped: a Xing header in the
+    middle of the stream would make players misreport the duration.
+    """
+    return b"".join(audio_frames(part) for part in parts)
@@ -1,12 +1,14 @@
+import logging
 import os
 import uuid
 from datetime import datetime
-from typing import Final
+from typing import Final, Iterable, Tuple
 import requests
 
-__all__ = ["upload_bytes"]
+__all__ = ["delete_blobs", "upload_bytes", "upload_stream"]
 
 BLOB_ENDPOINT: Final = "https://api.vercel.com/v2/blobs/upload"
+BLOB_DELETE_ENDPOINT: Final = "https://blob.vercel-storage.com/delete"
 
 
 class BlobUploadError(RuntimeError):
@@ -38,4 +40,87 @@ def upload_bytes(data: bytes, prefix: str = "tts", ext: str = "mp3") -> str:
     except Exception as exc:
         raise BlobUploadError(f"Upload failed: {exc}: {resp.text[:200]}") from exc
 
-    return resp.json()["url"] 
\ No newline at end of file
+    return resp.json()["url"] 
+
+def upload_stream(chunks: Iterable[bytes], prefix: str = "tts", ext: str = "mp3",
+                  content_type: str = "audio/mpeg") -> Tuple[str, int]:
+    """Upload a byte stream to Vercel Blob; return the public URL and the byte count.
+
+    The multipart body is generated around *chunks* as they arrive and sent
+    with chunked transfer encoding, so nothing is buffered beyond the chunk
+    in flight. An exception raised by *chunks* (e.g. a TTS failure) is
+    re-raised as is: the request is dropped before the closing boundary, so
+    the upload is aborted, and a blob the server stored anyway is deleted.
+    """
+    token = os.getenv("VERCEL_BLOB_TOKEN")
+    if not token:
+        raise BlobUploadError("VERCEL_BLOB_TOKEN not set in environment")
+
+    filename = _build_filename(prefix, ext)
+    boundary = uuid.uuid4().hex
+    size = 0
+    source_error = None
+
+    def body():
+        nonlocal size, source_error
+        yield (f"--{boundary}\r\n"
+               f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+               f"Content-Type: {content_type}\r\n\r\n").encode()
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        except Exception as exc:
+            source_error = exc
+            raise
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    try:
+        resp = requests.post(
+            BLOB_ENDPOINT,
+            headers={"Authorization": f"Bearer {token}",
+                     "Content-Type": f"multipart/form-data; boundary={boundary}"},
+            data=body(),
+        )
+    except Exception as exc:
+        if source_error is not None:
+            raise source_error from None
+        raise BlobUploadError(f"Upload failed: {exc}") from exc
+    if source_error is not None:
+        if resp.ok:
+            _discard(resp)
+        raise source_error
+    try:
+        resp.raise_for_status()
+    except Exception as exc:
+        raise BlobUploadError(f"Upload failed: {exc}: {resp.text[:200]}") from exc
+
+    return resp.json()["url"], size
+
+
+def _discard(resp) -> None:
+    """Best-effort delete of a blob stored from a truncated body"""
+    try:
+        delete_blobs([resp.json()["url"]])
+    except Exception as exc:
+        logging.warning(f"Could not delete truncated upload: {exc}")
+
+
+def delete_blobs(urls: Iterable[str]) -> None:
+    """Delete the blobs at *urls* (e.g. uploads orphaned by a failed save)."""
+    urls = list(urls)
+    if not urls:
+        return
+    token = os.getenv("VERCEL_BLOB_TOKEN")
+    if not token:
+        raise BlobUploadError("VERCEL_BLOB_TOKEN not set in environment")
+
+    resp = requests.post(
+        BLOB_DELETE_ENDPOINT,
+        headers={"Authorization": f"Bearer {token}"},
+        json={"urls": urls},
+    )
+    try:
+        resp.raise_for_status()
+    except Exception as exc:
+        raise BlobUploadError(f"Delete failed: {exc}: {resp.text[:200]}") from exc
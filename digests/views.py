@@ -1,4 +1,6 @@
 from rest_framework import viewsets, status
+from django.db import connection
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from .models import DailyDigest
@@ -7,21 +9,32 @@ from .serializers import (
     TTSSerializer,
     PublishSerializer,
     ScriptGenerationSerializer,
+    SearchQuerySerializer,
 )
 from datetime import date as dt_date
+import json
 import os
+import queue
+import threading
+import time
 import anthropic
-import base64
-import requests
-from .utils.vercel_blob import upload_bytes, BlobUploadError
+import itertools
+from .utils.elevenlabs import TTSError, iter_synthesize_chunked, stream_synthesize
+from .utils.vercel_blob import upload_stream, BlobUploadError
+from .checkpoints import PipelineCheckpoint
+from .search import make_snippet, search_digests
 
 # Import our multi-agent pipeline
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from agents_pipeline import generate_episode
+from agents_pipeline_v3 import STAGES, generate_episode_v3
+from agents_pipeline_async import generate_episode_async
+from agents_streaming import generate_episode_v3_stream
+from agents_metrics import metrics_store, prometheus_text, summarize
+from agents_transport import make_client
 
 # Configure Anthropic once at import time
-anthropic_client = anthropic.Client(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
+anthropic_client = make_client(api_key=os.getenv("ANTHROPIC_API_KEY", ""))
 
 # Configure OpenAI as well, in case it's needed elsewhere or for future flexibility
 import openai
@@ -31,6 +44,59 @@ class DailyDigestViewSet(viewsets.ModelViewSet):
     queryset = DailyDigest.objects.all()
     serializer_class = DailyDigestSerializer
 
+class SearchView(APIView):
+    """Ranked full-text search over past episodes.
+
+    GET /api/search/?q=...&lang=en|zh&start=YYYY-MM-DD&end=YYYY-MM-DD&limit=20
+    """
+    def get(self, request):
+        serializer = SearchQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        lang = params['lang']
+
+        digests = search_digests(
+            DailyDigest.objects.defer('llm_prompt', 'llm_response_raw'),
+            params['q'],
+            lang=lang,
+            start=params.get('start'),
+            end=params.get('end'),
+        )[:params['limit']]
+
+        results = []
+        for digest in digests:
+            snippet = getattr(digest, 'snippet', None)
+            if snippet is None:
+                snippet = make_snippet(getattr(digest, f'summary_text_{lang}') or '', params['q'])
+            results.append({
+                'id': str(digest.id),
+                'date': str(digest.date),
+                'title': getattr(digest, f'title_{lang}'),
+                'audio_url': getattr(digest, f'audio_url_{lang}'),
+                'rank': round(digest.rank, 4),
+                'snippet': snippet,
+            })
+
+        return Response({'query': params['q'], 'lang': lang, 'count': len(results), 'results': results})
+
+class MetricsView(APIView):
+    """Prometheus text exposition of per-stage latency and usage.
+
+    Summaries cover the trailing ?days= window (default 7) of the metrics log.
+    """
+    def perform_content_negotiation(self, request, force=False):
+        # Scrapers send Accept: text/plain, which no DRF renderer claims
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        try:
+            days = float(request.query_params.get('days', 7))
+        except ValueError:
+            return Response({'error': 'days must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        since = time.time() - days * 86400
+        body = prometheus_text(summarize(metrics_store.read(since=since)))
+        return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
 class TTSView(APIView):
     def post(self, request):
         serializer = TTSSerializer(data=request.data)
@@ -48,39 +114,35 @@ class TTSView(APIView):
 
         voice_id = voice
 
-        tts_endpoint = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-        headers = {
-            "xi-api-key": eleven_api_key,
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "text": text,
-            "model_id": "eleven_multilingual_v2",
-            "voice_settings": {
-                "stability": 0.71,
-                "similarity_boost": 0.5,
-            },
-        }
-
+        # Audio is piped from ElevenLabs into the upload as it is produced, so
+        # memory per request stays bounded whatever the episode length
+        tts = iter_synthesize_chunked if serializer.validated_data["chunked"] else stream_synthesize
+        audio = tts(text, voice_id, api_key=eleven_api_key)
         try:
-            resp = requests.post(tts_endpoint, headers=headers, json=payload)
-            resp.raise_for_status()
-            audio_bytes = resp.content
-            audio_size = len(audio_bytes)
-        except Exception as exc:
+            # Pull the first bytes before opening the upload, so a rejected
+            # TTS request never starts one
+            first = next(audio, b"")
+            audio_url, audio_size = upload_stream(itertools.chain([first], audio))
+        except TTSError as exc:
             return Response(
-                {"error": f"TTS generation failed: {exc}"},
+                {"error": str(exc)},
                 status=status.HTTP_502_BAD_GATEWAY,
             )
-
-        # Upload to Vercel Blob
-        try:
-            audio_url = upload_bytes(audio_bytes)
         except BlobUploadError as exc:
             return Response(
                 {"error": str(exc)},
                 status=status.HTTP_502_BAD_GATEWAY,
             )
+        except Exception as exc:
+            # Anything else raised while talking to ElevenLabs or Vercel
+            # (connection errors, timeouts) is still an upstream failure
+            return Response(
+                {"error": f"TTS generation failed: {exc}"},
+                status=status.HTTP_502_BAD_GATEWAY,
+            )
+        finally:
+            # After a failed upload, stop voicing the chunks still in flight
+            audio.close()
 
         # Update DailyDigest row if date provided
         digest_id = None
@@ -128,14 +190,24 @@ class GenerateScriptView(APIView):
         serializer.is_valid(raise_exception=True)
         target_date = serializer.validated_data.get('date', dt_date.today())
 
-        # Using the agents_pipeline for script generation
+        # Using the v3 agents pipeline for script generation
         prompt = f"Generated APE INTELLIGENCE DAILY script for {target_date} using multi-agent pipeline with web search capabilities."
 
+        checkpoint = None
+        if serializer.validated_data['resume'] or serializer.validated_data.get('rerun_from'):
+            checkpoint = PipelineCheckpoint(
+                target_date,
+                pipeline_version='v3',
+                stages=STAGES,
+                rerun_from=serializer.validated_data.get('rerun_from'),
+            )
+
         try:
-            episode_result = generate_episode(
+            episode_result = generate_episode_v3(
                 date_str=str(target_date),
                 with_editor=True,
-                human_review=False
+                debug=False,
+                checkpoint=checkpoint,
             )
             
             script_text = episode_result.get('script', '')
@@ -143,13 +215,13 @@ class GenerateScriptView(APIView):
                 "research": episode_result.get('research', ''),
                 "summary": episode_result.get('summary', ''),
                 "script": script_text,
-                "raw_llm_output": episode_result.get('raw_llm_output'),
-                "generated_via": "agents_pipeline"
+                "validations": episode_result.get('validations'),
+                "generated_via": "agents_pipeline_v3"
             }
 
         except Exception as exc:
             script_text = f"[LLM call failed: {exc}]"
-            llm_response = {"error": str(exc), "generated_via": "agents_pipeline_failed"}
+            llm_response = {"error": str(exc), "generated_via": "agents_pipeline_v3_failed"}
 
         # Save or update the DailyDigest entry
         digest, created = DailyDigest.objects.update_or_create(
@@ -165,5 +237,150 @@ class GenerateScriptView(APIView):
             'date': str(target_date),
             'script': script_text,
             'digest_id': str(digest.id),
-            'created': created
-        }, status=status.HTTP_201_CREATED) 
+            'created': created,
+            'pipeline_run_id': str(checkpoint.run.id) if checkpoint else None,
+            'reused_stages': checkpoint.reused if checkpoint else [],
+        }, status=status.HTTP_201_CREATED)
+
+# Seconds without pipeline output before an SSE keepalive comment is sent
+SSE_KEEPALIVE_SECONDS = 15
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class GenerateScriptStreamView(APIView):
+    """Server-sent events version of GenerateScriptView.
+
+    EventSource clients can GET /api/generate-script/stream/?date=YYYY-MM-DD.
+    The pipeline runs on a background thread so keepalive comments can be
+    sent while an agent is still searching. That thread also saves the
+    digest, and stops once the client disconnects.
+    """
+
+    def perform_content_negotiation(self, request, force=False):
+        # EventSource sends Accept: text/event-stream, which no DRF renderer claims
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        return self._stream(request.query_params)
+
+    def post(self, request):
+        return self._stream(request.data)
+
+    def _stream(self, data):
+        serializer = ScriptGenerationSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        target_date = serializer.validated_data.get('date', dt_date.today())
+
+        response = StreamingHttpResponse(self._events(target_date), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _events(self, target_date):
+        events = queue.Queue()
+        # Set when the client goes away, so the pipeline stops spending tokens
+        stop = threading.Event()
+
+        def produce():
+            stream = generate_episode_v3_stream(date_str=str(target_date), with_editor=True)
+            try:
+                for item in stream:
+                    if stop.is_set():
+                        return
+                    if item["event"] == "done":
+                        item = {"event": "done", "data": self._save(target_date, item["data"])}
+                    events.put(item)
+            except Exception as exc:
+                events.put({"event": "error", "data": {"error": str(exc)}})
+            finally:
+                events.put(None)
+                # Closing the generator also closes an in-flight streaming request
+                stream.close()
+                connection.close()
+
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            yield ": stream opened\n\n"
+            while True:
+                try:
+                    item = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None:
+                    break
+                yield _sse(item["event"], item["data"])
+        finally:
+            stop.set()
+
+    @staticmethod
+    def _save(target_date, result):
+        """Persist the finished episode from the producer thread, whether or not anyone is still listening"""
+        digest, created = DailyDigest.objects.update_or_create(
+            date=target_date,
+            defaults={
+                'summary_text_en': result['script'],
+                'llm_prompt': f"Generated APE INTELLIGENCE DAILY script for {target_date} using streaming multi-agent pipeline with web search capabilities.",
+                'llm_response_raw': dict(result, generated_via="agents_streaming"),
+            }
+        )
+        return {
+            'date': str(target_date),
+            'script': result['script'],
+            'validations': result['validations'],
+            'digest_id': str(digest.id),
+            'created': created,
+        }
+
+
+async def generate_script_async(request):
+    """Async twin of GenerateScriptView that awaits the V3 pipeline instead of blocking a worker."""
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = ScriptGenerationSerializer(data=payload)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    target_date = serializer.validated_data.get('date', dt_date.today())
+
+    prompt = f"Generated APE INTELLIGENCE DAILY script for {target_date} using async multi-agent pipeline with web search capabilities."
+
+    try:
+        episode_result = await generate_episode_async(date_str=str(target_date), with_editor=True)
+        script_text = episode_result.get('script', '')
+        llm_response = {
+            "research": episode_result.get('research', ''),
+            "summary": episode_result.get('summary', ''),
+            "script": script_text,
+            "validations": episode_result.get('validations'),
+            "generated_via": "agents_pipeline_async"
+        }
+    except Exception as exc:
+        script_text = f"[LLM call failed: {exc}]"
+        llm_response = {"error": str(exc), "generated_via": "agents_pipeline_async_failed"}
+
+    digest, created = await DailyDigest.objects.aupdate_or_create(
+        date=target_date,
+        defaults={
+            'summary_text_en': script_text,
+            'llm_prompt': prompt,
+            'llm_response_raw': llm_response,
+        }
+    )
+
+    return JsonResponse({
+        'date': str(target_date),
+        'script': script_text,
+        'digest_id': str(digest.id),
+        'created': created
+    }, status=status.HTTP_201_CREATED)
+
+
+# Set by hand: Django 4.2's csrf_exempt and require_POST wrap views in a sync
+# function, which would hand the unawaited coroutine back as the response
+generate_script_async.csrf_exempt = True
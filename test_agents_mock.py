@@ -1,17 +1,26 @@
 #!/usr/bin/env python3
 """
-Real test for the agents pipeline using actual Anthropic API calls.
+Test for the agents pipeline.
+
+Makes real Anthropic API calls by default. Run once with AOK_LLM_MODE=record to
+capture fixtures, then with AOK_LLM_MODE=replay to rerun fully offline (see
+agents_transport).
 """
 
 import os
-import sys
 import anthropic
 
 # Import the agents pipeline
 import agents_pipeline
+from agents_cache import response_cache
+from agents_transport import FIXTURE_DIR, LLM_MODE, offline
 
 def test_api_key():
     """Test if the API key is properly configured."""
+    if offline():
+        print(f"📼 Replay mode: serving recorded responses from {FIXTURE_DIR}")
+        return True
+
     api_key = os.getenv("ANTHROPIC_API_KEY")
     if not api_key:
         print("❌ ANTHROPIC_API_KEY not found in environment variables")
@@ -35,8 +44,12 @@ def test_api_key():
         return False
 
 def test_agents_pipeline():
-    print("🤖 Testing Agents Pipeline with Real API Calls")
+    print(f"🤖 Testing Agents Pipeline ({'recorded responses' if offline() else 'real API calls'})")
     print("=" * 50)
+
+    # Cache hits never reach the client, so recording needs the cache off
+    if LLM_MODE == "record":
+        response_cache.enabled = False
     
     # First test API connectivity
     if not test_api_key():